@@ -0,0 +1,155 @@
+"""
+HTML extraction parity check and throughput benchmark.
+
+Parity: every backend must produce exactly the saved `<name>.txt` for each `<name>.html` in
+`benchmarks/fixtures/html/`. The expected files are the output of the reference 'bs4' backend;
+regenerate them with `--update-expected` after an intended change to the extraction rules.
+The lxml backend is also checked with tiny feed sizes, so text and tags split across
+parser chunks are covered.
+
+Known divergences: on malformed markup libxml2 repairs the tree the way browsers do, while
+html.parser does not (an unclosed <p> runs on to the end of the page). For those fixtures
+`<name>.lxml.txt` holds the expected lxml output; they are listed under
+`known_divergences` in the report instead of failing.
+
+Throughput: pages/s and MB/s of each backend over the fixtures, plus peak Python heap on one
+large page (`--large-copies` copies of the fixture bodies inside a single <main>).
+
+    python benchmarks/html_extraction.py --repeat 200 --output outputs/benchmarks/html_extraction.json
+"""
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.html_extraction import HTML_BACKENDS, extract_text_lxml  # noqa: E402
+
+FIXTURES_DIR = os.path.join(ROOT, "benchmarks", "fixtures", "html")
+FEED_SIZES = (1, 7, 512)
+
+
+def load_fixtures():
+    fixtures = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, "*.html"))):
+        with open(path, "rb") as f:
+            fixtures[os.path.splitext(os.path.basename(path))[0]] = f.read()
+    return fixtures
+
+
+def expected_path(name , backend=None):
+    return os.path.join(FIXTURES_DIR, f"{name}.{backend}.txt" if backend else f"{name}.txt")
+
+
+def read_expected(name , backend=None):
+    with open(expected_path(name, backend), encoding="utf-8") as f:
+        return f.read()
+
+
+def first_difference(expected , actual):
+    for line, (a, b) in enumerate(zip(expected.splitlines(), actual.splitlines()), 1):
+        if a != b:
+            return {"line": line, "expected": a, "actual": b}
+    return {"line": min(len(expected.splitlines()), len(actual.splitlines())) + 1, "expected_lines": len(expected.splitlines()), "actual_lines": len(actual.splitlines())}
+
+
+def check_parity(fixtures):
+    failures, divergences = [], []
+    for name, content in fixtures.items():
+        expected = read_expected(name)
+        expected_lxml = read_expected(name, "lxml") if os.path.exists(expected_path(name, "lxml")) else expected
+        if expected_lxml != expected:
+            divergences.append(name)
+
+        outputs = {backend: extract(content) for backend, extract in HTML_BACKENDS.items()}
+        outputs.update({f"lxml/feed={size}": extract_text_lxml(content, size) for size in FEED_SIZES})
+        for backend, actual in outputs.items():
+            wanted = expected_lxml if backend.startswith("lxml") else expected
+            if actual != wanted:
+                failures.append({"fixture": name, "backend": backend, **first_difference(wanted, actual)})
+    return failures, divergences
+
+
+def update_expected(fixtures):
+    for name, content in fixtures.items():
+        with open(expected_path(name), "w", encoding="utf-8") as f:
+            f.write(HTML_BACKENDS["bs4"](content))
+
+
+def large_page(fixtures , copies):
+    bodies = []
+    for content in fixtures.values():
+        text = content.decode("utf-8", errors="replace")
+        start, end = text.find("<body"), text.rfind("</body>")
+        bodies.append(text[text.find(">", start) + 1:end] if start != -1 and end != -1 else text)
+    body = "\n".join(bodies).replace("<main", "<section").replace("</main>", "</section>")
+    return f"<html><head><meta charset=\"utf-8\"></head><body><main>{body * copies}</main></body></html>".encode("utf-8")
+
+
+def bench_backend(extract , fixtures , repeat , page):
+    total_bytes = sum(len(content) for content in fixtures.values())
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for content in fixtures.values():
+            extract(content)
+    wall = time.perf_counter() - started
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    extract(page)
+    large_wall = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "pages_per_s": repeat * len(fixtures) / wall,
+        "mb_per_s": repeat * total_bytes / wall / 1e6,
+        "large_page": {"mb": len(page) / 1e6, "seconds": large_wall, "peak_heap_mb": peak / 1e6}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", choices=sorted(HTML_BACKENDS), default=sorted(HTML_BACKENDS))
+    parser.add_argument("--repeat", type=int, default=50, help="passes over the fixtures per backend")
+    parser.add_argument("--large-copies", type=int, default=200)
+    parser.add_argument("--parity-only", action="store_true")
+    parser.add_argument("--update-expected", action="store_true", help="rewrite the expected .txt files with the bs4 backend")
+    parser.add_argument("--output", help="write the JSON report here as well as to stdout")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures()
+    if args.update_expected:
+        update_expected(fixtures)
+
+    report = {
+        "benchmark": "html_extraction",
+        "timestamp": time.strftime('%Y-%m-%d %H:%M:%S'),
+        "fixtures": len(fixtures)
+    }
+    report["parity_failures"], report["known_divergences"] = check_parity(fixtures)
+    if not args.parity_only:
+        page = large_page(fixtures, args.large_copies)
+        report["throughput"] = {
+            backend: bench_backend(HTML_BACKENDS[backend], fixtures, args.repeat, page)
+            for backend in args.backends
+        }
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    if report["parity_failures"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
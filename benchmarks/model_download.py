@@ -0,0 +1,228 @@
+"""
+Model download benchmark and fault-injection check against a local HTTP server.
+
+The server serves a synthetic GGUF model (valid header, tensor table and F32 tensors) with
+Range support, a per-connection throughput cap (`--mbps-per-connection`, like a CDN that
+throttles single streams) and the `X-Linked-ETag` SHA-256 header Hugging Face sends. It checks:
+
+- speedup of `--connections` parallel range requests over a single connection;
+- resume: the server drops every connection after serving part of the file, the download
+  fails, and the retry fetches only the missing chunks;
+- a wrong expected SHA-256 is rejected and nothing is installed;
+- servers without range support fall back to one stream;
+- the startup check accepts the downloaded model and rejects a truncated copy.
+
+    python benchmarks/model_download.py --size-mb 32 --output outputs/benchmarks/model_download.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import struct
+import hashlib
+import argparse
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.model_download import DownloadError, RangeDownloader, read_manifest  # noqa: E402
+from src.gguf_check import ModelFileError, check_model_file  # noqa: E402
+
+
+def gguf_string(value):
+    data = value.encode("utf-8")
+    return struct.pack("<Q", len(data)) + data
+
+
+def synthetic_gguf(size_mb , tensors=8 , alignment=32):
+    """A small but structurally valid GGUF v3 file whose F32 tensors add up to about `size_mb`."""
+    elements = max(1, (size_mb << 20) // 4 // tensors)
+    header = b"GGUF" + struct.pack("<IQQ", 3, tensors, 2)
+    header += gguf_string("general.architecture") + struct.pack("<I", 8) + gguf_string("llama")
+    header += gguf_string("general.alignment") + struct.pack("<II", 4, alignment)
+    for i in range(tensors):
+        header += gguf_string(f"blk.{i}.weight") + struct.pack("<IQIQ", 1, elements, 0, i * elements * 4)
+    header += b"\0" * (-len(header) % alignment)
+    return header + os.urandom(elements * 4 * tensors)
+
+
+class ModelServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self , payload , bytes_per_s , ranges=True):
+        super().__init__(("127.0.0.1", 0), ModelHandler)
+        self.payload = payload
+        self.sha256 = hashlib.sha256(payload).hexdigest()
+        self.bytes_per_s = bytes_per_s
+        self.ranges = ranges
+        self.fail_after = None
+        self.sent = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/model.gguf"
+
+
+class ModelHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self , *args):
+        pass
+
+    def headers_for(self , length):
+        self.send_header("Content-Length", str(length))
+        self.send_header("ETag", f'"{self.server.sha256[:16]}"')
+        self.send_header("X-Linked-ETag", f'"{self.server.sha256}"')
+        if self.server.ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.headers_for(len(self.server.payload))
+
+    def do_GET(self):
+        payload = self.server.payload
+        start, end = 0, len(payload) - 1
+        requested = self.headers.get("Range")
+        if requested and self.server.ranges:
+            first, last = requested.split("=", 1)[1].split("-")
+            start, end = int(first), min(int(last) if last else end, end)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(payload)}")
+        else:
+            self.send_response(200)
+        self.headers_for(end - start + 1)
+
+        # Sends in 64 KB slices paced to the per-connection rate.
+        started, position, slice_size = time.perf_counter(), start, 64 << 10
+        try:
+            while position <= end:
+                with self.server.lock:
+                    if self.server.fail_after is not None and self.server.sent >= self.server.fail_after:
+                        self.close_connection = True
+                        return
+                block = payload[position:min(position + slice_size, end + 1)]
+                self.wfile.write(block)
+                position += len(block)
+                with self.server.lock:
+                    self.server.sent += len(block)
+                ahead = (position - start) / self.server.bytes_per_s - (time.perf_counter() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+
+def serve(payload , bytes_per_s , ranges=True):
+    server = ModelServer(payload, bytes_per_s, ranges)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def timed_download(url , path , **kwargs):
+    started = time.perf_counter()
+    manifest = RangeDownloader(url, path, **kwargs).download()
+    return time.perf_counter() - started, manifest
+
+
+def clean(path):
+    for suffix in ("", ".part", ".part.json", ".download.json"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=32)
+    parser.add_argument("--chunk-mb", type=int, default=2)
+    parser.add_argument("--connections", type=int, default=8)
+    parser.add_argument("--mbps-per-connection", type=float, default=8.0, help="server throughput cap per connection, MB/s")
+    parser.add_argument("--output", help="write the JSON report here as well as to stdout")
+    args = parser.parse_args()
+
+    payload = synthetic_gguf(args.size_mb)
+    workdir = tempfile.mkdtemp(prefix="model_download_")
+    path = os.path.join(workdir, "model.gguf")
+    server = serve(payload, args.mbps_per_connection * 1e6)
+    options = {"chunk_size": args.chunk_mb << 20, "timeout": 10, "backoff_base": 0.05}
+    failures, report = [], {"benchmark": "model_download", "timestamp": time.strftime('%Y-%m-%d %H:%M:%S'), "size_mb": len(payload) / 1e6}
+
+    try:
+        serial, _ = timed_download(server.url, path, connections=1, **options)
+        clean(path)
+        parallel, manifest = timed_download(server.url, path, connections=args.connections, **options)
+        report["throughput"] = {
+            "single_connection_mb_per_s": len(payload) / serial / 1e6,
+            "parallel_mb_per_s": len(payload) / parallel / 1e6,
+            "speedup": serial / parallel
+        }
+        if not manifest["verified"] or manifest["sha256"] != server.sha256:
+            failures.append("published SHA-256 was not verified")
+        try:
+            report["startup_check"] = check_model_file(path, "sha256")
+        except ModelFileError as e:
+            failures.append(f"startup check rejected a good model: {e}")
+
+        # Resume: every connection is dropped once 60% of the file has been served.
+        clean(path)
+        server.sent, server.fail_after = 0, int(len(payload) * 0.6)
+        try:
+            RangeDownloader(server.url, path, connections=args.connections, max_retries=0, **options).download()
+            failures.append("interrupted download did not fail")
+        except DownloadError:
+            pass
+        server.sent, server.fail_after = 0, None
+        timed_download(server.url, path, connections=args.connections, **options)
+        report["resume"] = {"refetched_fraction": server.sent / len(payload)}
+        if server.sent >= len(payload) * 0.6 or read_manifest(path)["sha256"] != server.sha256:
+            failures.append("resumed download refetched too much or produced a different file")
+
+        clean(path)
+        try:
+            RangeDownloader(server.url, path, sha256="0" * 64, **options).download()
+            failures.append("wrong SHA-256 was accepted")
+        except DownloadError:
+            if os.path.exists(path) or os.path.exists(path + ".part"):
+                failures.append("rejected download left files behind")
+
+        no_ranges = serve(payload, args.mbps_per_connection * 4e6, ranges=False)
+        try:
+            clean(path)
+            _, manifest = timed_download(no_ranges.url, path, **options)
+            if manifest["sha256"] != server.sha256:
+                failures.append("single-stream fallback produced a different file")
+        finally:
+            no_ranges.shutdown()
+
+        truncated = os.path.join(workdir, "truncated.gguf")
+        with open(truncated, "wb") as f:
+            f.write(payload[:len(payload) // 2])
+        try:
+            check_model_file(truncated)
+            failures.append("startup check accepted a truncated model")
+        except ModelFileError as e:
+            report["truncated_check"] = str(e)
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report["failures"] = failures
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
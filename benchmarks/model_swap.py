@@ -0,0 +1,126 @@
+"""
+Hot-swap benchmark: starts the API with uvicorn, keeps `--concurrency` clients sending unique
+questions to /model/answer for `--duration` seconds, and swaps the default model
+(`POST /model/models/<name>/swap`) `--swaps` times while the load runs.
+
+Reports the swap times, the status counts of all requests and the latency of requests that
+overlapped a swap next to the others, plus the cold start time a restart would cost instead.
+Fails if any request did not get a 200.
+
+    python benchmarks/model_swap.py --backend stub --concurrency 8 --output outputs/benchmarks/model_swap.json
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import subprocess
+
+import aiohttp
+
+from serving import ROOT, free_port, percentiles, question, wait_ready
+
+
+async def run_load(session , base_url , concurrency , duration , swap_windows):
+    requests, stop_at = [], time.perf_counter() + duration
+    counter = iter(range(10 ** 9))
+
+    async def client():
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            async with session.post(f"{base_url}/model/answer", json={"question": question(next(counter))}) as response:
+                await response.read()
+            requests.append((started, time.perf_counter(), response.status))
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+
+    def overlaps(started , finished):
+        return any(started < end and finished > start for start, end in swap_windows)
+
+    statuses = {}
+    for _, _, status in requests:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    ok = [(started, finished) for started, finished, status in requests if status == 200]
+    return {
+        "requests": len(requests),
+        "statuses": statuses,
+        "latency_s_during_swap": percentiles([finished - started for started, finished in ok if overlaps(started, finished)]),
+        "latency_s_otherwise": percentiles([finished - started for started, finished in ok if not overlaps(started, finished)])
+    }
+
+
+async def run_swaps(session , base_url , name , count , duration , windows):
+    results = []
+    for i in range(count):
+        await asyncio.sleep(duration / (count + 1))
+        started = time.perf_counter()
+        async with session.post(f"{base_url}/model/models/{name}/swap", json={}) as response:
+            body = await response.json()
+        windows.append((started, time.perf_counter()))
+        results.append({"status": response.status, "seconds": time.perf_counter() - started, "version": body.get("version")})
+    return results
+
+
+async def run_benchmark(args):
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ, MODEL_BACKEND=args.backend)
+
+    launched = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env
+    )
+    try:
+        timeout = aiohttp.ClientTimeout(total=args.request_timeout)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            await wait_ready(session, base_url, process, args.startup_timeout)
+            report = {"cold_start_s": time.perf_counter() - launched}
+
+            async with session.get(f"{base_url}/model/models") as response:
+                name = args.model or (await response.json())["default"]
+
+            windows = []
+            load, swaps = await asyncio.gather(
+                run_load(session, base_url, args.concurrency, args.duration, windows),
+                run_swaps(session, base_url, name, args.swaps, args.duration, windows)
+            )
+            report.update({"model": name, "swaps": swaps, "load": load})
+            async with session.get(f"{base_url}/model/models") as response:
+                report["models"] = await response.json()
+            return report
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["stub", "llama"], default="stub")
+    parser.add_argument("--model", help="variant to swap (default: api.models.default)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load")
+    parser.add_argument("--swaps", type=int, default=2)
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--request-timeout", type=float, default=120.0)
+    parser.add_argument("--output", help="write the JSON report here as well as to stdout")
+    args = parser.parse_args()
+
+    report = {"benchmark": "model_swap", "timestamp": time.strftime('%Y-%m-%d %H:%M:%S'), "backend": args.backend}
+    report.update(asyncio.run(run_benchmark(args)))
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    failed = any(swap["status"] != 200 for swap in report["swaps"]) or set(report["load"]["statuses"]) != {"200"}
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+Serving benchmark: starts the API with uvicorn and measures
+
+- startup: seconds from launching the server until /model/health-check reports the model loaded,
+- streaming: time-to-first-token and tokens/second from /model/answer/stream,
+- latency: p50/p95/p99 end-to-end latency and throughput of /model/answer at each concurrency level.
+
+With `--backend stub` the server uses the deterministic stub model (`api.model.stub`), so the
+benchmark runs on CPU-only CI machines without the GGUF download. Every question is unique, so
+the answer cache never short-circuits generation. The JSON report can be compared with a
+baseline from an earlier commit; the run fails if a metric regressed by more than `--max-regression`.
+
+    python benchmarks/serving.py --backend stub --concurrency 1 4 8 --output outputs/benchmarks/serving.json
+    python benchmarks/serving.py --backend stub --baseline outputs/benchmarks/baseline.json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+
+import aiohttp
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+QUESTIONS = [
+    "What is the difference between Level 1 and Level 2 charging?",
+    "How long does DC fast charging take?",
+    "How can I calculate the cost of charging at home?",
+    "What is a Mode 3 charging cable?",
+    "Why is DC fast charging the most expensive option?",
+    "Do I need to charge my EV every night?"
+]
+
+# Lower is better for latencies, higher is better for rates.
+TRACKED = {
+    ("startup", "ready_s"): "lower",
+    ("streaming", "ttft_s", "p50"): "lower",
+    ("streaming", "tokens_per_s", "p50"): "higher",
+    ("latency", "*", "latency_s", "p95"): "lower",
+    ("latency", "*", "requests_per_s"): "higher"
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentiles(values):
+    if not values:
+        return None
+    values = np.asarray(values)
+    return {
+        "mean": float(values.mean()),
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "p99": float(np.percentile(values, 99)),
+        "max": float(values.max())
+    }
+
+
+def question(i):
+    return f"{QUESTIONS[i % len(QUESTIONS)]} (request {i})"
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+async def wait_ready(session , base_url , process , timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            async with session.get(f"{base_url}/model/health-check") as response:
+                if response.status == 200 and (await response.json()).get("inference"):
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.05)
+    raise TimeoutError(f"Server was not ready after {timeout}s")
+
+
+async def stream_one(session , base_url , i):
+    started = time.perf_counter()
+    first_token, tokens = None, 0
+    async with session.post(f"{base_url}/model/answer/stream", json={"question": question(i)}) as response:
+        response.raise_for_status()
+        async for line in response.content:
+            if not line.startswith(b"data:"):
+                continue
+            if b'"token"' in line:
+                tokens += 1
+                if first_token is None:
+                    first_token = time.perf_counter()
+    finished = time.perf_counter()
+    if first_token is None:
+        return None
+    decode_time = finished - first_token
+    return {"ttft_s": first_token - started, "tokens": tokens, "tokens_per_s": (tokens - 1) / decode_time if tokens > 1 and decode_time > 0 else None}
+
+
+async def bench_streaming(session , base_url , requests , offset):
+    runs = [await stream_one(session, base_url, offset + i) for i in range(requests)]
+    runs = [run for run in runs if run is not None]
+    return {
+        "requests": requests,
+        "ttft_s": percentiles([run["ttft_s"] for run in runs]),
+        "tokens_per_s": percentiles([run["tokens_per_s"] for run in runs if run["tokens_per_s"]])
+    }
+
+
+async def bench_latency(session , base_url , concurrency , requests , offset):
+    latencies, statuses = [], {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            started = time.perf_counter()
+            async with session.post(f"{base_url}/model/answer", json={"question": question(offset + i)}) as response:
+                await response.read()
+            statuses[response.status] = statuses.get(response.status, 0) + 1
+            if response.status == 200:
+                latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    wall = time.perf_counter() - started
+    return {
+        "requests": requests,
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "latency_s": percentiles(latencies),
+        "requests_per_s": len(latencies) / wall
+    }
+
+
+async def run_benchmarks(args):
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ, MODEL_BACKEND=args.backend)
+
+    launched = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env
+    )
+    try:
+        timeout = aiohttp.ClientTimeout(total=args.request_timeout)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            await wait_ready(session, base_url, process, args.startup_timeout)
+            report = {"startup": {"ready_s": time.perf_counter() - launched}}
+
+            # Warm-up request, not measured.
+            async with session.post(f"{base_url}/model/answer", json={"question": "warm-up"}) as response:
+                await response.read()
+
+            offset = 1
+            report["streaming"] = await bench_streaming(session, base_url, args.stream_requests, offset)
+            offset += args.stream_requests
+
+            report["latency"] = {}
+            for concurrency in args.concurrency:
+                requests = args.requests or concurrency * 4
+                report["latency"][str(concurrency)] = await bench_latency(session, base_url, concurrency, requests, offset)
+                offset += requests
+            return report
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def lookup(report , path):
+    """Yields `(name, value)` for a metric path; `*` matches every key at that level."""
+    def walk(node , rest , name):
+        if not rest:
+            if isinstance(node, (int, float)):
+                yield name, float(node)
+            return
+        if not isinstance(node, dict):
+            return
+        keys = node.keys() if rest[0] == "*" else [rest[0]]
+        for key in keys:
+            if key in node:
+                yield from walk(node[key], rest[1:], f"{name}.{key}" if name else key)
+    return dict(walk(report, list(path), ""))
+
+
+def compare(report , baseline , max_regression):
+    regressions = []
+    for path, direction in TRACKED.items():
+        current, previous = lookup(report, path), lookup(baseline, path)
+        for name, value in current.items():
+            old = previous.get(name)
+            if not old:
+                continue
+            change = (value - old) / old
+            if (direction == "lower" and change > max_regression) or (direction == "higher" and -change > max_regression):
+                regressions.append({"metric": name, "baseline": old, "current": value, "change": change})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["llama", "stub"], default="stub")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--requests", type=int, help="requests per concurrency level (default: 4 x concurrency)")
+    parser.add_argument("--stream-requests", type=int, default=8)
+    parser.add_argument("--startup-timeout", type=float, default=300)
+    parser.add_argument("--request-timeout", type=float, default=600)
+    parser.add_argument("--output", help="write the JSON report here as well as to stdout")
+    parser.add_argument("--baseline", help="JSON report of an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.10, help="allowed relative regression per metric")
+    args = parser.parse_args()
+
+    report = {
+        "benchmark": "serving",
+        "backend": args.backend,
+        "commit": git_commit(),
+        "timestamp": time.strftime('%Y-%m-%d %H:%M:%S'),
+        **asyncio.run(run_benchmarks(args))
+    }
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["regressions"] = compare(report, json.load(f), args.max_regression)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as f:
+            f.write(text)
+
+    if report.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
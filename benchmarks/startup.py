@@ -0,0 +1,78 @@
+"""
+Measures server cold start: importing `main`, running the FastAPI lifespan until the model is
+ready, and the first /model/answer request. Every run happens in a fresh interpreter so that
+imports and model loading are really cold (apart from the OS page cache).
+
+    python benchmarks/startup.py --runs 5 --output outputs/benchmarks/startup.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r"""
+import json, time
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+result = {"import_s": t1 - t0}
+if {measure_ready}:
+    from fastapi.testclient import TestClient
+    with TestClient(main.app) as client:
+        t2 = time.perf_counter()
+        result["lifespan_s"] = t2 - t1
+        response = client.post("/model/answer", json={{"question": "What is a Level 2 charger?"}})
+        result["first_answer_s"] = time.perf_counter() - t2
+        result["first_answer_status"] = response.status_code
+    result["ready_s"] = result["import_s"] + result["lifespan_s"]
+print(json.dumps(result))
+"""
+
+
+def run_once(measure_ready):
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE.format(measure_ready=measure_ready)],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def summarize(runs):
+    summary = {}
+    for key in runs[0]:
+        values = [run[key] for run in runs if isinstance(run.get(key), float)]
+        if values:
+            summary[key] = {"min": min(values), "median": statistics.median(values), "max": max(values)}
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--import-only", action="store_true", help="only time `import main`, no model needed")
+    parser.add_argument("--output", help="write the JSON report here as well as to stdout")
+    args = parser.parse_args()
+
+    runs = [run_once(not args.import_only) for _ in range(args.runs)]
+    report = {
+        "benchmark": "startup",
+        "timestamp": time.strftime('%Y-%m-%d %H:%M:%S'),
+        "runs": runs,
+        "summary": summarize(runs)
+    }
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,14 +4,32 @@ RAW_DIR = 'data/raw'
 PROCESSED_DIR = 'data/processed'
 PROCESSED_DIR_EXTRACTED = 'data/processed/raw_extracted_data.json'
 PROCESSED_DIR_EXTRACTED_SUMMARY = 'data/processed/extraction_summary.json'
-PROCESSED_DIR_CHUNKS= 'data/processed/chunks.json'
+PROCESSED_DIR_PIPELINE_PROFILE = 'data/processed/pipeline_profile.json'
+PROFILES_DIR = 'outputs/profiles'
+PROCESSED_DIR_EXTRACTED_SHARDS = 'data/processed/extracted'
+PROCESSED_DIR_CHUNK_SHARDS = 'data/processed/chunks'
+PROCESSED_DIR_DEDUP_DOCUMENTS = 'data/processed/dedup/documents'
+PROCESSED_DIR_DEDUP_CHUNKS = 'data/processed/dedup/chunks'
 PROCESSED_DIR_TRAINING= 'data/processed/training_chunks.jsonl'
+PROCESSED_DIR_TRAINING_CHECKPOINT = 'data/processed/training_chunks.checkpoint.jsonl'
+TRAINING_DATASET_DIR = 'data/processed/training_dataset'
+PROCESSED_DIR_MANIFEST = 'data/processed/collection_manifest.json'
+PROCESSED_DIR_CACHE = 'data/processed/cache'
+RETRIEVAL_INDEX_DIR = 'data/processed/retrieval_index'
 
 CONFIG_PATH = 'config/pipeline_config.yaml'
 
+EVALUATION_DIR = 'outputs/evaluation'
+EVALUATION_RESULTS_PATH = 'outputs/evaluation/evaluation_results.json'
+EVALUATION_PREDICTION_CACHE = 'outputs/evaluation/prediction_cache'
+EVALUATION_RUNS_DIR = 'outputs/evaluation/runs'
+EVALUATION_DATASET = 'data/evaluation/qa_eval.jsonl'
+EVALUATION_MODEL_HASHES = 'outputs/evaluation/model_hashes.json'
+
 MODEL_DIR = "models/"
 MODEL_DOWNLOAD_URL = "https://huggingface.co/mahmuuud/llama3-3b-finetuned-gguf/resolve/main/llama3-3b-finetuned.Q4_K_M.gguf"
 MODEL_GUFF_PATH = 'models/llama3-3b-finetuned.Q4_K_M.gguf'
+MODEL_PREFIX_STATE_PATH = 'models/prefix_state.bin'
 
 
 
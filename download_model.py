@@ -1,32 +1,42 @@
 import os
-import requests
+import argparse
 from src.utils.logging import get_logger
 from src.utils.exception import CustomException
-import time
 from config.path_config import *
 from src.utils.cmn_func import read_yaml
+from src.model_download import RangeDownloader
+from src.gguf_check import ModelFileError, check_model_file
 
 logger = get_logger(__name__)
 config = read_yaml(CONFIG_PATH)
 
-model_path = MODEL_GUFF_PATH
-model_download_url = MODEL_DOWNLOAD_URL
-model_dir = MODEL_DIR 
-if not os.path.exists(model_path):
-    # Ensure the parent directory exists before attempting to download.
-    os.makedirs(model_dir , exist_ok=True)
-    try:
-        logger.info(f"Downloading the model from {model_download_url} to {model_path}")
 
-        response = requests.get(model_download_url, stream=True)
-        response.raise_for_status()
-        with open(model_path, "wb") as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
+def main():
+    download_config = config.get("model_download", {})
+    parser = argparse.ArgumentParser(description="Download the GGUF model with parallel, resumable range requests.")
+    parser.add_argument("--url", default=download_config.get("url") or MODEL_DOWNLOAD_URL)
+    parser.add_argument("--output", default=MODEL_GUFF_PATH)
+    parser.add_argument("--sha256", default=download_config.get("sha256"), help="expected SHA-256 (defaults to the hash the server publishes)")
+    parser.add_argument("--connections", type=int, default=download_config.get("connections", 8))
+    parser.add_argument("--force", action="store_true", help="download even if a valid model is already present")
+    args = parser.parse_args()
 
-        logger.info(f"Model downloaded and saved to {model_path}")
+    if os.path.exists(args.output) and not args.force:
+        try:
+            check_model_file(args.output)
+            logger.info(f"Model already present at {args.output}")
+            return
+        except ModelFileError as e:
+            logger.warning(f"Existing model is not usable ({e}), downloading it again")
 
+    try:
+        downloader = RangeDownloader.from_config({**download_config, "sha256": args.sha256, "connections": args.connections}, args.url, args.output)
+        downloader.download()
+        check_model_file(args.output)
     except Exception as e:
         logger.error(f"Failed to download model: {e}")
-        raise CustomException("Failed to download model", e)
\ No newline at end of file
+        raise CustomException("Failed to download model", e)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,18 @@
-import asyncio
-from src.data_collection import DataController
-from src.data_processing import DataProcessor
-from src.model_evalute import QAEvaluator
 from fastapi import FastAPI
 from src.routes import model
 from config.path_config import *
 from src.utils.cmn_func import read_yaml , load_model
 import os
-from transformers import AutoTokenizer
 from src.utils.logging import get_logger
-from src.routes.model import model_router
+from src.inference import InferenceScheduler
+from src.model_registry import LoadedModel, ModelRegistry, ModelUnavailableError
+from src.answer_cache import AnswerCache, model_fingerprint
+from src.routes.model import SYSTEM_PROMPT, GENERATION_PARAMS, render_prompt
+from src.prompt_cache import PrefixKVCache, shared_prefix
+from src.chat_template import load_chat_template
+from src.telemetry import Telemetry
+from src.retrieval import load_index
+from src.gguf_check import ModelFileError, check_model_file
 
 from contextlib import asynccontextmanager
 
@@ -17,38 +20,161 @@ from contextlib import asynccontextmanager
 logger = get_logger(__name__)
 config = read_yaml(CONFIG_PATH)
 
-def run_full_pipeline():
-    # 1. Collect data
-    collector = DataController()
-    processor = DataProcessor()
-    evaluate = QAEvaluator()
-    collector.extract_all()
-    processor.generate_quations_and_answers()
-    #evaluate.evalute() # activate if your huggingface account has credit
 
+def scrape_gauges(app):
+    gauges = {}
+    if app.state.models is not None:
+        stats = app.state.models.stats()
+        gauges.update({
+            "qa_model_instances": stats["pool_size"],
+            "qa_model_instances_idle": stats["idle"],
+            "qa_queue_waiting": stats["waiting"],
+            "qa_models_loaded": len(stats["loaded"]),
+            "qa_models_memory_bytes": app.state.models.used_bytes
+        })
+    if app.state.answer_cache is not None:
+        stats = app.state.answer_cache.stats()
+        gauges.update({"qa_answer_cache_entries": stats["entries"], "qa_answer_cache_bytes": stats["bytes"]})
+    if app.state.retrieval_index is not None:
+        gauges["qa_retrieval_chunks"] = len(app.state.retrieval_index)
+    return gauges
+
+
+def prefix_state_path(prefix_config , variant , default_name):
+    # Every variant keeps its own saved prefix state; the default one stays at the configured path.
+    state_path = prefix_config.get("state_path", MODEL_PREFIX_STATE_PATH)
+    if variant.name == default_name:
+        return state_path
+    root, ext = os.path.splitext(state_path)
+    return f"{root}.{variant.name}{ext}"
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # This check runs on startup
-    model_path = MODEL_GUFF_PATH
-    if not os.path.exists(model_path):
-        error_msg = f"Model not found at {model_path}. Please run `python download_model.py` to download the model before starting the application."
-        logger.critical(error_msg)
-        raise FileNotFoundError(error_msg)
-
-    logger.info("Loading the model and tokenizer")
-    app.state.llm_model = load_model(model_path)
-    app.state.tokenizer = AutoTokenizer.from_pretrained(config["training"]["model_name"])
+    models_config = config["api"].get("models", {})
+    prefix_config = config["api"].get("prefix_cache", {})
+    inference_config = config["api"].get("inference", {})
+    batch_config = config["api"].get("batching", {})
+    date_string = config["training"].get("dataset", {}).get("date_string")
+    app.state.telemetry = Telemetry.from_config(config["api"].get("telemetry", {}))
+
+    def load_variant(variant):
+        # Runs in a worker thread, so serving continues while a variant loads or swaps in.
+        if variant.backend == "llama":
+            if not os.path.exists(variant.path):
+                raise FileNotFoundError(f"Model not found at {variant.path}. Please run `python download_model.py` to download the model before starting the application.")
+            try:
+                check_model_file(variant.path, variant.settings.get("verify", "header"))
+            except ModelFileError as e:
+                raise ModelUnavailableError(f"{e}. Run `python download_model.py` to repair the download (it resumes partial files).") from e
+
+        logger.info(f"Loading model '{variant.name}' ({variant.backend} backend) and chat template")
+        settings = variant.settings
+        template_kind = variant.template_kind
+        state = {
+            "chat_template": None if template_kind == "gguf" else load_chat_template(template_kind, tokenizer_name=config["training"]["model_name"], date_string=date_string),
+            "prefix_cache": None
+        }
+
+        def create_model():
+            if variant.backend == "stub":
+                # Deterministic model for benchmarks and CI; it keeps no KV state to cache.
+                from src.stub_model import StubLlama
+
+                return StubLlama(**settings.get("stub", {}))
+
+            llm_model = load_model(
+                variant.path,
+                use_mmap=settings.get("use_mmap", True),
+                use_mlock=settings.get("use_mlock", False),
+                n_threads=settings.get("n_threads"),
+                n_ctx=settings.get("n_ctx")
+            )
+            if state["chat_template"] is None:
+                state["chat_template"] = load_chat_template("gguf", llm_model, date_string=date_string)
+
+            if prefix_config.get("enabled", True):
+                if state["prefix_cache"] is None:
+                    state["prefix_cache"] = PrefixKVCache(
+                        shared_prefix(lambda question: render_prompt(state["chat_template"], question)),
+                        model_fingerprint(variant.path),
+                        prefix_state_path(prefix_config, variant, app.state.models.default),
+                        sample_prompt=render_prompt(state["chat_template"], "How long does DC fast charging take?")
+                    )
+                state["prefix_cache"].prepare(llm_model)
+                llm_model._prefix_cache = state["prefix_cache"]
+            return llm_model
+
+        scheduler = InferenceScheduler(
+            create_model,
+            pool_size=settings.get("pool_size", 1),
+            max_queue=inference_config.get("max_queue", 16),
+            timeout=inference_config.get("timeout", 60),
+            telemetry=app.state.telemetry
+        )
+        scheduler.start()
+
+        batcher = None
+        if batch_config.get("enabled", False) and variant.backend == "llama":
+            from src.batching import BATCHING_SUPPORTED, MicroBatcher
+
+            if BATCHING_SUPPORTED:
+                batcher = MicroBatcher(
+                    scheduler,
+                    batch_config,
+                    GENERATION_PARAMS["max_tokens"],
+                    GENERATION_PARAMS["stop"],
+                    render=lambda question: render_prompt(state["chat_template"], question)
+                )
+            else:
+                logger.warning("Batching is enabled, but the installed llama-cpp-python lacks the batch API; requests run one at a time")
+        return LoadedModel(variant, scheduler, state["chat_template"], batcher)
+
+    app.state.models = ModelRegistry.from_config(config["api"], load_variant, MODEL_GUFF_PATH, os.environ.get("MODEL_BACKEND"))
+    for name in models_config.get("preload") or [app.state.models.default]:
+        try:
+            await app.state.models.get(name)
+        except ModelUnavailableError as e:
+            logger.critical(str(e))
+            raise
+
+    cache_config = config["api"].get("cache", {})
+    app.state.answer_cache = None
+    if cache_config.get("enabled", True):
+        # One cache for every variant: each answer is keyed by the model version that produced it.
+        app.state.answer_cache = AnswerCache.from_config(
+            cache_config,
+            "models",
+            f"{config['training']['model_name']}\0{SYSTEM_PROMPT}"
+        )
+
+    app.state.retrieval_index = None
+    if config["api"].get("retrieval", {}).get("enabled", True):
+        index_dir = config.get("retrieval", {}).get("index_dir", RETRIEVAL_INDEX_DIR)
+        app.state.retrieval_index = load_index(index_dir)
+        if app.state.retrieval_index is None:
+            logger.warning(f"No retrieval index in {index_dir}; build it with `python -m src.retrieval` to enable grounded answers")
+        else:
+            logger.info(f"Loaded retrieval index with {len(app.state.retrieval_index)} chunks")
+
+    app.state.telemetry.gauges.append(lambda: scrape_gauges(app))
     yield
-    logger.info("Unloading model ...")
-    app.state.llm_model = None
+    logger.info("Unloading models ...")
+    await app.state.models.close()
+    app.state.models = None
+    app.state.answer_cache = None
+    if app.state.retrieval_index is not None:
+        app.state.retrieval_index.close()
+        app.state.retrieval_index = None
+
 
 
 
+if config["api"].get("run_pipeline_on_startup", False):
+    # Collection and QA generation pull in the whole data stack, so they are only imported when asked for.
+    from pipeline import run_full_pipeline
 
+    run_full_pipeline()
 
-run_full_pipeline()
 app = FastAPI(title="Question Answering About Electric Vehicle Charging Stations", lifespan=lifespan)
 app.include_router(model.model_router)
-    
\ No newline at end of file
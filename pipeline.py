@@ -0,0 +1,69 @@
+import os
+import time
+import argparse
+from config.path_config import *
+from src.utils.cmn_func import read_yaml
+from src.profiling import PipelineProfiler, get_profiler, set_profiler
+from src.data_collection import DataController
+from src.data_processing import DataProcessor
+from src.retrieval import RetrievalIndex
+from src.training_data import PackedDatasetBuilder
+
+
+def run_full_pipeline(profile=None):
+    """
+    Runs collection, chunking and QA generation as one stream and, with
+    `retrieval.build_in_pipeline`, rebuilds the retrieval index from the new chunks; with
+    `training.dataset.build_in_pipeline`, the QA pairs are also tokenized and packed for
+    fine-tuning. `profile` ('timing', 'cprofile' or 'sampling') overrides `profiling.mode`;
+    when profiling is on, a stage/step run report is written to
+    `PROCESSED_DIR_PIPELINE_PROFILE`, next to the extraction summary.
+    """
+    config = read_yaml(CONFIG_PATH)
+    profiling_config = config.get("profiling", {})
+    mode = profile or (profiling_config.get("mode", "timing") if profiling_config.get("enabled", False) else None)
+    if mode:
+        set_profiler(PipelineProfiler(
+            mode,
+            output_dir=os.path.join(PROFILES_DIR, time.strftime('%Y%m%d-%H%M%S')),
+            sample_interval=profiling_config.get("sample_interval_ms", 10) / 1000.0
+        ))
+    profiler = get_profiler()
+
+    try:
+        # 1. Collect data
+        collector = DataController()
+        processor = DataProcessor()
+        # Collection, chunking and generation run as one stream: the first documents are chunked
+        # and sent for generation while later sources are still being fetched. The extracted and
+        # chunk shards are written as records pass through.
+        with profiler.stage("collect_and_generate") as stage:
+            chunks = processor.iter_clean_and_chunk(collector.iter_extract_all())
+            stage["items"] = processor.generate_quations_and_answers(chunks)["generated"]
+        retrieval_config = config.get("retrieval", {})
+        if retrieval_config.get("build_in_pipeline", False):
+            with profiler.stage("index") as stage:
+                index = RetrievalIndex.from_config(retrieval_config)
+                stage["items"] = len(index)
+                index.close()
+        if config["training"].get("dataset", {}).get("build_in_pipeline", False):
+            with profiler.stage("training_dataset") as stage:
+                builder = PackedDatasetBuilder.from_config(config["training"], config.get("evaluation", {}).get("holdout_percent"))
+                stage["items"] = builder.build_if_changed().meta["examples"]
+        # Evaluation runs separately (`python -m src.model_evalute`): the base model needs Hugging Face credit.
+    finally:
+        # A failing stage still gets its profile written, and the profiler does not stay installed.
+        if mode:
+            try:
+                profiler.save(PROCESSED_DIR_PIPELINE_PROFILE)
+            finally:
+                set_profiler(None)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Collect data and generate QA pairs.")
+    parser.add_argument("--profile", nargs="?", const="timing", choices=["timing", "cprofile", "sampling"],
+                        help="record per-stage timings (and optionally a cProfile or sampling profile)")
+    args = parser.parse_args()
+
+    run_full_pipeline(args.profile)
@@ -0,0 +1,228 @@
+import os
+import re
+import sys
+import time
+import zlib
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+from src.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+WHITESPACE = re.compile(r"\s+")
+TRAILING_PUNCTUATION = re.compile(r"[\s?!.]+$")
+WORD = re.compile(r"\w+")
+
+
+def normalize_question(question):
+    return TRAILING_PUNCTUATION.sub("", WHITESPACE.sub(" ", question.strip().lower()))
+
+
+def model_fingerprint(model_path):
+    """Identifies a model file by path, size and mtime, so a replaced file invalidates the cache."""
+    try:
+        stat = os.stat(model_path)
+        return f"{os.path.abspath(model_path)}:{stat.st_size}:{int(stat.st_mtime)}"
+    except OSError:
+        return os.path.abspath(model_path)
+
+
+class HashingEmbedder:
+    """
+    Dependency-free sentence embedding: word unigrams, bigrams and character trigrams are
+    hashed into a fixed number of dimensions and L2-normalized. Cheap enough to run on every
+    request and good at matching paraphrases that share most of their wording.
+    """
+
+    def __init__(self , dims=1024):
+        self.dims = dims
+
+    def features(self , text):
+        words = WORD.findall(text)
+        yield from words
+        yield from (f"{a} {b}" for a, b in zip(words, words[1:]))
+        for word in words:
+            padded = f"#{word}#"
+            yield from (padded[i:i + 3] for i in range(len(padded) - 2))
+
+    def __call__(self , text):
+        buckets = [zlib.crc32(feature.encode("utf-8")) % self.dims for feature in self.features(text)]
+        vector = np.bincount(buckets, minlength=self.dims).astype(np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class AnswerCache:
+    """
+    Answer cache in front of the model.
+
+    The exact layer is keyed by `model_id`, the chat template (`template_id`, e.g.
+    tokenizer name and system prompt), the generation parameters and the normalized
+    question, so a hit is served without building the prompt at all. The optional semantic
+    layer embeds the normalized question and returns the cached answer of the most similar
+    question whose cosine similarity reaches `semantic_threshold`. Entries are evicted
+    least-recently-used once the total size exceeds `max_bytes`, and expire after `ttl`
+    seconds. A cache shared by several models gets the serving model's version in the
+    parameters (`model`), so a swapped or different model never gets another's answers.
+    """
+
+    def __init__(self , model_id , template_id="" , max_bytes=64 * 1024 * 1024 , ttl=86400 , semantic_threshold=None , embedder=None):
+        self.model_id = model_id
+        self.template_id = template_id
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.semantic_threshold = semantic_threshold
+        self.embedder = embedder if semantic_threshold is not None else None
+        self.entries = OrderedDict()
+        self.size = 0
+        # Semantic layer: one embedding row per entry, with free rows reused after eviction.
+        self.embeddings = None
+        self.slot_keys = []
+        self.slot_params = []
+        self.free_slots = []
+        self.hits = {"exact": 0, "semantic": 0}
+        self.misses = 0
+
+    @classmethod
+    def from_config(cls , cache_config , model_id , template_id=""):
+        semantic = cache_config.get("semantic", {})
+        semantic_enabled = semantic.get("enabled", False)
+        return cls(
+            model_id,
+            template_id,
+            max_bytes=cache_config.get("max_bytes", 64 * 1024 * 1024),
+            ttl=cache_config.get("ttl", 86400),
+            semantic_threshold=semantic.get("threshold", 0.92) if semantic_enabled else None,
+            embedder=HashingEmbedder(semantic.get("dims", 1024)) if semantic_enabled else None
+        )
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+        self.embeddings = None
+        self.slot_keys, self.slot_params, self.free_slots = [], [], []
+
+    @staticmethod
+    def params_key(params):
+        return repr(sorted((params or {}).items()))
+
+    def key(self , question , params=None):
+        material = f"{self.model_id}\0{self.template_id}\0{self.params_key(params)}\0{normalize_question(question)}"
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def entry_size(self , question , answer):
+        size = sys.getsizeof(question) + sys.getsizeof(answer) + 256
+        return size + (self.embedder.dims * 4 if self.embedder is not None else 0)
+
+    def add_embedding(self , key , params_key , embedding):
+        if self.free_slots:
+            slot = self.free_slots.pop()
+        else:
+            slot = len(self.slot_keys)
+            self.slot_keys.append(None)
+            self.slot_params.append(None)
+            if self.embeddings is None:
+                self.embeddings = np.zeros((64, embedding.shape[0]), dtype=np.float32)
+            elif slot >= self.embeddings.shape[0]:
+                grown = np.zeros((self.embeddings.shape[0] * 2, embedding.shape[0]), dtype=np.float32)
+                grown[:slot] = self.embeddings[:slot]
+                self.embeddings = grown
+
+        self.embeddings[slot] = embedding
+        self.slot_keys[slot] = key
+        self.slot_params[slot] = params_key
+        return slot
+
+    def expired(self , entry , now):
+        return self.ttl is not None and now - entry["created"] > self.ttl
+
+    def remove(self , key):
+        entry = self.entries.pop(key)
+        self.size -= entry["size"]
+        if entry["slot"] is not None:
+            self.embeddings[entry["slot"]] = 0.0
+            self.slot_keys[entry["slot"]] = None
+            self.free_slots.append(entry["slot"])
+
+    def get(self , question , params=None):
+        """Returns `(answer, layer)` on a hit, where layer is 'exact' or 'semantic', else `(None, None)`."""
+        now = time.monotonic()
+        key = self.key(question, params)
+
+        entry = self.entries.get(key)
+        if entry is not None:
+            if not self.expired(entry, now):
+                self.entries.move_to_end(key)
+                self.hits["exact"] += 1
+                return entry["answer"], "exact"
+            self.remove(key)
+
+        if self.embedder is not None:
+            answer = self.semantic_lookup(question, params, now)
+            if answer is not None:
+                self.hits["semantic"] += 1
+                return answer, "semantic"
+
+        self.misses += 1
+        return None, None
+
+    def semantic_lookup(self , question , params , now):
+        if not self.entries or self.embeddings is None:
+            return None
+
+        params_key = self.params_key(params)
+        used = len(self.slot_keys)
+        similarities = self.embeddings[:used] @ self.embedder(normalize_question(question))
+
+        # Rows of evicted entries are zero, so only live rows can reach a positive threshold.
+        for slot in np.argsort(similarities)[::-1]:
+            if similarities[slot] < self.semantic_threshold:
+                return None
+            key = self.slot_keys[slot]
+            if key is None or self.slot_params[slot] != params_key:
+                continue
+
+            entry = self.entries[key]
+            if self.expired(entry, now):
+                self.remove(key)
+                continue
+            self.entries.move_to_end(key)
+            return entry["answer"]
+
+        return None
+
+    def put(self , question , answer , params=None):
+        key = self.key(question, params)
+        if key in self.entries:
+            self.remove(key)
+
+        size = self.entry_size(question, answer)
+        if size > self.max_bytes:
+            return
+
+        slot = None
+        if self.embedder is not None:
+            slot = self.add_embedding(key, self.params_key(params), self.embedder(normalize_question(question)))
+
+        self.entries[key] = {
+            "answer": answer,
+            "slot": slot,
+            "created": time.monotonic(),
+            "size": size
+        }
+        self.size += size
+
+        while self.size > self.max_bytes:
+            self.remove(next(iter(self.entries)))
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": dict(self.hits),
+            "misses": self.misses
+        }
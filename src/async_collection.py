@@ -0,0 +1,239 @@
+import queue
+import asyncio
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from src.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+USER_AGENT = "Educational-ML-Pipeline/1.0"
+
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+
+class HostRateLimiter:
+    """
+    Spaces out requests to the same host so each host sees at most `rate` requests per second,
+    while requests to different hosts proceed independently.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._next_slot = {}
+        self._locks = {}
+
+    async def wait(self, host):
+        if not self.interval:
+            return
+
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+
+        delay = slot - now
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def wait_sync(self, host):
+        """Blocking `wait` for the synchronous collector, which fetches from one thread."""
+        if not self.interval:
+            return
+
+        now = time.monotonic()
+        slot = max(now, self._next_slot.get(host, now))
+        self._next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class RetryableFetchError(Exception):
+
+    def __init__(self, status, retry_after=None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+class AsyncWebCollector:
+    """
+    Fetches web sources concurrently over a single pooled aiohttp session.
+
+    Concurrency is bounded globally by `max_concurrency`, requests to the same host are
+    throttled by `per_host_rate` (requests/second) and transient failures are retried
+    with exponential backoff.
+    """
+
+    def __init__(self, fetch_config , html_parser , cache=None):
+        self.max_concurrency = fetch_config.get("max_concurrency", 32)
+        self.per_host_limit = fetch_config.get("per_host_limit", 4)
+        self.per_host_rate = fetch_config.get("per_host_rate", 1.0)
+        self.max_retries = fetch_config.get("max_retries", 3)
+        self.backoff_base = fetch_config.get("backoff_base", 1.0)
+        self.backoff_max = fetch_config.get("backoff_max", 30.0)
+        self.timeout = fetch_config.get("timeout", 10)
+        self.html_parser = html_parser
+        self.cache = cache
+
+    def backoff_delay(self , attempt , retry_after=None):
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        delay = self.backoff_base * (2 ** attempt)
+        return min(delay, self.backoff_max) * random.uniform(0.5, 1.0)
+
+    @staticmethod
+    def parse_retry_after(value):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+
+    async def fetch(self , session , url):
+        """
+        Returns `(status, headers, content)`. When a cache is set the request is conditional,
+        so an unchanged page comes back as a 304 with an empty body.
+        """
+        host = urlsplit(url).netloc
+        headers = self.cache.conditional_headers(url) if self.cache is not None else None
+
+        for attempt in range(self.max_retries + 1):
+            await self.rate_limiter.wait(host)
+            try:
+                async with self.semaphore:
+                    async with session.get(url, headers=headers) as response:
+                        if response.status in RETRYABLE_STATUSES:
+                            raise RetryableFetchError(response.status, self.parse_retry_after(response.headers.get("Retry-After")))
+                        response.raise_for_status()
+                        return response.status, response.headers, await response.read()
+
+            except (RetryableFetchError, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff_delay(attempt, getattr(e, "retry_after", None))
+                logger.warning(f"Retrying {url} in {delay:.1f}s after {type(e).__name__}: {e}")
+                await asyncio.sleep(delay)
+
+    async def extract(self , session , url):
+        try:
+            status, headers, content = await self.fetch(session, url)
+
+            if self.cache is not None and status == 304:
+                text = self.cache.cached_text(url)
+                if text is None:
+                    raise ValueError("304 Not Modified without cached text")
+                self.cache.touch(url)
+                logger.info(f"Not modified, reusing cached text for URL: {url}")
+                return url, text
+
+            content_hash = self.cache.content_hash(content) if self.cache is not None else None
+            text = self.cache.cached_text(url, content_hash) if self.cache is not None else None
+            if text is None:
+                loop = asyncio.get_running_loop()
+                text = await loop.run_in_executor(None, self.html_parser, content)
+                logger.info(f"Extracted {len(text)} characters from URL: {url}")
+            else:
+                logger.info(f"Content unchanged, reusing cached text for URL: {url}")
+
+            if self.cache is not None:
+                self.cache.update_web(url, headers, content_hash, text)
+            return url, text
+
+        except Exception as e:
+            logger.error(f"Failed to process {url}: {e}")
+            text = self.cache.cached_text(url) if self.cache is not None else None
+            if text is not None:
+                logger.warning(f"Falling back to previously collected text for {url}")
+            return url, text
+
+    def open_session(self):
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.rate_limiter = HostRateLimiter(self.per_host_rate)
+
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency, limit_per_host=self.per_host_limit, ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        headers = {"User-Agent": USER_AGENT}
+        return aiohttp.ClientSession(connector=connector, timeout=timeout, headers=headers)
+
+    async def produce(self , urls , put):
+        """
+        Fetches `urls` and hands each `(url, text)` to `put` as it completes. A slot is held
+        from the start of a fetch until its result has been handed over, so at most
+        `max_concurrency` pages are in flight or waiting for a slow consumer. Stops early,
+        cancelling the remaining fetches, when `put` returns False.
+        """
+        loop = asyncio.get_running_loop()
+        slots = asyncio.Semaphore(self.max_concurrency)
+        finished = asyncio.Queue()
+        tasks = []
+
+        logger.info(f"Streaming {len(urls)} URLs with concurrency {self.max_concurrency}")
+        async with self.open_session() as session:
+            async def fetch(url):
+                finished.put_nowait(await self.extract(session, url))
+
+            async def launch():
+                for url in urls:
+                    await slots.acquire()
+                    tasks.append(asyncio.create_task(fetch(url)))
+
+            launcher = asyncio.create_task(launch())
+            try:
+                for _ in urls:
+                    result = await finished.get()
+                    # Blocks while the consumer's buffer is full, which holds back the crawl.
+                    if not await loop.run_in_executor(None, put, result):
+                        logger.info("Web collection closed by the consumer, cancelling the remaining fetches")
+                        return
+                    slots.release()
+            finally:
+                launcher.cancel()
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(launcher, *tasks, return_exceptions=True)
+
+    def stream(self , urls , buffer_size=64):
+        """
+        Synchronous generator over `(url, text)` tuples in completion order. The crawl runs on
+        its own event loop in a background thread, so callers can write each result out as
+        soon as it arrives instead of waiting for the whole crawl. Closing the generator stops
+        the crawl.
+        """
+        results = queue.Queue(maxsize=buffer_size)
+        stopped = threading.Event()
+        done = object()
+
+        def put(item):
+            while not stopped.is_set():
+                try:
+                    results.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def run():
+            try:
+                asyncio.run(self.produce(urls, put))
+            except Exception as e:
+                logger.error(f"Web collection stopped early: {e}")
+            finally:
+                put(done)
+
+        thread = threading.Thread(target=run, name="async-web-collector", daemon=True)
+        thread.start()
+
+        try:
+            while True:
+                item = results.get()
+                if item is done:
+                    break
+                yield item
+        finally:
+            stopped.set()
+            thread.join()
@@ -0,0 +1,300 @@
+import time
+import codecs
+import asyncio
+import threading
+
+import numpy as np
+import llama_cpp
+
+from src.inference import InferenceTimeoutError
+from src.prompt_cache import prompt_tokens, shared_prefix, shared_suffix
+from src.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+try:
+    # Private llama-cpp-python API; requirements.txt pins the version this was written against.
+    from llama_cpp._internals import LlamaBatch, LlamaContext
+    BATCHING_SUPPORTED = True
+except ImportError:
+    BATCHING_SUPPORTED = False
+
+
+class BatchedLlama:
+    """
+    Generates several prompts at once as separate sequences of one llama.cpp context.
+
+    All prompts are evaluated together, then every decode step feeds one token per active
+    sequence in a single `llama_decode` call, so the weights are streamed through the CPU
+    once per step for the whole batch rather than once per request. The context shares the
+    model weights of `llm` and has its own KV cache sized `n_ctx_per_seq * max_batch`.
+
+    `render` builds the full prompt for a question; with it, prompts too long for their
+    sequence lose the start of the user message rather than the chat-template header or the
+    generation prompt. Without it, only the BOS token is kept in front.
+    """
+
+    def __init__(self , llm , max_batch , n_ctx_per_seq=1024 , temperature=0.8 , top_k=40 , top_p=0.95 , seed=None , render=None):
+        self.llm = llm
+        self.max_batch = max_batch
+        self.n_ctx_per_seq = n_ctx_per_seq
+        self.temperature = temperature
+        self.top_k = top_k
+        self.top_p = top_p
+        self.rng = np.random.default_rng(seed)
+        self.last_timings = None
+        self.prompt_head, self.prompt_tail = 1, 0
+        if render is not None:
+            self.prompt_head = len(prompt_tokens(llm, shared_prefix(render)))
+            self.prompt_tail = len(llm.tokenize(shared_suffix(render).encode("utf-8"), add_bos=False, special=True))
+
+        params = llama_cpp.llama_context_default_params()
+        params.n_ctx = n_ctx_per_seq * max_batch
+        params.n_batch = llm.context_params.n_batch
+        params.n_ubatch = llm.context_params.n_ubatch
+        params.n_threads = llm.context_params.n_threads
+        params.n_threads_batch = llm.context_params.n_threads_batch
+        params.n_seq_max = max_batch
+        self.ctx = LlamaContext(model=llm._model, params=params, verbose=False)
+        self.n_batch = params.n_batch
+        self.batch = LlamaBatch(n_tokens=max(self.n_batch, max_batch), embd=0, n_seq_max=max_batch, verbose=False)
+        self.n_vocab = llm.n_vocab()
+
+        self.eog = {llm.token_eos()}
+        for marker in (b"<|eot_id|>", b"<|end_of_text|>", b"<|eom_id|>"):
+            tokens = llm.tokenize(marker, add_bos=False, special=True)
+            if len(tokens) == 1:
+                self.eog.add(tokens[0])
+
+    def tokenize(self , prompt):
+        return prompt_tokens(self.llm, prompt)
+
+    def fit(self , tokens , budget):
+        """Drops the start of the user message until the prompt fits in `budget` tokens."""
+        if len(tokens) <= budget:
+            return tokens
+        return tokens[:self.prompt_head] + tokens[len(tokens) - (budget - self.prompt_head):]
+
+    def fill(self , entries):
+        """`entries` is a list of `(seq_id, pos, token, wants_logits)`."""
+        batch = self.batch.batch
+        for k, (seq_id, pos, token, wants_logits) in enumerate(entries):
+            batch.token[k] = token
+            batch.pos[k] = pos
+            batch.n_seq_id[k] = 1
+            batch.seq_id[k][0] = seq_id
+            batch.logits[k] = wants_logits
+        batch.n_tokens = len(entries)
+        self.ctx.decode(self.batch)
+
+    def sample(self , index):
+        logits = np.ctypeslib.as_array(self.ctx.get_logits_ith(index), shape=(self.n_vocab,))
+        if not self.temperature:
+            return int(np.argmax(logits))
+
+        candidates = np.argpartition(logits, -self.top_k)[-self.top_k:] if self.top_k else np.arange(self.n_vocab)
+        scaled = logits[candidates].astype(np.float64) / self.temperature
+        probs = np.exp(scaled - scaled.max())
+        probs /= probs.sum()
+
+        order = np.argsort(probs)[::-1]
+        keep = order[:int(np.searchsorted(np.cumsum(probs[order]), self.top_p)) + 1]
+        probs = probs[keep] / probs[keep].sum()
+        return int(candidates[keep][self.rng.choice(len(keep), p=probs)])
+
+    def generate(self , prompts , max_tokens , stop=() , cancels=None , abort=None):
+        """
+        Returns one completion per prompt. A sequence finishes on an end-of-generation token,
+        a stop string, `max_tokens`, or when its entry in `cancels` is set; setting `abort`
+        finishes all of them.
+        """
+        if len(prompts) > self.max_batch:
+            raise ValueError(f"At most {self.max_batch} prompts per batch, got {len(prompts)}")
+        budget = self.n_ctx_per_seq - max_tokens
+        if budget <= self.prompt_head + self.prompt_tail:
+            raise ValueError(f"max_tokens ({max_tokens}) leaves no room for the prompt in n_ctx_per_seq ({self.n_ctx_per_seq})")
+
+        cancels = cancels or [threading.Event() for _ in prompts]
+        # Stop strings are searched for in the new text plus the characters a match could start in.
+        overlap = max((len(stop_string) for stop_string in stop), default=1) - 1
+        seqs = []
+        for prompt in prompts:
+            tokens = self.fit(self.tokenize(prompt), budget)
+            seqs.append({
+                "tokens": tokens, "n_past": len(tokens), "out": [], "next": None, "done": False,
+                "pieces": [], "tail": "", "decoder": codecs.getincrementaldecoder("utf-8")(errors="ignore")
+            })
+
+        self.ctx.kv_cache_clear()
+        started = time.perf_counter()
+
+        # Prompt evaluation: all prompts share each decode call, n_batch tokens at a time.
+        flat = [
+            (seq_id, pos, token, pos == len(seq["tokens"]) - 1)
+            for seq_id, seq in enumerate(seqs)
+            for pos, token in enumerate(seq["tokens"])
+        ]
+        for start in range(0, len(flat), self.n_batch):
+            entries = flat[start:start + self.n_batch]
+            self.fill(entries)
+            for k, (seq_id, _, _, wants_logits) in enumerate(entries):
+                if wants_logits:
+                    self.accept(seqs[seq_id], self.sample(k), max_tokens, stop, overlap)
+
+        prompt_seconds = time.perf_counter() - started
+        decode_steps = 0
+
+        # Decoding: one token per active sequence per step.
+        while True:
+            for seq, cancel in zip(seqs, cancels):
+                if cancel.is_set() or (abort is not None and abort.is_set()):
+                    seq["done"] = True
+            active = [seq_id for seq_id, seq in enumerate(seqs) if not seq["done"]]
+            if not active:
+                break
+
+            self.fill([(seq_id, seqs[seq_id]["n_past"], seqs[seq_id]["next"], True) for seq_id in active])
+            decode_steps += len(active)
+            for k, seq_id in enumerate(active):
+                seqs[seq_id]["n_past"] += 1
+                self.accept(seqs[seq_id], self.sample(k), max_tokens, stop, overlap)
+
+        self.last_timings = {
+            "prompt_tokens": len(flat),
+            "prompt_seconds": prompt_seconds,
+            "decode_tokens": decode_steps,
+            "decode_seconds": time.perf_counter() - started - prompt_seconds
+        }
+        return ["".join(seq["pieces"]) for seq in seqs]
+
+    def accept(self , seq , token , max_tokens , stop , overlap):
+        if token in self.eog:
+            seq["done"] = True
+            return
+
+        seq["out"].append(token)
+        seq["next"] = token
+        # Only the new token is detokenized; the decoder holds back incomplete UTF-8 sequences.
+        piece = seq["decoder"].decode(self.llm.detokenize([token]))
+        seq["pieces"].append(piece)
+        window = seq["tail"] + piece
+        seq["tail"] = window[len(window) - overlap:] if len(window) > overlap else window
+
+        for stop_string in stop:
+            position = window.find(stop_string)
+            if position != -1:
+                text = "".join(seq["pieces"])
+                seq["pieces"] = [text[:len(text) - (len(window) - position)]]
+                seq["done"] = True
+                return
+
+        if len(seq["out"]) >= max_tokens or seq["n_past"] + 1 >= self.n_ctx_per_seq:
+            seq["done"] = True
+
+
+class MicroBatcher:
+    """
+    Collects concurrent requests into batches for `BatchedLlama`.
+
+    A batch is dispatched once `max_batch` requests are waiting or `window` seconds after the
+    first one arrived, whichever comes first, and runs on one model instance from the
+    inference scheduler. The request that opens a batch reserves the batch's place in the
+    scheduler queue, so a full queue rejects requests up front, never a formed batch. Each
+    caller gets its own completion back; a caller that times out only cancels its own
+    sequence.
+    """
+
+    def __init__(self , scheduler , batch_config , max_tokens , stop , render=None):
+        if not BATCHING_SUPPORTED:
+            raise RuntimeError("This llama-cpp-python version has no llama_cpp._internals batch API")
+        if max_tokens >= batch_config.get("n_ctx_per_seq", 1024):
+            raise ValueError(f"batching.n_ctx_per_seq ({batch_config.get('n_ctx_per_seq', 1024)}) must exceed max_tokens ({max_tokens})")
+
+        self.scheduler = scheduler
+        self.max_batch = batch_config.get("max_batch", 8)
+        self.window = batch_config.get("window_ms", 10) / 1000.0
+        self.batch_config = batch_config
+        self.max_tokens = max_tokens
+        self.stop = stop
+        self.render = render
+        self.pending = []
+        self.timer = None
+
+    def batched_model(self , llm):
+        # One batching context per model instance, created on first use in its worker thread.
+        batched = getattr(llm, "_micro_batched", None)
+        if batched is None:
+            batched = BatchedLlama(
+                llm,
+                self.max_batch,
+                n_ctx_per_seq=self.batch_config.get("n_ctx_per_seq", 1024),
+                temperature=self.batch_config.get("temperature", 0.8),
+                top_k=self.batch_config.get("top_k", 40),
+                top_p=self.batch_config.get("top_p", 0.95),
+                render=self.render
+            )
+            llm._micro_batched = batched
+        return batched
+
+    async def submit(self , prompt , timeout=None):
+        if len(self.pending) % self.max_batch == 0:
+            # Raises QueueFullError when the queue has no room for another batch.
+            self.scheduler.reserve()
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        cancel = threading.Event()
+        self.pending.append((prompt, future, cancel))
+
+        if len(self.pending) >= self.max_batch:
+            self.dispatch()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.window, self.dispatch)
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout or self.scheduler.timeout)
+        except asyncio.TimeoutError:
+            cancel.set()
+            raise InferenceTimeoutError("Generation timed out")
+        except asyncio.CancelledError:
+            cancel.set()
+            raise
+
+    def dispatch(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+        while self.pending:
+            batch, self.pending = self.pending[:self.max_batch], self.pending[self.max_batch:]
+            asyncio.ensure_future(self.run_batch(batch))
+
+    async def run_batch(self , batch):
+        batch = [entry for entry in batch if not entry[1].done()]
+        if not batch:
+            self.scheduler.cancel_reservation()
+            return
+
+        prompts = [prompt for prompt, _, _ in batch]
+        cancels = [cancel for _, _, cancel in batch]
+        started = time.monotonic()
+
+        def generate(llm , cancel):
+            batched = self.batched_model(llm)
+            answers = batched.generate(prompts, self.max_tokens, self.stop, cancels, abort=cancel)
+            return answers, batched.last_timings
+
+        try:
+            answers, timings = await self.scheduler.run(generate, reserved=True)
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        if self.scheduler.telemetry is not None:
+            self.scheduler.telemetry.observe_generation(**timings, mode="batch")
+        logger.debug(f"Answered a batch of {len(batch)} questions in {time.monotonic() - started:.2f}s")
+        for (_, future, _), answer in zip(batch, answers):
+            if not future.done():
+                future.set_result(answer.strip())
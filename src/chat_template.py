@@ -0,0 +1,102 @@
+from datetime import datetime
+
+from src.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Shared by serving and the training dataset, so the model is served with the prompt it was trained on.
+SYSTEM_PROMPT = "You are a helpful assistant."
+
+
+def fixed_date_string(date_string=None):
+    # The 'Today Date' line is part of the shared system prefix: if it followed the clock, a
+    # server running past midnight would stop matching its prepared prefix KV state and
+    # cached answers. It is fixed once, from config or when the template is created.
+    return date_string or datetime.now().strftime("%d %b %Y")
+
+
+class Llama3ChatTemplate:
+    """
+    Native implementation of the Llama 3.2 Instruct chat template, producing the same prompt
+    as `tokenizer.apply_chat_template(..., add_generation_prompt=True)` for plain system/user/
+    assistant messages without loading a Hugging Face tokenizer.
+    """
+
+    def __init__(self , date_string=None):
+        self.date_string = fixed_date_string(date_string)
+
+    @staticmethod
+    def header(role):
+        return f"<|start_header_id|>{role}<|end_header_id|>\n\n"
+
+    def __call__(self , messages , add_generation_prompt=True):
+        system_message = ""
+        if messages and messages[0]["role"] == "system":
+            system_message = messages[0]["content"].strip()
+            messages = messages[1:]
+
+        prompt = (
+            "<|begin_of_text|>"
+            + self.header("system")
+            + "Cutting Knowledge Date: December 2023\n"
+            + f"Today Date: {self.date_string}\n\n"
+            + system_message
+            + "<|eot_id|>"
+        )
+        for message in messages:
+            prompt += self.header(message["role"]) + message["content"].strip() + "<|eot_id|>"
+
+        if add_generation_prompt:
+            prompt += self.header("assistant")
+        return prompt
+
+
+class GGUFChatTemplate:
+    """
+    Renders the Jinja chat template embedded in the GGUF metadata (`tokenizer.chat_template`).
+    """
+
+    def __init__(self , llm , date_string=None):
+        from llama_cpp.llama_chat_format import Jinja2ChatFormatter
+
+        template = llm.metadata.get("tokenizer.chat_template")
+        if not template:
+            raise ValueError("GGUF file has no tokenizer.chat_template metadata")
+
+        def token_text(token_id):
+            return llm.detokenize([token_id], special=True).decode("utf-8", errors="ignore")
+
+        self.formatter = Jinja2ChatFormatter(
+            template=template,
+            eos_token=token_text(llm.token_eos()),
+            bos_token=token_text(llm.token_bos()),
+            add_generation_prompt=True
+        )
+        # Llama 3 templates read `date_string`; without it they fall back to a fixed default.
+        if date_string:
+            self.formatter._environment.globals["date_string"] = date_string
+
+    def __call__(self , messages , add_generation_prompt=True):
+        return self.formatter(messages=messages).prompt
+
+
+def load_chat_template(kind , llm=None , tokenizer_name=None , date_string=None):
+    """
+    `kind` is 'native' (built-in Llama 3.2 template), 'gguf' (template from the metadata of
+    the loaded model `llm`) or 'hf' (the Hugging Face tokenizer `tokenizer_name`, as a slow
+    fallback that needs transformers). `date_string` is the template's 'Today Date'
+    (`training.dataset.date_string`, so serving uses the date the model was trained with).
+    """
+    if kind == "native":
+        return Llama3ChatTemplate(date_string)
+    if kind == "gguf":
+        return GGUFChatTemplate(llm, date_string)
+    if kind == "hf":
+        from transformers import AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
+        date_string = fixed_date_string(date_string)
+        return lambda messages, add_generation_prompt=True: tokenizer.apply_chat_template(
+            messages, tokenize=False, add_generation_prompt=add_generation_prompt, date_string=date_string
+        )
+    raise ValueError(f"Unknown chat template: {kind}")
@@ -0,0 +1,71 @@
+from itertools import islice
+
+from src.utils.logging import get_logger
+from src.profiling import get_profiler
+
+logger = get_logger(__name__)
+
+
+class TokenChunker:
+    """
+    Splits documents into overlapping windows of `chunk_size` tokens.
+
+    The tokenizer is loaded once, on first use, and documents are encoded in batches by the
+    fast (Rust) tokenizer. Windows are cut with the offset mapping, so each chunk is a slice of
+    the original text rather than a decode of its token ids.
+    """
+
+    def __init__(self , model_name , chunk_size , overlap , batch_size=32):
+        if overlap >= chunk_size:
+            raise ValueError(f"overlap ({overlap}) must be smaller than chunk_size ({chunk_size})")
+
+        self.model_name = model_name
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.batch_size = batch_size
+        self._tokenizer = None
+
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None:
+            from transformers import AutoTokenizer
+
+            logger.info(f"Loading tokenizer {self.model_name}")
+            self._tokenizer = AutoTokenizer.from_pretrained(self.model_name, use_fast=True)
+            if not self._tokenizer.is_fast:
+                raise ValueError(f"{self.model_name} has no fast tokenizer, offset mappings are unavailable")
+        return self._tokenizer
+
+    def windows(self , text , offsets):
+        step = self.chunk_size - self.overlap
+        n_tokens = len(offsets)
+
+        for start in range(0, n_tokens, step):
+            end = min(start + self.chunk_size, n_tokens)
+            yield text[offsets[start][0]:offsets[end - 1][1]]
+            if end == n_tokens:
+                break
+
+    def iter_chunks(self , documents):
+        """
+        Takes an iterable of `(key, text)` pairs and yields `(key, chunk_id, chunk)` for every
+        window of every document, encoding `batch_size` documents per tokenizer call.
+        """
+        documents = iter(documents)
+        profiler = get_profiler()
+
+        while True:
+            batch = list(islice(documents, self.batch_size))
+            if not batch:
+                return
+
+            texts = [text for _, text in batch]
+            with profiler.section("tokenize", items=len(texts)):
+                encoded = self.tokenizer(texts, add_special_tokens=False, return_offsets_mapping=True, return_attention_mask=False)
+
+            for (key, text), offsets in zip(batch, encoded["offset_mapping"]):
+                for chunk_id, chunk in enumerate(profiler.iter("chunk", self.windows(text, offsets))):
+                    yield key, chunk_id, chunk
+
+    def chunk(self , text):
+        return [chunk for _, _, chunk in self.iter_chunks([(None, text)])]
@@ -0,0 +1,170 @@
+import os
+import json
+import time
+import hashlib
+from pathlib import Path
+
+from src.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class CollectionCache:
+    """
+    Per-source manifest of what was collected on previous runs.
+
+    Entries are keyed by URL or PDF path and record the validators needed to tell whether a
+    source changed (ETag/Last-Modified for web pages, mtime/size for files) together with the
+    sha256 of the raw content. Extracted text is stored once per content hash and extractor
+    under `cache_dir`, so unchanged sources are reused without being fetched or parsed again.
+
+    `extractors` names the extractor of each source type ('web', 'file'), e.g. the HTML
+    backend and a version of its rules. Text recorded by another extractor is not reused, and
+    text files no entry refers to any more are deleted when the manifest is saved.
+    """
+
+    def __init__(self , manifest_path , cache_dir , extractors=None):
+        self.manifest_path = Path(manifest_path)
+        self.cache_dir = Path(cache_dir)
+        self.extractors = extractors or {}
+        self.entries = self.load()
+
+    def load(self):
+        if not self.manifest_path.exists():
+            return {}
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable collection manifest {self.manifest_path}: {e}")
+            return {}
+
+    def save(self):
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+        self.prune_texts()
+
+    def prune_texts(self):
+        """Deletes cached text of sources that were dropped, changed or re-extracted."""
+        if not self.cache_dir.exists():
+            return
+        referenced = {self.text_path(entry["content_hash"], entry.get("extractor")).name for entry in self.entries.values()}
+        removed = 0
+        for path in self.cache_dir.glob("*.txt"):
+            if path.name not in referenced:
+                path.unlink(missing_ok=True)
+                removed += 1
+        if removed:
+            logger.info(f"Removed {removed} unused cached texts from {self.cache_dir}")
+
+    def prune(self , sources):
+        """Drops manifest entries for sources that are no longer configured."""
+        keep = set(sources)
+        for source in list(self.entries):
+            if source not in keep:
+                del self.entries[source]
+
+    @staticmethod
+    def content_hash(content):
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        return hashlib.sha256(content).hexdigest()
+
+    def text_path(self , content_hash , extractor=None):
+        if extractor is None:
+            return self.cache_dir / f"{content_hash}.txt"
+        return self.cache_dir / f"{content_hash}-{hashlib.sha1(extractor.encode('utf-8')).hexdigest()[:12]}.txt"
+
+    def cached_text_path(self , source):
+        """Path of the text stored for `source` by the current extractor of its type, or None."""
+        entry = self.entries.get(source)
+        if not entry or entry.get("extractor") != self.extractors.get(entry.get("type")):
+            return None
+        return self.text_path(entry["content_hash"], entry.get("extractor"))
+
+    def cached_text(self , source , content_hash=None):
+        """
+        Returns the cached text for `source`, or None if there is none. When `content_hash`
+        is given the cached text is only returned if the source content is unchanged.
+        """
+        path = self.cached_text_path(source)
+        if path is None or (content_hash is not None and self.entries[source].get("content_hash") != content_hash):
+            return None
+
+        try:
+            return path.read_text(encoding="utf-8")
+        except OSError:
+            return None
+
+    def store_text(self , content_hash , text , extractor=None):
+        path = self.text_path(content_hash, extractor)
+        if not path.exists():
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(".tmp")
+            tmp_path.write_text(text, encoding="utf-8")
+            os.replace(tmp_path, path)
+
+    # Web sources
+
+    def conditional_headers(self , url):
+        entry = self.entries.get(url, {})
+        headers = {}
+        # Without the cached text a 304 would leave nothing to reuse, so fetch unconditionally.
+        path = self.cached_text_path(url)
+        if path is None or not path.exists():
+            return headers
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def update_web(self , url , response_headers , content_hash , text):
+        self.store_text(content_hash, text, self.extractors.get("web"))
+        self.entries[url] = {
+            "type": "web",
+            "extractor": self.extractors.get("web"),
+            "etag": response_headers.get("ETag"),
+            "last_modified": response_headers.get("Last-Modified"),
+            "content_hash": content_hash,
+            "collected_at": time.strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+    def touch(self , source):
+        if source in self.entries:
+            self.entries[source]["checked_at"] = time.strftime('%Y-%m-%d %H:%M:%S')
+
+    # File sources
+
+    def is_file_unchanged(self , path):
+        entry = self.entries.get(str(path))
+        if not entry:
+            return False
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        return entry.get("mtime") == stat.st_mtime and entry.get("size") == stat.st_size
+
+    @staticmethod
+    def file_hash(path , chunk_size=1 << 20):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(chunk_size), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def update_file(self , path , content_hash , text):
+        stat = os.stat(path)
+        self.store_text(content_hash, text, self.extractors.get("file"))
+        self.entries[str(path)] = {
+            "type": "file",
+            "extractor": self.extractors.get("file"),
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "content_hash": content_hash,
+            "collected_at": time.strftime('%Y-%m-%d %H:%M:%S')
+        }
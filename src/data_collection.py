@@ -1,13 +1,21 @@
+import os
 import time
 import requests
 from pathlib import Path
-from bs4 import BeautifulSoup
-import pymupdf
 import json
+from itertools import chain
+from urllib.parse import urlsplit
 from src.utils.logging import get_logger
 from src.utils.cmn_func import read_yaml
 from config.path_config import *
 from src.utils.exception import CustomException
+from src.async_collection import AsyncWebCollector, HostRateLimiter, USER_AGENT
+from src.pdf_extraction import PDF_EXTRACTOR, ParallelPDFExtractor, iter_pdf_pages
+from src.collection_cache import CollectionCache
+from src.html_extraction import HTML_EXTRACTION_VERSION, get_html_extractor
+from src.text_processing import TextEngine
+from src.utils.jsonl_store import JsonlShardWriter
+from src.profiling import get_profiler
 
 logger = get_logger(__name__)
 
@@ -16,7 +24,9 @@ class DataController:
 
     def __init__(self):
         self.config = read_yaml(CONFIG_PATH)
-
+        self.cache = None
+        self.html_extractor = get_html_extractor(self.config["data_collection"].get("html_backend", "bs4"))
+        self.text_engine = TextEngine.from_config(self.config.get("text", {}))
 
 
     def extract_text_from_url(self , url:str):
@@ -24,56 +34,58 @@ class DataController:
             logger.info(f"extracting text from {url}")
 
             headers = {
-                "User-Agent" : "Educational-ML-Pipeline/1.0"
+                "User-Agent" : USER_AGENT
             }
+            if self.cache is not None:
+                headers.update(self.cache.conditional_headers(url))
 
-            response = requests.get(url , timeout= 10 , headers = headers)
+            profiler = get_profiler()
+            with profiler.section("fetch"):
+                response = requests.get(url , timeout= 10 , headers = headers)
             response.raise_for_status()
-            soup = BeautifulSoup(response.content , "html.parser")
-
-            for element in soup(['script', 'style', 'nav', 'footer', 'header', 'aside']):
-                element.decompose()
 
-            main_content = soup.find('main') or soup.find('article') or soup.find('div', class_='content')
-           
-            if main_content:
+            if self.cache is None:
+                with profiler.section("html_parse"):
+                    text = self.extract_text_from_html(response.content)
+                logger.info(f"Extracted {len(text)} characters from URL: {url}")
+                return text
 
-                text = main_content.get_text(separator="\n", strip=True)
+            if response.status_code == 304:
+                text = self.cache.cached_text(url)
+                if text is None:
+                    raise ValueError("304 Not Modified without cached text")
+                self.cache.touch(url)
+                logger.info(f"Not modified, reusing cached text for URL: {url}")
                 return text
-            
-            else:
-                # Fallback to all paragraphs
-                paragraphs = soup.find_all('p')
-                text = '\n'.join([p.get_text(strip=True) for p in paragraphs])
-                    
+
+            content_hash = self.cache.content_hash(response.content)
+            text = self.cache.cached_text(url , content_hash)
+            if text is None:
+                with profiler.section("html_parse"):
+                    text = self.extract_text_from_html(response.content)
                 logger.info(f"Extracted {len(text)} characters from URL: {url}")
-                return text
+            self.cache.update_web(url , response.headers , content_hash , text)
+            return text
 
         except Exception as e:
             logger.error(f"Failed to process URL: {url}.")
             raise CustomException(f"Error extracting from URL: {url}", e)
 
-    def is_quality_content(self , text , min_words=50):
-        words = text.split()
-    
-        # Length check
-        if len(words) < min_words:
-            return False
-        
+    def extract_text_from_html(self , content):
+        # Main content (<main>, <article> or <div class="content">), else all paragraphs.
+        return self.html_extractor(content)
 
-        domain_keywords = {'electric', 'vehicle', 'charging', 'battery', 'ev', 'station'}
-        text_lower = text.lower()
-        relevant_keywords = sum(1 for keyword in domain_keywords if keyword in text_lower)
-        
-        return relevant_keywords >= 2
+    def score_content(self , text):
+        # Word count, domain keywords and the quality verdict (text.min_words, min_keywords, ...).
+        with get_profiler().section("score"):
+            return self.text_engine.analyze(text)
 
 
 
     def extract_text_from_pdf(self, pdf_path):
         try:
             logger.info(f"extracting text from {pdf_path}")
-            doc = pymupdf.open(pdf_path)
-            text = "\n".join(page.get_text() for page in doc)
+            text = "\n".join(iter_pdf_pages(pdf_path))
             logger.info(f"Extracted {len(text)} characters from PDF: {pdf_path.name}")
             return text
 
@@ -82,18 +94,13 @@ class DataController:
             logger.error(f"Failed to process PDF: {pdf_path}.")
             raise CustomException(f"rror extracting from PDF: {pdf_path}", e)
 
-    def save_extracted_data(self , extracted , output_dir):
-        output_file = PROCESSED_DIR_EXTRACTED
-        with open(output_file , "w" , encoding='utf-8') as f:
-            json.dump(extracted , f , ensure_ascii=False  , indent=2)
+    def save_extraction_summary(self , counts , total_words):
+        total_docs = counts["web"] + counts["pdf"]
 
-        total_docs = len(extracted["web"]) + len(extracted["pdf"])
-        total_words = sum(item["word_count"] for item in extracted["web"] + extracted["pdf"])
-        
         summary = {
             "total_documents": total_docs,
-            "web_documents": len(extracted["web"]),
-            "pdf_documents": len(extracted["pdf"]),
+            "web_documents": counts["web"],
+            "pdf_documents": counts["pdf"],
             "total_words": total_words,
             "extraction_timestamp": time.strftime('%Y-%m-%d %H:%M:%S')
         }
@@ -107,58 +114,174 @@ class DataController:
 
 
 
-    def extract_all(self ):
+    def build_record(self , source , text , doc_type , stats):
+        return {
+            "source": source,
+            "doc_type": doc_type,
+            "text": text,
+            "word_count": stats["word_count"],
+            "keyword_density": round(stats["keyword_density"], 4),
+            "extracted_at": time.strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+    def extract_web_sync(self , urls):
+        # The same per-host spacing as the async crawl (fetch.per_host_rate), instead of a fixed pause per URL.
+        rate_limiter = HostRateLimiter(self.config["data_collection"].get("fetch", {}).get("per_host_rate", 1.0))
+        for i, url in enumerate(urls):
+            try:
+                rate_limiter.wait_sync(urlsplit(url).netloc)
+                text = self.extract_text_from_url(url)
+
+                # Quality check
+                stats = self.score_content(text)
+                if stats["quality"]:
+                    yield self.build_record(url , text , "web" , stats)
+                    logger.info(f"Successfully processed URL {i+1}/{len(urls)}")
+
+                else:
+                    logger.warning(f"Low quality content from {url}, skipping")
+
+            except Exception as e:
+                logger.error(f"Failed to process {url}: {e}")
+                text = self.cache.cached_text(url) if self.cache is not None else None
+                stats = self.score_content(text) if text is not None else None
+                if stats is not None and stats["quality"]:
+                    logger.warning(f"Falling back to previously collected text for {url}")
+                    yield self.build_record(url , text , "web" , stats)
+                continue
+
+    def extract_web_async(self , urls):
+        fetch_config = self.config["data_collection"].get("fetch", {})
+        profiler = get_profiler()
+        collector = AsyncWebCollector(fetch_config , profiler.wrap("html_parse", self.extract_text_from_html) , self.cache)
+
+        processed = 0
+        # Time the main thread spends waiting for the crawl; parsing is timed on its worker threads.
+        for url, text in profiler.iter("fetch", collector.stream(urls , fetch_config.get("buffer_size", 64))):
+            if text is None:
+                continue
+            stats = self.score_content(text)
+            if stats["quality"]:
+                processed += 1
+                yield self.build_record(url , text , "web" , stats)
+            else:
+                logger.warning(f"Low quality content from {url}, skipping")
+
+        logger.info(f"Successfully processed {processed}/{len(urls)} URLs")
+
+    def extract_pdf_sync(self , pdfs):
+        for pdf_path in pdfs:
+            try:
+                yield pdf_path, self.extract_text_from_pdf(Path(pdf_path))
+            except Exception as e:
+                logger.error(f"Failed to process {pdf_path}: {e}")
+                continue
+
+    def extract_pdf_parallel(self , pdfs):
+        extractor = ParallelPDFExtractor(self.config["data_collection"].get("pdf", {}))
+
+        for pdf_path, text in extractor.extract(pdfs):
+            logger.info(f"Extracted {len(text)} characters from PDF: {pdf_path}")
+            yield pdf_path, text
+
+    def cached_pdf_texts(self , pdfs):
+        """
+        Splits `pdfs` into those whose text can be reused from the cache and those that have to
+        be extracted. A file is unchanged if its mtime and size match the manifest, or failing
+        that, if its content hash does.
+        """
+        cached, pending, hashes = {}, [], {}
+
+        for pdf_path in pdfs:
+            if not os.path.exists(pdf_path):
+                pending.append(pdf_path)
+                continue
+
+            if self.cache.is_file_unchanged(pdf_path):
+                text = self.cache.cached_text(pdf_path)
+                if text is not None:
+                    cached[pdf_path] = text
+                    continue
+
+            content_hash = self.cache.file_hash(pdf_path)
+            text = self.cache.cached_text(pdf_path , content_hash)
+            if text is not None:
+                self.cache.update_file(pdf_path , content_hash , text)
+                cached[pdf_path] = text
+            else:
+                hashes[pdf_path] = content_hash
+                pending.append(pdf_path)
+
+        return cached, pending, hashes
+
+    def extract_pdfs(self , pdfs , pdf_mode):
+        pdfs = [str(pdf) for pdf in pdfs]
+        cached, pending, hashes = self.cached_pdf_texts(pdfs)
+        logger.info(f"Reusing cached text for {len(cached)}/{len(pdfs)} PDFs")
+
+        def texts():
+            yield from cached.items()
+            extracted = self.extract_pdf_parallel(pending) if pdf_mode == "process" else self.extract_pdf_sync(pending)
+            for pdf_path, text in get_profiler().iter("pdf_extract", extracted):
+                if pdf_path in hashes:
+                    self.cache.update_file(pdf_path , hashes[pdf_path] , text)
+                yield pdf_path, text
+
+        processed = 0
+        # PDFs can be long, so they are scored in batches on the text engine's process pool.
+        for pdf_path, text, stats in get_profiler().iter("score", self.text_engine.imap("analyze", texts(), size_hint=len(pdfs))):
+            if stats["quality"]:
+                processed += 1
+                yield self.build_record(pdf_path , text , "pdf" , stats)
+            else:
+                logger.warning(f"Low quality content from {pdf_path}, skipping")
+
+        logger.info(f"Successfully processed {processed}/{len(pdfs)} PDFs")
+
+    def iter_extract_all(self ):
+        """
+        Collects every configured source and yields each document record as soon as it is
+        extracted, while appending it to the JSONL shards in `PROCESSED_DIR_EXTRACTED_SHARDS`.
+        Sources that are unchanged since the previous run, according to the collection
+        manifest, reuse their cached text instead of being fetched and parsed again.
+        """
         urls = self.config["data_collection"]["web_sources"]
         pdfs = self.config["data_collection"]["pdf_sources"]
-        output_dir = Path(PROCESSED_DIR)
-
-        if not output_dir.exists():
-            
-            output_dir.mkdir(parents = True , exist_ok=True)
-            extracted = {"web": [], "pdf": []}
-
-            for i, url in enumerate(urls):
-                try:
-                    text = self.extract_text_from_url(url)
-                    
-                    # Quality check
-                    if self.is_quality_content(text):
-                        extracted["web"].append({
-                            "source": url,
-                            "text": text,
-                            "word_count": len(text.split()),
-                            "extracted_at": time.strftime('%Y-%m-%d %H:%M:%S')
-                        })
-                        logger.info(f"Successfully processed URL {i+1}/{len(urls)}")
-                        
-                    else:
-                        logger.warning(f"Low quality content from {url}, skipping")
-                    
-                    time.sleep(1)
-                    
-                except Exception as e:
-                    logger.error(f"Failed to process {url}")
-                    continue
-            
-            # Process PDFs
-            for pdf_path in pdfs:
-                try:
-                    text = self.extract_text_from_pdf(Path(pdf_path))
-                    if self.is_quality_content(text):
-                        extracted["pdf"].append({
-                            "source": str(pdf_path),
-                            "text": text,
-                            "word_count": len(text.split()),
-                            "extracted_at": time.strftime('%Y-%m-%d %H:%M:%S')
-                        })
-                except Exception as e:
-                    logger.error(f"Failed to process {pdf_path}")
-                    continue
-    
-            self.save_extracted_data(extracted, output_dir)
-        
-        else:
-            logger.info(f"Data already collected at {PROCESSED_DIR_EXTRACTED} ")
+        fetch_mode = self.config["data_collection"].get("fetch", {}).get("mode", "sync")
+        pdf_mode = self.config["data_collection"].get("pdf", {}).get("mode", "sync")
+        shard_size = self.config["processing"].get("shard_size", 1000)
+        Path(PROCESSED_DIR).mkdir(parents = True , exist_ok=True)
+
+        extractors = {"web": f"{self.html_extractor.__name__}:{HTML_EXTRACTION_VERSION}", "file": PDF_EXTRACTOR}
+        self.cache = CollectionCache(PROCESSED_DIR_MANIFEST , PROCESSED_DIR_CACHE , extractors)
+        self.cache.prune(list(urls) + [str(pdf) for pdf in pdfs])
+
+        web_records = self.extract_web_async(urls) if fetch_mode == "async" else self.extract_web_sync(urls)
+        # Process PDFs
+        pdf_records = self.extract_pdfs(pdfs , pdf_mode)
 
+        counts = {"web": 0, "pdf": 0}
+        total_words = 0
 
+        profiler = get_profiler()
+        with JsonlShardWriter(PROCESSED_DIR_EXTRACTED_SHARDS , "extracted" , shard_size) as writer:
+            for record in chain(web_records , pdf_records):
+                with profiler.section("write"):
+                    writer.write(record)
+                counts[record["doc_type"]] += 1
+                total_words += record["word_count"]
+                yield record
 
+        self.cache.save()
+        self.save_extraction_summary(counts , total_words)
+
+    def extract_all(self ):
+        """
+        Collects every source and returns the records by type, `{"web": [...], "pdf": [...]}`,
+        the layout of the legacy `raw_extracted_data.json`. Use `iter_extract_all` to stream
+        them instead of holding every document in memory.
+        """
+        extracted = {"web": [], "pdf": []}
+        for record in self.iter_extract_all():
+            extracted[record["doc_type"]].append(record)
+        return extracted
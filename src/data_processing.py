@@ -1,16 +1,17 @@
-import re
 import hashlib
 from src.utils.cmn_func import read_yaml
 from config.path_config import *
-from transformers import AutoTokenizer
-from pathlib import Path
+from src.chunking import TokenChunker
+from src.dedup import NearDuplicateIndex
+from src.text_processing import TextEngine
+from src.utils.jsonl_store import JsonlShardWriter, iter_jsonl, has_jsonl
 import json
 import os
-from vertexai.generative_models import GenerativeModel
-import vertexai
+from src.qa_generation import QAGenerationEngine, build_generation_client
 from dotenv import load_dotenv
 from src.utils.logging import get_logger
 from src.utils.exception import CustomException
+from src.profiling import get_profiler
 
 logger = get_logger(__name__)
 
@@ -23,94 +24,189 @@ class DataProcessor:
         self.MODEL_NAME = self.config['processing']['model_name']
         self.PROJECT_ID = os.getenv("GCP_PROJECT_ID", "")
         self.LOCATION = os.getenv("GCP_LOCATION", "")
+        self.chunker = TokenChunker(
+            self.config['training']['model_name'],
+            self.config['processing']['chunk_size'],
+            self.config['processing']['overlap'],
+            batch_size=self.config['processing'].get('tokenizer_batch_size', 32)
+        )
+        self.dedup_config = self.config['processing'].get('dedup', {})
+        self.text_engine = TextEngine.from_config(self.config.get('text', {}))
+        self.document_index = None
+        self.chunk_index = None
+        self.indexed_chunks = {}
 
         
 
     def clean_text(self , text):
         try:
-            logger.info(f"Start cleaning the text ")
-            text = re.sub(r"\s+", " ", text)  
-            text = re.sub(r"[\r\n\t]", " ", text)  
-            text = re.sub(r"(Page \d+ of \d+)", "", text, flags=re.I)
-            return text
+            return self.text_engine.normalize(text)
         except Exception as e:
-            logger.error(f"Failed to clean the data")
-            raise CustomException(f"Error while cleaning the text", e)
+            logger.error("Failed to clean the data")
+            raise CustomException("Error while cleaning the text", e)
+
+    def load_dedup_indexes(self):
+        if not self.dedup_config.get('enabled', True):
+            return
+
+        params = {
+            "num_perm": self.dedup_config.get('num_perm', 128),
+            "bands": self.dedup_config.get('bands', 32),
+            "shingle_size": self.dedup_config.get('shingle_size', 5)
+        }
+        self.document_index = NearDuplicateIndex.load(
+            PROCESSED_DIR_DEDUP_DOCUMENTS, threshold=self.dedup_config.get('document_threshold', 0.8), **params
+        )
+        self.chunk_index = NearDuplicateIndex.load(
+            PROCESSED_DIR_DEDUP_CHUNKS, threshold=self.dedup_config.get('chunk_threshold', 0.85), **params
+        )
+
+        # Sources removed from the config must not keep flagging new documents as their duplicates.
+        sources = self.current_sources()
+        removed = self.document_index.prune(lambda key: key in sources)
+        removed_chunks = self.chunk_index.prune(lambda key: key.rsplit("#", 1)[0] in sources)
+        if removed or removed_chunks:
+            logger.info(f"Dropped {removed} documents and {removed_chunks} chunks of removed sources from the dedup indexes")
+
+        # Chunk keys indexed by earlier runs, per source; they are evicted when the source is chunked again.
+        self.indexed_chunks = {}
+        for key in self.chunk_index.positions:
+            self.indexed_chunks.setdefault(key.rsplit("#", 1)[0], []).append(key)
+
+    def current_sources(self):
+        collection_config = self.config['data_collection']
+        return set(collection_config['web_sources']) | {str(pdf) for pdf in collection_config['pdf_sources']}
+
+    def save_dedup_indexes(self):
+        if self.document_index is not None:
+            self.document_index.save(PROCESSED_DIR_DEDUP_DOCUMENTS)
+            self.chunk_index.save(PROCESSED_DIR_DEDUP_CHUNKS)
+
+    def is_unique(self , text , key=None):
+        """
+        Checks `text` against the near-duplicate document index when dedup is enabled, and
+        falls back to exact md5 matching otherwise.
+        """
+        if self.document_index is not None:
+            duplicate_of = self.document_index.check_and_add(key, text)
+            if duplicate_of is not None:
+                logger.info(f"Near-duplicate of {duplicate_of}: {key}")
+                return False
+            return True
 
-    def is_unique(self , text):
-  
         hash_val = hashlib.md5(text.encode()).hexdigest()
         if hash_val in self.seen_hashes:
             return False
         self.seen_hashes.add(hash_val)
         return True
+
+    def is_unique_chunk(self , text , key):
+        if self.chunk_index is None:
+            return True
+        return self.chunk_index.check_and_add(key, text) is None
     
   
         
     def chunk_text(self , text):
         try:
-            
-            tokenizer = AutoTokenizer.from_pretrained(self.config['training']['model_name'])
-            chunk_size = self.config['processing']['chunk_size']
-            overlap = self.config['processing']['overlap']
-
-            tokens = tokenizer.encode(text)
-
-            chunks = []
-
-            for i in range(0, len(tokens), chunk_size - overlap):
-                chunk_tokens = tokens[i:i + chunk_size]
-                chunk = tokenizer.decode(chunk_tokens)
-                chunks.append(chunk)
-
-            return chunks
+            return self.chunker.chunk(text)
 
         except Exception as e:
-            logger.error(f"Failed to chunk the text")
-            raise CustomException(f"Error while chunking the text", e)
-
-
-    def clean_and_chunk(self):
+            logger.error("Failed to chunk the text")
+            raise CustomException("Error while chunking the text", e)
+
+    def iter_documents(self):
+        """
+        Streams extracted document records from the JSONL shards written by collection,
+        falling back to the legacy single-file `raw_extracted_data.json` if there are none.
+        """
+        if has_jsonl(PROCESSED_DIR_EXTRACTED_SHARDS):
+            yield from iter_jsonl(PROCESSED_DIR_EXTRACTED_SHARDS)
+            return
+
+        with open(PROCESSED_DIR_EXTRACTED, "r",encoding="utf-8") as f:
+            json_data = json.load(f)
+        for doc_type, docs in json_data.items():
+            for doc in docs:
+                yield {**doc, "doc_type": doc_type}
+
+    def iter_unique_documents(self , documents):
+        profiler = get_profiler()
+        # Cleaning runs ahead of dedup on the text engine's process pool, in document order.
+        cleaned = self.text_engine.imap("normalize", ((doc, doc["text"]) for doc in documents))
+        for doc, _, cleaned_text in profiler.iter("clean", cleaned):
+            source = doc["source"]
+
+            with profiler.section("dedup"):
+                # Chunk boundaries move when a source changes, so its old chunks must not match the new ones.
+                if self.chunk_index is not None:
+                    self.chunk_index.remove(self.indexed_chunks.pop(source, ()))
+                unique = self.is_unique(cleaned_text , source)
+            if not unique:
+                logger.info(f"Duplicate skipped: {source}")
+                continue
+
+            yield (source, doc["doc_type"]), cleaned_text
+
+    def iter_chunks(self , documents):
+        """
+        Yields chunk records for every unique document, tokenizing documents in batches.
+        """
         try:
-            logger.info(f"Start processing the text ")
-            raw_path = PROCESSED_DIR_EXTRACTED
-            
-            with open(raw_path, "r",encoding="utf-8") as f:
-                json_data = json.load(f)
-                
-            all_chunks = []
-            logger.info(f"Start Chunking the text ...")
-            for doc_type, docs in json_data.items():
-                for doc in docs:
-                    source = doc["source"]
-                    raw_text = doc["text"]
-                    cleaned_text = self.clean_text(raw_text)
-
-                    if not self.is_unique(cleaned_text):
-                        logger.info(f"Duplicate skipped: {source}")
-                        continue
-
-                    
-                    chunks = self.chunk_text(cleaned_text)
-                    for idx, chunk in enumerate(chunks):
-                            
-                        all_chunks.append({
-                                "source": source,
-                                "doc_type": doc_type,
-                                "chunk_id": idx,
-                                "text": chunk
-                            })
-
-            logger.info(f" Cleaned and chunked {len(all_chunks)} segments from {len(json_data['web']) + len(json_data['pdf'])} documents.")
-
-            with open( PROCESSED_DIR_CHUNKS , "w" , encoding='utf-8') as f:
-                json.dump(all_chunks , f , ensure_ascii=False  , indent=2)
-
-            return all_chunks
+            profiler = get_profiler()
+            for (source, doc_type), chunk_id, chunk in self.chunker.iter_chunks(self.iter_unique_documents(documents)):
+                with profiler.section("dedup"):
+                    unique = self.is_unique_chunk(chunk , f"{source}#{chunk_id}")
+                if not unique:
+                    logger.info(f"Duplicate chunk skipped: {source}#{chunk_id}")
+                    continue
+
+                yield {
+                    "source": source,
+                    "doc_type": doc_type,
+                    "chunk_id": chunk_id,
+                    "text": chunk
+                }
 
         except Exception as e:
-            logger.error(f"Failed to process the text")
-            raise CustomException(f"Error while processing text", e)
+            logger.error("Failed to chunk the text")
+            raise CustomException("Error while chunking the text", e)
+
+    def iter_clean_and_chunk(self , documents=None):
+        """
+        Yields chunk records as they are produced while appending them to the chunk shards in
+        `PROCESSED_DIR_CHUNK_SHARDS`. `documents` defaults to the extracted shards on disk, but
+        can be any iterable of records, e.g. `DataController.iter_extract_all()`, so chunking
+        starts before collection has finished.
+        """
+        try:
+            logger.info("Start processing the text ")
+            profiler = get_profiler()
+            documents = profiler.iter("read", self.iter_documents()) if documents is None else documents
+            shard_size = self.config['processing'].get('shard_size', 1000)
+            self.load_dedup_indexes()
+
+            logger.info("Start Chunking the text ...")
+            with JsonlShardWriter(PROCESSED_DIR_CHUNK_SHARDS , "chunks" , shard_size) as writer:
+                for chunk in self.iter_chunks(documents):
+                    with profiler.section("write"):
+                        writer.write(chunk)
+                    yield chunk
+
+            self.save_dedup_indexes()
+            logger.info(f" Cleaned and chunked {writer.count} segments.")
+
+        except CustomException:
+            raise
+        except Exception as e:
+            logger.error("Failed to process the text")
+            raise CustomException("Error while processing text", e)
+
+    def clean_and_chunk(self , documents=None):
+        count = 0
+        for _ in self.iter_clean_and_chunk(documents):
+            count += 1
+        return count
 
 
     def make_prompt(self , chunk):
@@ -155,59 +251,28 @@ class DataProcessor:
 
             JSON Output:'''
 
-    def generate_quations_and_answers(self):
-        if not os.path.exists(PROCESSED_DIR_TRAINING):
-            vertexai.init(project=self.PROJECT_ID, location=self.LOCATION)
-            model = GenerativeModel(self.MODEL_NAME)
-            logger.info(f"Successfully initialzed {self.MODEL_NAME} ")
-
-            training_data = []
-            chunks = self.clean_and_chunk()
-            logger.info(f"Start build QA format data ...  ")
-
-            for i, chunk in enumerate(chunks):
-
-                prompt = self.make_prompt(chunk['text'])
-                
-                resp = model.generate_content(
-                    prompt , 
-                    generation_config={"max_output_tokens": 8192, "temperature": 0.3, "top_p": 0.9}
-                )
-
-                resp_text = resp.text
-                resp_text = resp_text.replace("```" , "").replace("json","")
-
-                qa_pairs = json.loads(resp_text)
-
-                for qa in qa_pairs:
-                    training_example = {
-                            "instruction": qa["question"],
-                            "input": "",  
-                            "output": qa["answer"]
-                        }
-
-
-                    training_data.append({
-                        "alpaca_format": training_example,
-                        "text_format": f"### Question: {qa['question']}\n### Answer: {qa['answer']}"
-                    })
-
-
-            logger.info(f" Created {len(training_data)} simple QA ")
-            
-
-            with open(PROCESSED_DIR_TRAINING, 'w', encoding='utf-8') as f:
-                for example in training_data:
-                    f.write(json.dumps(example, ensure_ascii=False) + '\n')
-        else:
-
-            logger.info(f"Data already processed at {PROCESSED_DIR_TRAINING} ")
-
-        
-
-
-
-                
-
-                
+    def generate_quations_and_answers(self , chunks=None):
+        """
+        Generates QA pairs for every chunk with the concurrent, checkpointed generation engine.
+        Each finished chunk is appended to the training file right away, so an interrupted run
+        resumes from the last finished chunk. `chunks` defaults to `iter_clean_and_chunk()`, so
+        chunking and generation run as one stream. Only chunks not recorded in the checkpoint
+        are sent for generation.
+        """
+        client = build_generation_client(self.config['processing'], self.PROJECT_ID, self.LOCATION)
+        engine = QAGenerationEngine(
+            client,
+            self.make_prompt,
+            self.config['processing'].get('generation', {}),
+            PROCESSED_DIR_TRAINING,
+            PROCESSED_DIR_TRAINING_CHECKPOINT
+        )
+
+        chunks = self.iter_clean_and_chunk() if chunks is None else chunks
+        logger.info("Start build QA format data ...  ")
+        # Chunking runs on the engine's reader thread while requests are in flight; its steps are timed on that thread.
+        with get_profiler().section("generate", items=0) as step:
+            stats = engine.run(chunks)
+            step["items"] = stats["generated"]
+        return stats
 
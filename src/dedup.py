@@ -0,0 +1,166 @@
+import re
+import json
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+from src.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+WORD = re.compile(r"\w+")
+
+
+class MinHasher:
+    """
+    Computes MinHash signatures over word shingles, with all permutations evaluated at once
+    as a vectorized universal hash `(a * x + b) mod p`.
+    """
+
+    def __init__(self , num_perm=128 , shingle_size=5 , seed=1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        generator = np.random.RandomState(seed)
+        self.a = generator.randint(1, np.iinfo(np.int64).max, size=num_perm, dtype=np.int64).astype(np.uint64)
+        self.b = generator.randint(0, np.iinfo(np.int64).max, size=num_perm, dtype=np.int64).astype(np.uint64)
+
+    def shingles(self , text):
+        words = WORD.findall(text.lower())
+        if len(words) <= self.shingle_size:
+            return {" ".join(words)}
+        return {" ".join(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)}
+
+    def signature(self , text):
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) for shingle in self.shingles(text)),
+            dtype=np.uint64
+        )
+        with np.errstate(over="ignore"):
+            permuted = (np.outer(hashes, self.a) + self.b) % MERSENNE_PRIME & MAX_HASH
+        return permuted.min(axis=0)
+
+
+class NearDuplicateIndex:
+    """
+    Locality-sensitive hashing index over MinHash signatures.
+
+    Signatures are split into `bands` bands; items sharing any band bucket are candidates,
+    and a candidate counts as a near-duplicate when the estimated Jaccard similarity of the
+    two signatures reaches `threshold`. Items are stored under a key (e.g. the source URL),
+    so re-indexing the same source on a later run does not flag it as its own duplicate.
+    Removed items leave an empty slot behind until the index is saved and loaded again.
+    """
+
+    def __init__(self , threshold=0.8 , num_perm=128 , bands=32 , shingle_size=5):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands})")
+
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm, shingle_size)
+        self.keys = []
+        self.signatures = []
+        self.positions = {}
+        self.buckets = [{} for _ in range(bands)]
+
+    def __len__(self):
+        return len(self.positions)
+
+    def band_hashes(self , signature):
+        for band, rows in enumerate(signature.reshape(self.bands, self.rows)):
+            yield band, rows.tobytes()
+
+    def query(self , signature , key=None):
+        """
+        Returns the key of the most similar indexed item above the threshold, ignoring `key`
+        itself, or None.
+        """
+        candidates = set()
+        for band, band_hash in self.band_hashes(signature):
+            candidates.update(self.buckets[band].get(band_hash, ()))
+        candidates.discard(self.positions.get(key))
+
+        best_key, best_similarity = None, self.threshold
+        for position in candidates:
+            similarity = float(np.mean(self.signatures[position] == signature))
+            if similarity >= best_similarity:
+                best_key, best_similarity = self.keys[position], similarity
+        return best_key
+
+    def add(self , key , signature):
+        self.remove([key])
+        position = len(self.keys)
+        self.keys.append(key)
+        self.signatures.append(signature)
+        self.positions[key] = position
+
+        for band, band_hash in self.band_hashes(signature):
+            self.buckets[band].setdefault(band_hash, []).append(position)
+
+    def remove(self , keys):
+        """Removes the items stored under `keys` from the index; unknown keys are ignored."""
+        removed = 0
+        for key in keys:
+            position = self.positions.pop(key, None)
+            if position is None:
+                continue
+
+            for band, band_hash in self.band_hashes(self.signatures[position]):
+                bucket = self.buckets[band][band_hash]
+                bucket.remove(position)
+                if not bucket:
+                    del self.buckets[band][band_hash]
+            self.keys[position] = self.signatures[position] = None
+            removed += 1
+        return removed
+
+    def prune(self , keep):
+        """Drops the items whose key fails `keep(key)`, e.g. those of sources no longer collected."""
+        return self.remove([key for key in self.positions if not keep(key)])
+
+    def check_and_add(self , key , text):
+        """
+        Returns the key of an existing near-duplicate of `text`, or None after indexing it.
+        """
+        signature = self.hasher.signature(text)
+        duplicate_of = self.query(signature, key)
+        if duplicate_of is None:
+            self.add(key, signature)
+        return duplicate_of
+
+    def save(self , path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        keys = list(self.positions)
+        signatures = np.vstack([self.signatures[self.positions[key]] for key in keys]) if keys \
+            else np.empty((0, self.bands * self.rows), dtype=np.uint64)
+        np.save(path.with_suffix(".npy"), signatures)
+        with open(path.with_suffix(".json"), "w", encoding="utf-8") as f:
+            json.dump({"threshold": self.threshold, "bands": self.bands, "rows": self.rows,
+                       "shingle_size": self.hasher.shingle_size, "keys": keys}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls , path , threshold=0.8 , num_perm=128 , bands=32 , shingle_size=5):
+        """
+        Loads a saved index, or returns an empty one if there is none or it was built with
+        different signature parameters.
+        """
+        path = Path(path)
+        index = cls(threshold, num_perm, bands, shingle_size)
+        if not path.with_suffix(".json").exists():
+            return index
+
+        with open(path.with_suffix(".json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if (meta["bands"], meta["rows"], meta["shingle_size"]) != (index.bands, index.rows, shingle_size):
+            logger.warning(f"Ignoring near-duplicate index at {path}, built with different parameters")
+            return index
+
+        for key, signature in zip(meta["keys"], np.load(path.with_suffix(".npy"))):
+            index.add(key, signature)
+        logger.info(f"Loaded near-duplicate index with {len(index)} items from {path}")
+        return index
@@ -0,0 +1,304 @@
+import os
+import json
+import hashlib
+import threading
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+
+from src.metrics import QAMetrics
+from src.answer_cache import model_fingerprint
+from src.chat_template import load_chat_template
+from src.prompt_cache import prompt_tokens
+from src.utils.cmn_func import load_model
+from src.utils.jsonl_store import jsonl_files, iter_jsonl
+from src.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+def batched(iterable , size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def eval_item(record):
+    """Accepts `{"instruction", "reference"}` records and the training format (`alpaca_format`)."""
+    if "alpaca_format" in record:
+        record = {"instruction": record["alpaca_format"]["instruction"], "reference": record["alpaca_format"]["output"]}
+    if not record.get("instruction") or not record.get("reference"):
+        return None
+    return {"instruction": record["instruction"], "reference": record["reference"]}
+
+
+def in_holdout(instruction , holdout_percent):
+    bucket = int(hashlib.sha1(instruction.encode("utf-8")).hexdigest(), 16) % 10000
+    return bucket < holdout_percent * 100
+
+
+def iter_eval_items(path , holdout_percent=None , shard_index=0 , num_shards=1):
+    """
+    Streams `(index, item)` pairs of an evaluation set (a JSONL file or a directory of shards).
+    With `holdout_percent`, only the stable, hash-selected share of the questions is used, e.g.
+    a held-out split of the training file. Items are dealt round-robin to `num_shards` shards
+    and only shard `shard_index` is yielded; `index` is the position in the whole set.
+    """
+    index = 0
+    for record in iter_jsonl(path):
+        item = eval_item(record)
+        if item is None:
+            continue
+        if holdout_percent is not None and not in_holdout(item["instruction"], holdout_percent):
+            continue
+        if index % num_shards == shard_index:
+            yield index, item
+        index += 1
+
+
+def dataset_fingerprint(path , holdout_percent=None):
+    files = [model_fingerprint(str(file_path)) for file_path in jsonl_files(path)]
+    return hashlib.sha1(json.dumps([files, holdout_percent]).encode("utf-8")).hexdigest()
+
+
+def file_sha256(path , memo_path=None , block_size=1 << 20):
+    """
+    SHA-256 of a (multi-GB) model file. Hashes are remembered in `memo_path` under the file's
+    path, size and mtime, so an unchanged file is only read once.
+    """
+    memo = {}
+    if memo_path and os.path.exists(memo_path):
+        with open(memo_path, "r", encoding="utf-8") as f:
+            memo = json.load(f)
+
+    fingerprint = model_fingerprint(path)
+    if fingerprint in memo:
+        return memo[fingerprint]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    memo[fingerprint] = digest.hexdigest()
+
+    if memo_path:
+        write_json(memo_path, memo)
+    return memo[fingerprint]
+
+
+def write_json(path , data):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+class PredictionCache:
+    """
+    Append-only JSONL cache of model predictions, keyed by model id (the GGUF file hash or the
+    hosted model name), prompt and generation parameters. Re-scoring a run with other metrics,
+    or re-running it after an interruption, only generates what is not cached yet.
+
+    The cache is a directory read as a whole; every process appends to its own `writer` file,
+    so shards evaluated in parallel never interleave their writes.
+    """
+
+    def __init__(self , directory , writer="predictions"):
+        self.directory = directory
+        self.path = os.path.join(directory, f"{writer}.jsonl")
+        self.entries = {}
+        self.lock = threading.Lock()
+
+        for record in iter_jsonl(directory):
+            self.entries[record["key"]] = record["prediction"]
+        logger.info(f"Loaded {len(self.entries)} cached predictions from {directory}")
+
+    @staticmethod
+    def key(model_id , prompt , params):
+        material = json.dumps([model_id, prompt, params], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self , key):
+        return self.entries.get(key)
+
+    def put(self , key , prediction):
+        with self.lock:
+            self.entries[key] = prediction
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"key": key, "prediction": prediction}, ensure_ascii=False) + "\n")
+
+
+class GGUFPredictor:
+    """
+    Generates with a local GGUF model on `workers` llama.cpp instances, one per worker thread.
+    The weights are memory-mapped once and shared; the cores are split evenly between the
+    instances unless `n_threads` is given.
+    """
+
+    def __init__(self , model_path , system_prompt , params , workers=2 , n_threads=None , template_kind="native" , tokenizer_name=None , hash_memo_path=None , date_string=None):
+        self.model_path = model_path
+        self.system_prompt = system_prompt
+        self.params = params
+        self.workers = workers
+        self.n_threads = n_threads or max(1, (os.cpu_count() or 1) // workers)
+        self.model_id = self.identify(model_path, hash_memo_path)
+        self.local = threading.local()
+        self.chat_template = load_chat_template(
+            template_kind,
+            self.instance() if template_kind == "gguf" else None,
+            tokenizer_name,
+            date_string
+        )
+
+    @staticmethod
+    def identify(model_path , hash_memo_path=None):
+        """The `model_id` a predictor for `model_path` gets, without loading the model."""
+        return f"gguf:{file_sha256(model_path, hash_memo_path)}"
+
+    def instance(self):
+        llm = getattr(self.local, "llm", None)
+        if llm is None:
+            llm = load_model(self.model_path, n_threads=self.n_threads)
+            self.local.llm = llm
+        return llm
+
+    def prompt(self , instruction):
+        messages = [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": instruction}
+        ]
+        return self.chat_template(messages, add_generation_prompt=True)
+
+    def generate(self , prompt):
+        llm = self.instance()
+        resp = llm(prompt=prompt_tokens(llm, prompt), echo=False, **self.params)
+        return resp['choices'][0]['text'].strip()
+
+
+class ChatAPIPredictor:
+    """Generates with a hosted model through an OpenAI-compatible chat API, `workers` requests at a time."""
+
+    def __init__(self , client , model , workers=8 , params=None):
+        self.client = client
+        self.model = model
+        self.workers = workers
+        self.params = params or {}
+        self.model_id = self.identify(model)
+
+    @staticmethod
+    def identify(model):
+        return f"api:{model}"
+
+    def prompt(self , instruction):
+        return instruction
+
+    def generate(self , prompt):
+        resp = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            **self.params
+        )
+        msg = resp.choices[0].message
+        return msg.content.strip() if hasattr(msg, 'content') else str(msg).strip()
+
+
+class EvaluationEngine:
+    """
+    Streams QA items through a predictor's worker pool `window` items at a time, serving
+    cached predictions without generating, and scores them with the local ROUGE/BLEU metrics.
+
+    `evaluate_shard` appends every scored example to a results file and saves the shard's
+    metric accumulators next to it after each window, so an interrupted run keeps its partial
+    scores and resumes where it stopped. Accumulators of all shards merge into the exact
+    corpus-level scores.
+    """
+
+    def __init__(self , cache=None , window=64):
+        self.cache = cache
+        self.window = window
+
+    def predict(self , predictor , instructions , pool):
+        prompts = [predictor.prompt(instruction) for instruction in instructions]
+        keys = [PredictionCache.key(predictor.model_id, prompt, predictor.params) for prompt in prompts]
+        predictions = [self.cache.get(key) if self.cache is not None else None for key in keys]
+
+        misses = [i for i, prediction in enumerate(predictions) if prediction is None]
+        for i, prediction in zip(misses, pool.map(predictor.generate, [prompts[i] for i in misses])):
+            predictions[i] = prediction
+            if self.cache is not None:
+                self.cache.put(keys[i], prediction)
+        return predictions
+
+    @staticmethod
+    def state_path(results_path):
+        return f"{results_path}.state.json"
+
+    def resume(self , results_path):
+        """Returns the indexes already scored in `results_path` and the metrics over them."""
+        metrics = QAMetrics()
+        done = set()
+        if not os.path.exists(results_path):
+            return done, metrics
+
+        # Drop a line cut off by an interrupted write, so new results start on a fresh line.
+        with open(results_path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+
+        for records in batched(iter_jsonl(results_path), self.window):
+            metrics.update([record["prediction"] for record in records], [record["reference"] for record in records])
+            done.update(record["index"] for record in records)
+        logger.info(f"Resuming {results_path} after {len(done)} scored examples")
+        return done, metrics
+
+    def save_state(self , results_path , metrics , complete):
+        write_json(self.state_path(results_path), {
+            "examples": metrics.count,
+            "complete": complete,
+            "metrics": metrics.result(),
+            "state": metrics.state()
+        })
+
+    def evaluate_shard(self , predictor , items , results_path):
+        """Scores the `(index, item)` pairs of one shard and returns its `QAMetrics`."""
+        os.makedirs(os.path.dirname(results_path) or ".", exist_ok=True)
+        done, metrics = self.resume(results_path)
+        pending = ((index, item) for index, item in items if index not in done)
+
+        with ThreadPoolExecutor(max_workers=predictor.workers) as pool, open(results_path, "a", encoding="utf-8") as f:
+            for window in batched(pending, self.window):
+                predictions = self.predict(predictor, [item['instruction'] for _, item in window], pool)
+                references = [item['reference'] for _, item in window]
+                scores = metrics.update(predictions, references)
+
+                for (index, item), prediction, score in zip(window, predictions, scores):
+                    record = {"index": index, **item, "prediction": prediction}
+                    record.update(zip(("rouge1", "rouge2", "rougeL"), score.tolist()))
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+                self.save_state(results_path, metrics, complete=False)
+                logger.info(f"{predictor.model_id}: {metrics.count} examples scored in {results_path}")
+
+        self.save_state(results_path, metrics, complete=True)
+        return metrics
+
+    @staticmethod
+    def merge_shards(results_paths):
+        """Merges the saved accumulators of shard results into corpus metrics; returns `(metrics, complete)`."""
+        metrics = QAMetrics()
+        complete = True
+        for results_path in results_paths:
+            state_path = EvaluationEngine.state_path(results_path)
+            if not os.path.exists(state_path):
+                complete = False
+                continue
+            with open(state_path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            metrics.merge(QAMetrics.from_state(saved["state"]))
+            complete = complete and saved["complete"]
+        return metrics, complete
@@ -0,0 +1,184 @@
+import os
+import mmap
+import struct
+
+from src.model_download import read_manifest, sha256_file
+from src.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+GGUF_MAGIC = b"GGUF"
+SUPPORTED_VERSIONS = (2, 3)
+DEFAULT_ALIGNMENT = 32
+
+# GGUF metadata value types: fixed sizes for scalars; 8 = string, 9 = array.
+SCALAR_SIZES = {0: 1, 1: 1, 2: 2, 3: 2, 4: 4, 5: 4, 6: 4, 7: 1, 10: 8, 11: 8, 12: 8}
+GGUF_STRING, GGUF_ARRAY, GGUF_UINT32 = 8, 9, 4
+
+# KV cache bytes per token of a Llama 3.2 3B model (28 layers, 1024-wide K and V in f16),
+# used when the model file cannot be read.
+DEFAULT_KV_BYTES_PER_TOKEN = 2 * 28 * 1024 * 2
+
+# ggml tensor types -> (elements per block, bytes per block), for the size of each tensor.
+GGML_TYPE_SIZES = {
+    0: (1, 4), 1: (1, 2), 2: (32, 18), 3: (32, 20), 6: (32, 22), 7: (32, 24), 8: (32, 34), 9: (32, 36),
+    10: (256, 84), 11: (256, 110), 12: (256, 144), 13: (256, 176), 14: (256, 210), 15: (256, 292),
+    16: (256, 66), 17: (256, 74), 18: (256, 98), 19: (256, 50), 20: (32, 18), 21: (256, 110),
+    22: (256, 82), 23: (256, 136), 24: (1, 1), 25: (1, 2), 26: (1, 4), 27: (1, 8), 28: (1, 8),
+    29: (256, 56), 30: (1, 2), 34: (256, 54), 35: (256, 66)
+}
+
+
+class ModelFileError(Exception):
+    pass
+
+
+class GGUFReader:
+    """Bounds-checked little-endian reader over the mapped file."""
+
+    def __init__(self , buffer):
+        self.buffer = buffer
+        self.position = 0
+
+    def unpack(self , fmt , size):
+        if self.position + size > len(self.buffer):
+            raise ModelFileError(f"File ends inside the header (offset {self.position}); the download is truncated")
+        value = struct.unpack_from(fmt, self.buffer, self.position)
+        self.position += size
+        return value[0]
+
+    def string(self):
+        length = self.unpack("<Q", 8)
+        if self.position + length > len(self.buffer):
+            raise ModelFileError(f"File ends inside the header (offset {self.position}); the download is truncated")
+        value = bytes(self.buffer[self.position:self.position + length])
+        self.position += length
+        return value.decode("utf-8", errors="replace")
+
+    def value(self , value_type):
+        if value_type == GGUF_STRING:
+            return self.string()
+        if value_type == GGUF_ARRAY:
+            item_type, count = self.unpack("<I", 4), self.unpack("<Q", 8)
+            if item_type in SCALAR_SIZES:
+                # Large numeric arrays (token scores, types) are skipped, not decoded.
+                self.position += SCALAR_SIZES[item_type] * count
+                if self.position > len(self.buffer):
+                    raise ModelFileError("File ends inside the header; the download is truncated")
+                return None
+            for _ in range(count):
+                self.value(item_type)
+            return None
+        if value_type not in SCALAR_SIZES:
+            raise ModelFileError(f"Unknown GGUF metadata type {value_type} at offset {self.position}")
+        size = SCALAR_SIZES[value_type]
+        if value_type == GGUF_UINT32:
+            return self.unpack("<I", 4)
+        self.position += size
+        return None
+
+
+def read_gguf_layout(path):
+    """
+    Parses the GGUF header and tensor table without loading any weights and returns the format
+    version, tensor and metadata counts, architecture, where the tensor data starts, the
+    byte offset where the last tensor ends and the integer hyperparameters of the
+    architecture (`block_count`, `embedding_length`, ...).
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < 24:
+            raise ModelFileError(f"{path} is too small to be a GGUF model")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            if buffer[:4] != GGUF_MAGIC:
+                raise ModelFileError(f"{path} is not a GGUF file (magic {bytes(buffer[:4])!r})")
+            reader = GGUFReader(buffer)
+            reader.position = 4
+            version = reader.unpack("<I", 4)
+            if version not in SUPPORTED_VERSIONS:
+                raise ModelFileError(f"Unsupported GGUF version {version}")
+            tensor_count, kv_count = reader.unpack("<Q", 8), reader.unpack("<Q", 8)
+
+            alignment, architecture, hparams = DEFAULT_ALIGNMENT, None, {}
+            for _ in range(kv_count):
+                key = reader.string()
+                value = reader.value(reader.unpack("<I", 4))
+                if key == "general.alignment" and value:
+                    alignment = value
+                elif key == "general.architecture":
+                    architecture = value
+                elif architecture and key.startswith(f"{architecture}.") and isinstance(value, int):
+                    hparams[key[len(architecture) + 1:]] = value
+
+            data_end, unknown_types = 0, set()
+            for _ in range(tensor_count):
+                reader.string()
+                n_dims = reader.unpack("<I", 4)
+                elements = 1
+                for _ in range(n_dims):
+                    elements *= reader.unpack("<Q", 8)
+                tensor_type, offset = reader.unpack("<I", 4), reader.unpack("<Q", 8)
+                if tensor_type in GGML_TYPE_SIZES:
+                    block_elements, block_bytes = GGML_TYPE_SIZES[tensor_type]
+                    data_end = max(data_end, offset + elements // block_elements * block_bytes)
+                else:
+                    unknown_types.add(tensor_type)
+                    data_end = max(data_end, offset)
+
+            data_offset = -(-reader.position // alignment) * alignment
+            return {
+                "version": version,
+                "tensor_count": tensor_count,
+                "kv_count": kv_count,
+                "architecture": architecture,
+                "alignment": alignment,
+                "data_offset": data_offset,
+                "data_end": data_offset + data_end,
+                "unknown_tensor_types": sorted(unknown_types),
+                "hparams": hparams
+            }
+
+
+def kv_bytes_per_token(path):
+    """
+    Bytes of f16 KV cache one token takes in llama.cpp for the model at `path`, read from its
+    header, or `DEFAULT_KV_BYTES_PER_TOKEN` if the file is missing or lacks the fields.
+    """
+    try:
+        hparams = read_gguf_layout(path)["hparams"]
+    except (OSError, ModelFileError):
+        return DEFAULT_KV_BYTES_PER_TOKEN
+    layers, width, heads = hparams.get("block_count"), hparams.get("embedding_length"), hparams.get("attention.head_count")
+    if not (layers and width and heads):
+        return DEFAULT_KV_BYTES_PER_TOKEN
+    kv_width = width * hparams.get("attention.head_count_kv", heads) // heads
+    return 2 * layers * kv_width * 2
+
+
+def check_model_file(path , verify="header"):
+    """
+    Startup check of a GGUF model before llama.cpp maps it. 'header' parses the header and
+    tensor table, checks that the file is long enough to hold every tensor and that its size
+    matches the download manifest (when there is one); 'sha256' also re-hashes the file
+    against the manifest; 'none' only checks that the file exists. Raises ModelFileError.
+    """
+    if not os.path.exists(path):
+        raise ModelFileError(f"Model not found at {path}")
+    if verify == "none":
+        return None
+
+    size = os.path.getsize(path)
+    layout = read_gguf_layout(path)
+    if size < layout["data_end"]:
+        raise ModelFileError(f"{path} is truncated: {size} bytes, but its tensors end at byte {layout['data_end']}")
+
+    manifest = read_manifest(path)
+    if manifest is not None:
+        if manifest.get("size") != size:
+            raise ModelFileError(f"{path} is {size} bytes, but the download manifest records {manifest.get('size')}")
+        if verify == "sha256" and sha256_file(path) != manifest.get("sha256"):
+            raise ModelFileError(f"{path} does not match the SHA-256 in its download manifest")
+    elif verify == "sha256":
+        logger.warning(f"No download manifest for {path}; only its header was checked")
+
+    logger.info(f"Model file OK: GGUF v{layout['version']}, {layout['architecture']}, {layout['tensor_count']} tensors, {size / 1e9:.2f} GB")
+    return layout
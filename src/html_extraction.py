@@ -0,0 +1,158 @@
+import importlib.util
+
+from bs4 import BeautifulSoup, UnicodeDammit
+from bs4.dammit import EncodingDetector
+
+from src.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+SKIPPED_TAGS = frozenset(['script', 'style', 'nav', 'footer', 'header', 'aside'])
+MAIN_CANDIDATES = ('main', 'article', 'content')
+FEED_SIZE = 64 * 1024
+# Part of the collection cache key: bump when the extraction rules change, so cached text is re-extracted.
+HTML_EXTRACTION_VERSION = 2
+
+
+def extract_text_bs4(content):
+    """Builds the full BeautifulSoup tree, drops boilerplate elements and reads the main content."""
+    soup = BeautifulSoup(content , "html.parser")
+
+    for element in soup(['script', 'style', 'nav', 'footer', 'header', 'aside']):
+        element.decompose()
+
+    main_content = soup.find('main') or soup.find('article') or soup.find('div', class_='content')
+
+    if main_content:
+        return main_content.get_text(separator="\n", strip=True)
+
+    # Fallback to all paragraphs
+    paragraphs = soup.find_all('p')
+    return '\n'.join([p.get_text(strip=True) for p in paragraphs])
+
+
+class MainTextTarget:
+    """
+    lxml parser target giving the same result as `extract_text_bs4` without building a tree.
+
+    Parser events are consumed as they arrive: text inside boilerplate elements is dropped,
+    the text nodes of the first <main>, <article> and <div class="content"> are collected
+    side by side, and so is the text of every <p> for the paragraph fallback. Memory is
+    bounded by the extracted text, not by the size of the document.
+
+    Like bs4's `get_text`, the text inside <template> is dropped while its elements still
+    count, so a <p> in a template adds an empty paragraph. Malformed markup is where the two
+    differ: libxml2 repairs the tree the way browsers do (a <p> ends at the next <p> or
+    block element), while html.parser leaves such a <p> open until its end tag.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.skip_depth = None
+        self.template_depth = None
+        self.pending = []
+        self.candidates = {}
+        self.open_candidates = {}
+        self.paragraphs = []
+        self.open_paragraphs = []
+
+    def flush(self):
+        if not self.pending:
+            return
+        text = "".join(self.pending).strip()
+        self.pending = []
+        if not text or self.skip_depth is not None or self.template_depth is not None:
+            return
+        for kind in self.open_candidates:
+            self.candidates[kind].append(text)
+        for index, _ in self.open_paragraphs:
+            self.paragraphs[index].append(text)
+
+    def start(self , tag , attrib):
+        self.flush()
+        self.depth += 1
+        if self.skip_depth is not None:
+            return
+        if tag in SKIPPED_TAGS:
+            self.skip_depth = self.depth
+            return
+        if tag == 'template' and self.template_depth is None:
+            self.template_depth = self.depth
+
+        kind = tag if tag in ('main', 'article') else None
+        if tag == 'div' and 'content' in attrib.get('class', '').split():
+            kind = 'content'
+        if kind is not None and kind not in self.candidates:
+            self.candidates[kind] = []
+            self.open_candidates[kind] = self.depth
+
+        if tag == 'p':
+            self.open_paragraphs.append((len(self.paragraphs), self.depth))
+            self.paragraphs.append([])
+
+    def end(self , tag):
+        self.flush()
+        if self.skip_depth == self.depth:
+            self.skip_depth = None
+        if self.template_depth == self.depth:
+            self.template_depth = None
+        self.open_candidates = {kind: depth for kind, depth in self.open_candidates.items() if depth < self.depth}
+        while self.open_paragraphs and self.open_paragraphs[-1][1] >= self.depth:
+            self.open_paragraphs.pop()
+        self.depth -= 1
+
+    def data(self , text):
+        self.pending.append(text)
+
+    def comment(self , text):
+        self.flush()
+
+    def close(self):
+        self.flush()
+        for kind in MAIN_CANDIDATES:
+            if kind in self.candidates:
+                return "\n".join(self.candidates[kind])
+        return "\n".join("".join(paragraph) for paragraph in self.paragraphs)
+
+
+def decode_html(content):
+    """
+    Decodes a page the way bs4 does, instead of leaving it to libxml2, which falls back to
+    Latin-1. Undeclared pages that are valid UTF-8 skip bs4's slower charset detection,
+    which settles on UTF-8 for them anyway.
+    """
+    if EncodingDetector.find_declared_encoding(content, is_html=True) is None:
+        try:
+            return content.decode("utf-8")
+        except UnicodeDecodeError:
+            pass
+    return UnicodeDammit(content, is_html=True).unicode_markup
+
+
+def extract_text_lxml(content , feed_size=FEED_SIZE):
+    """Streams `content` through libxml2's HTML parser in `feed_size` chunks."""
+    from lxml import etree
+
+    if isinstance(content, bytes):
+        content = decode_html(content)
+
+    parser = etree.HTMLParser(target=MainTextTarget(), remove_comments=True)
+    for offset in range(0, len(content), feed_size):
+        parser.feed(content[offset:offset + feed_size])
+    return parser.close() if content else ""
+
+
+HTML_BACKENDS = {
+    "bs4": extract_text_bs4,
+    "lxml": extract_text_lxml
+}
+
+
+def get_html_extractor(backend="bs4"):
+    """Returns the `content -> text` function of a backend; 'lxml' falls back to 'bs4' if lxml is missing."""
+    if backend not in HTML_BACKENDS:
+        raise ValueError(f"Unknown HTML backend '{backend}', expected one of {sorted(HTML_BACKENDS)}")
+    if backend == "lxml" and importlib.util.find_spec("lxml") is None:
+        logger.warning("lxml is not installed, falling back to the bs4 HTML backend")
+        return extract_text_bs4
+    return HTML_BACKENDS[backend]
@@ -0,0 +1,155 @@
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when the request queue is at capacity; the caller should retry later."""
+
+
+class SchedulerUnavailableError(Exception):
+    """Raised when no model is loaded, e.g. before startup finished or after shutdown."""
+
+
+class InferenceTimeoutError(Exception):
+    """Raised when a request did not finish within its timeout."""
+
+
+class InferenceScheduler:
+    """
+    Runs blocking llama.cpp generation off the event loop on a pool of model instances.
+
+    Every instance is owned by one worker thread at a time (llama.cpp releases the GIL while
+    evaluating). Requests wait for a free instance in a bounded queue: once `max_queue`
+    requests are waiting, new ones are rejected with `QueueFullError` instead of piling up.
+    Each request has a deadline covering both its wait and its generation; when it expires
+    the request's cancel event is set so the generation stops at the next token.
+    """
+
+    def __init__(self , model_factory , pool_size=1 , max_queue=16 , timeout=60.0 , telemetry=None):
+        self.model_factory = model_factory
+        self.telemetry = telemetry
+        self.pool_size = pool_size
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.waiting = 0
+        self.executor = None
+        self.idle = None
+        self.capacity_freed = None
+
+    def start(self):
+        self.idle = asyncio.Queue()
+        self.capacity_freed = asyncio.Event()
+        self.executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="llama-worker")
+        for i in range(self.pool_size):
+            logger.info(f"Loading model instance {i + 1}/{self.pool_size}")
+            self.idle.put_nowait(self.model_factory())
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+        self.idle = None
+
+    @property
+    def ready(self):
+        return self.executor is not None
+
+    def stats(self):
+        return {
+            "pool_size": self.pool_size,
+            "idle": self.idle.qsize() if self.idle is not None else 0,
+            "waiting": self.waiting,
+            "max_queue": self.max_queue
+        }
+
+    async def acquire(self , deadline , reserved=False):
+        if not reserved:
+            self.reserve()
+        started = time.monotonic()
+        try:
+            return await asyncio.wait_for(self.idle.get(), max(deadline - started, 0))
+        except asyncio.TimeoutError:
+            raise InferenceTimeoutError("Timed out waiting for a free model instance")
+        finally:
+            self.waiting -= 1
+            self.notify_capacity()
+            if self.telemetry is not None:
+                self.telemetry.queue_wait.observe(time.monotonic() - started)
+
+    def release(self , model):
+        if self.idle is not None:
+            self.idle.put_nowait(model)
+
+    def notify_capacity(self):
+        if self.capacity_freed is not None:
+            self.capacity_freed.set()
+
+    async def wait_for_capacity(self , deadline):
+        """
+        Waits until a queued request leaves the queue, which may make room for a request that
+        got `QueueFullError`. Returns False if `deadline` passes first.
+        """
+        if self.capacity_freed is None:
+            return False
+        self.capacity_freed.clear()
+        try:
+            await asyncio.wait_for(self.capacity_freed.wait(), max(deadline - time.monotonic(), 0))
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def check_capacity(self):
+        """Raises before any work starts if a request would be rejected right now."""
+        if not self.ready:
+            raise SchedulerUnavailableError("Model is not loaded")
+        if self.waiting >= self.max_queue:
+            raise QueueFullError(f"Request queue is full ({self.max_queue} waiting)")
+
+    def reserve(self):
+        """
+        Takes a place in the queue right away, or raises `QueueFullError`. The caller must
+        then either `run` with `reserved=True`, which uses the place, or `cancel_reservation`.
+        """
+        self.check_capacity()
+        self.waiting += 1
+
+    def cancel_reservation(self):
+        self.waiting -= 1
+        self.notify_capacity()
+
+    async def run(self , fn , timeout=None , cancel=None , reserved=False):
+        """
+        Runs `fn(model, cancel)` on a free model instance in a worker thread and returns its
+        result. `cancel` is a `threading.Event` that is set once the request times out or is
+        abandoned; `fn` should pass it to llama.cpp as a stopping criterion. Callers may pass
+        their own event to stop the generation early, e.g. when a streaming client disconnects.
+        With `reserved`, the request uses the queue place taken by `reserve`.
+        """
+        deadline = time.monotonic() + (timeout or self.timeout)
+        model = await self.acquire(deadline, reserved)
+
+        loop = asyncio.get_running_loop()
+        cancel = cancel or threading.Event()
+        future = loop.run_in_executor(self.executor, fn, model, cancel)
+        # The instance goes back to the pool only once the worker is really done with it.
+        future.add_done_callback(lambda _: self.release(model))
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), max(deadline - time.monotonic(), 0))
+        except asyncio.TimeoutError:
+            cancel.set()
+            raise InferenceTimeoutError("Generation timed out")
+        except asyncio.CancelledError:
+            cancel.set()
+            raise
+
+
+def cancel_criteria(cancel):
+    """Builds a llama.cpp stopping criterion that ends generation once `cancel` is set."""
+    return lambda input_ids, logits: cancel.is_set()
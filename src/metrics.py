@@ -0,0 +1,219 @@
+import re
+import math
+from collections import Counter
+
+import numpy as np
+
+ROUGE_TOKEN = re.compile(r"[a-z0-9]+")
+BLEU_PATTERNS = [
+    (re.compile(r"([\{-\~\[-\` -\&\(-\+\:-\@\/])"), r" \1 "),
+    (re.compile(r"([^0-9])([\.,])"), r"\1 \2 "),
+    (re.compile(r"([\.,])([^0-9])"), r" \1 \2"),
+    (re.compile(r"([0-9])(-)"), r"\1 \2 ")
+]
+
+
+def rouge_tokenize(text):
+    """Tokenizer of Google's `rouge_score` (no stemming): lowercase alphanumeric runs."""
+    return ROUGE_TOKEN.findall(text.lower())
+
+
+def bleu_tokenize(text):
+    """The `13a` tokenizer used by sacreBLEU and the Hugging Face `bleu` metric."""
+    text = text.replace("<skipped>", "").replace("-\n", "").replace("\n", " ")
+    if "&" in text:
+        text = text.replace("&quot;", '"').replace("&amp;", "&").replace("&lt;", "<").replace("&gt;", ">")
+    text = f" {text} "
+    for pattern, replacement in BLEU_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text.split()
+
+
+def ngrams(tokens , n):
+    return Counter(zip(*(tokens[i:] for i in range(n))))
+
+
+def lcs_length(a , b):
+    """
+    Length of the longest common subsequence, computed bit-parallel (Allison-Dix): every
+    token of `a` updates the whole DP row for `b` at once as one big-integer operation.
+    """
+    if not a or not b:
+        return 0
+    masks = {}
+    for i, token in enumerate(b):
+        masks[token] = masks.get(token, 0) | (1 << i)
+
+    row = 0
+    for token in a:
+        match = masks.get(token, 0)
+        x = match | row
+        row = x & ~(x - ((row << 1) | 1))
+    return bin(row).count("1")
+
+
+def f_measure(overlap , predicted , reference):
+    precision = np.divide(overlap, predicted, out=np.zeros_like(overlap), where=predicted > 0)
+    recall = np.divide(overlap, reference, out=np.zeros_like(overlap), where=reference > 0)
+    total = precision + recall
+    return np.divide(2 * precision * recall, total, out=np.zeros_like(overlap), where=total > 0)
+
+
+class RougeAccumulator:
+    """
+    ROUGE-1, ROUGE-2 and ROUGE-L F-measures averaged over examples, matching the Hugging Face
+    `rouge` metric without stemming. Only the per-metric sums and the example count are kept,
+    so accumulators of different shards can be merged into the exact corpus score.
+    """
+
+    KEYS = ("rouge1", "rouge2", "rougeL")
+
+    def __init__(self):
+        self.totals = np.zeros(len(self.KEYS))
+        self.count = 0
+
+    def scores(self , predictions , references):
+        """Returns an `(n, 3)` array of per-example F-measures."""
+        counts = np.zeros((len(predictions), len(self.KEYS), 3))
+        for row, (prediction, reference) in enumerate(zip(predictions, references)):
+            predicted, expected = rouge_tokenize(prediction), rouge_tokenize(reference)
+            for column, n in enumerate((1, 2)):
+                predicted_ngrams, expected_ngrams = ngrams(predicted, n), ngrams(expected, n)
+                counts[row, column] = (
+                    sum((predicted_ngrams & expected_ngrams).values()),
+                    max(len(predicted) - n + 1, 0),
+                    max(len(expected) - n + 1, 0)
+                )
+            counts[row, 2] = (lcs_length(predicted, expected), len(predicted), len(expected))
+        return f_measure(counts[..., 0], counts[..., 1], counts[..., 2])
+
+    def update(self , predictions , references):
+        scores = self.scores(predictions, references)
+        self.totals += scores.sum(axis=0)
+        self.count += len(scores)
+        return scores
+
+    def merge(self , other):
+        self.totals += other.totals
+        self.count += other.count
+        return self
+
+    def result(self):
+        means = self.totals / self.count if self.count else np.zeros(len(self.KEYS))
+        return {key: float(value) for key, value in zip(self.KEYS, means)}
+
+    def state(self):
+        return {"totals": self.totals.tolist(), "count": self.count}
+
+    @classmethod
+    def from_state(cls , state):
+        accumulator = cls()
+        accumulator.totals = np.asarray(state["totals"], dtype=float)
+        accumulator.count = state["count"]
+        return accumulator
+
+
+class BleuAccumulator:
+    """
+    Corpus BLEU (up to 4-grams, no smoothing, single reference) as computed by the Hugging
+    Face `bleu` metric. The clipped n-gram matches, possible n-grams and corpus lengths are
+    plain sums, so shards merge exactly.
+    """
+
+    def __init__(self , max_order=4):
+        self.max_order = max_order
+        self.matches = np.zeros(max_order, dtype=np.int64)
+        self.possible = np.zeros(max_order, dtype=np.int64)
+        self.prediction_length = 0
+        self.reference_length = 0
+
+    def update(self , predictions , references):
+        for prediction, reference in zip(predictions, references):
+            predicted, expected = bleu_tokenize(prediction), bleu_tokenize(reference)
+            self.prediction_length += len(predicted)
+            self.reference_length += len(expected)
+            for n in range(1, self.max_order + 1):
+                self.matches[n - 1] += sum((ngrams(predicted, n) & ngrams(expected, n)).values())
+                self.possible[n - 1] += max(len(predicted) - n + 1, 0)
+
+    def merge(self , other):
+        self.matches += other.matches
+        self.possible += other.possible
+        self.prediction_length += other.prediction_length
+        self.reference_length += other.reference_length
+        return self
+
+    def result(self):
+        precisions = np.divide(
+            self.matches, self.possible,
+            out=np.zeros(self.max_order), where=self.possible > 0
+        )
+        geo_mean = math.exp(np.log(precisions).mean()) if precisions.min() > 0 else 0.0
+
+        ratio = self.prediction_length / self.reference_length if self.reference_length else 0.0
+        if ratio > 1.0:
+            brevity_penalty = 1.0
+        else:
+            brevity_penalty = math.exp(1 - 1.0 / ratio) if ratio > 0 else 0.0
+
+        return {
+            "bleu": geo_mean * brevity_penalty,
+            "precisions": precisions.tolist(),
+            "brevity_penalty": brevity_penalty,
+            "length_ratio": ratio
+        }
+
+    def state(self):
+        return {
+            "matches": self.matches.tolist(),
+            "possible": self.possible.tolist(),
+            "prediction_length": self.prediction_length,
+            "reference_length": self.reference_length
+        }
+
+    @classmethod
+    def from_state(cls , state):
+        accumulator = cls(len(state["matches"]))
+        accumulator.matches = np.asarray(state["matches"], dtype=np.int64)
+        accumulator.possible = np.asarray(state["possible"], dtype=np.int64)
+        accumulator.prediction_length = state["prediction_length"]
+        accumulator.reference_length = state["reference_length"]
+        return accumulator
+
+
+class QAMetrics:
+    """ROUGE and BLEU together, reported under the keys of the evaluation results file."""
+
+    def __init__(self , rouge=None , bleu=None):
+        self.rouge = rouge or RougeAccumulator()
+        self.bleu = bleu or BleuAccumulator()
+
+    def update(self , predictions , references):
+        """Returns the per-example ROUGE scores of the update."""
+        self.bleu.update(predictions, references)
+        return self.rouge.update(predictions, references)
+
+    def merge(self , other):
+        self.rouge.merge(other.rouge)
+        self.bleu.merge(other.bleu)
+        return self
+
+    @property
+    def count(self):
+        return self.rouge.count
+
+    def result(self):
+        rouge, bleu = self.rouge.result(), self.bleu.result()
+        return {
+            'rouge_1_f': rouge['rouge1'],
+            'rouge_2_f': rouge['rouge2'],
+            'rouge_l_f': rouge['rougeL'],
+            'bleu_score': bleu['bleu']
+        }
+
+    def state(self):
+        return {"rouge": self.rouge.state(), "bleu": self.bleu.state()}
+
+    @classmethod
+    def from_state(cls , state):
+        return cls(RougeAccumulator.from_state(state["rouge"]), BleuAccumulator.from_state(state["bleu"]))
@@ -0,0 +1,287 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from src.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+SHA256_HEX = re.compile(r"^[0-9a-f]{64}$")
+READ_SIZE = 128 << 10
+# How often a running chunk records how far it got, so a killed download loses at most this much.
+STATE_SAVE_INTERVAL = 5.0
+
+
+class DownloadError(Exception):
+    def __init__(self , message , position=None):
+        super().__init__(message)
+        self.position = position
+
+
+def sha256_file(path , block_size=8 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def manifest_path(path):
+    return f"{path}.download.json"
+
+
+def read_manifest(path):
+    try:
+        with open(manifest_path(path), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_json_atomic(path , data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+class RangeDownloader:
+    """
+    Downloads a large file with `connections` parallel HTTP range requests of `chunk_size`
+    bytes, written in place (`os.pwrite`) into `<path>.part`.
+
+    Finished chunks, and how far unfinished ones got (every `STATE_SAVE_INTERVAL` seconds
+    while they download, and when they fail), are recorded in `<path>.part.json`, so an
+    interrupted or killed download resumes with only the missing bytes as long as the remote
+    file (size and ETag) is unchanged; a failed request is retried from the last byte
+    received. When all chunks are in, the file's SHA-256 is checked against `sha256` (or, if
+    none is given, the `X-Linked-ETag` that Hugging Face sends for LFS files), then the file
+    is fsynced and renamed to `path` in one step, so `path` only ever holds a complete,
+    verified file. A manifest with the size and hash is written next to it for the startup
+    check.
+
+    Servers that do not support ranges get a single streamed request instead.
+    """
+
+    def __init__(self , url , path , connections=8 , chunk_size=64 << 20 , timeout=30 , max_retries=5 , backoff_base=1.0 , sha256=None):
+        self.url = url
+        self.path = path
+        self.connections = max(1, connections)
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.sha256 = sha256.lower() if sha256 else None
+        self.part_path = f"{path}.part"
+        self.state_path = f"{path}.part.json"
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.received = 0
+
+    @classmethod
+    def from_config(cls , download_config , url , path):
+        return cls(
+            url,
+            path,
+            connections=download_config.get("connections", 8),
+            chunk_size=download_config.get("chunk_size_mb", 64) << 20,
+            timeout=download_config.get("timeout", 30),
+            max_retries=download_config.get("max_retries", 5),
+            backoff_base=download_config.get("backoff_base", 1.0),
+            sha256=download_config.get("sha256")
+        )
+
+    @property
+    def session(self):
+        # One keep-alive connection pool per worker thread.
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def probe(self):
+        """Size, ETag, range support and published SHA-256 of the remote file."""
+        response = self.session.head(self.url, allow_redirects=True, timeout=self.timeout)
+        response.raise_for_status()
+        headers = {}
+        # Hugging Face puts the LFS size and hash on the redirect, not on the CDN response.
+        for r in response.history + [response]:
+            headers.update({key.lower(): value for key, value in r.headers.items()})
+
+        size = headers.get("x-linked-size") or headers.get("content-length")
+        linked_etag = headers.get("x-linked-etag", "").strip('"').lower()
+        return {
+            "size": int(size) if size else None,
+            "etag": headers.get("x-linked-etag") or headers.get("etag"),
+            "ranges": headers.get("accept-ranges", "").lower() == "bytes",
+            "sha256": linked_etag if SHA256_HEX.match(linked_etag) else None
+        }
+
+    def load_state(self , remote):
+        """Finished chunk numbers and bytes already written of unfinished ones."""
+        if not (os.path.exists(self.state_path) and os.path.exists(self.part_path)):
+            return set(), {}
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return set(), {}
+        if (state.get("url"), state.get("size"), state.get("etag"), state.get("chunk_size")) != (self.url, remote["size"], remote["etag"], self.chunk_size):
+            logger.info("Remote file changed since the partial download, starting over")
+            return set(), {}
+        return set(state.get("done", [])), {int(i): written for i, written in state.get("partial", {}).items()}
+
+    def save_state(self , remote , done , partial):
+        write_json_atomic(self.state_path, {
+            "url": self.url,
+            "size": remote["size"],
+            "etag": remote["etag"],
+            "chunk_size": self.chunk_size,
+            "done": sorted(done),
+            "partial": {str(i): written for i, written in sorted(partial.items())}
+        })
+
+    def retry(self , attempt , error , position):
+        if attempt >= self.max_retries:
+            raise DownloadError(f"Giving up after {attempt + 1} attempts: {error}", position) from error
+        delay = self.backoff_base * (2 ** attempt)
+        logger.warning(f"Download request failed ({error}), retrying in {delay:.1f}s")
+        time.sleep(delay)
+
+    def fetch_range(self , fd , start , end , progress=None):
+        """
+        Writes bytes `start`..`end` (inclusive) at their offset, resuming a failed request where
+        it stopped. `progress(position)` is called with the first byte not yet written at most
+        every `STATE_SAVE_INTERVAL` seconds.
+        """
+        position, attempt = start, 0
+        saved_at = time.monotonic()
+        while position <= end:
+            try:
+                with self.session.get(self.url, headers={"Range": f"bytes={position}-{end}"}, stream=True, timeout=self.timeout) as response:
+                    if response.status_code != 206:
+                        raise DownloadError(f"Expected 206 Partial Content for bytes {position}-{end}, got {response.status_code}")
+                    for block in response.iter_content(READ_SIZE):
+                        os.pwrite(fd, block, position)
+                        position += len(block)
+                        with self.lock:
+                            self.received += len(block)
+                        if progress is not None and time.monotonic() - saved_at >= STATE_SAVE_INTERVAL:
+                            progress(position)
+                            saved_at = time.monotonic()
+                if position <= end:
+                    raise DownloadError(f"Connection closed at byte {position} of {end + 1}")
+            except (requests.RequestException, DownloadError) as e:
+                self.retry(attempt, e, position)
+                attempt += 1
+
+    def fetch_all(self , remote):
+        size = remote["size"]
+        chunks = [(i, start, min(start + self.chunk_size, size) - 1) for i, start in enumerate(range(0, size, self.chunk_size))]
+        done, partial = self.load_state(remote)
+        todo = [chunk for chunk in chunks if chunk[0] not in done]
+        if done or partial:
+            present = sum(min(start + self.chunk_size, size) - start for i, start, _ in chunks if i in done) + sum(partial.values())
+            logger.info(f"Resuming download: {present / size:.0%} already present")
+
+        mode = "r+b" if done or partial else "wb"
+        with open(self.part_path, mode) as f:
+            f.truncate(size)
+            fd = f.fileno()
+            self.save_state(remote, done, partial)
+
+            def work(chunk):
+                i, start, end = chunk
+
+                def progress(position):
+                    with self.lock:
+                        partial[i] = position - start
+                        self.save_state(remote, done, partial)
+
+                try:
+                    self.fetch_range(fd, start + partial.get(i, 0), end, progress)
+                except DownloadError as e:
+                    if e.position is not None:
+                        progress(e.position)
+                    raise
+                with self.lock:
+                    done.add(i)
+                    partial.pop(i, None)
+                    self.save_state(remote, done, partial)
+
+            started, reported = time.perf_counter(), 0
+            with ThreadPoolExecutor(max_workers=min(self.connections, max(len(todo), 1))) as executor:
+                for _ in executor.map(work, todo):
+                    fraction = len(done) / len(chunks)
+                    if fraction - reported >= 0.1 or fraction == 1:
+                        reported = fraction
+                        rate = self.received / max(time.perf_counter() - started, 1e-9) / 1e6
+                        logger.info(f"Downloaded {fraction:.0%} ({rate:.1f} MB/s)")
+            f.flush()
+            os.fsync(fd)
+
+    def fetch_stream(self):
+        attempt = 0
+        while True:
+            try:
+                with self.session.get(self.url, stream=True, timeout=self.timeout) as response:
+                    response.raise_for_status()
+                    with open(self.part_path, "wb") as f:
+                        for block in response.iter_content(READ_SIZE):
+                            f.write(block)
+                            self.received += len(block)
+                        f.flush()
+                        os.fsync(f.fileno())
+                return
+            except requests.RequestException as e:
+                self.retry(attempt, e, None)
+                attempt += 1
+
+    def download(self):
+        """Downloads, verifies and atomically installs the file; returns its manifest."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        started = time.perf_counter()
+        remote = self.probe()
+
+        if remote["size"] and remote["ranges"]:
+            logger.info(f"Downloading {remote['size'] / 1e9:.2f} GB from {self.url} over {self.connections} connections")
+            self.fetch_all(remote)
+        else:
+            logger.info(f"Server does not support range requests, downloading {self.url} in one stream")
+            self.fetch_stream()
+
+        size = os.path.getsize(self.part_path)
+        if remote["size"] is not None and size != remote["size"]:
+            raise DownloadError(f"Downloaded {size} bytes, expected {remote['size']}")
+
+        expected = self.sha256 or remote["sha256"]
+        actual = sha256_file(self.part_path)
+        if expected and actual != expected:
+            for leftover in (self.part_path, self.state_path):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+            raise DownloadError(f"SHA-256 mismatch: expected {expected}, got {actual}")
+        if not expected:
+            logger.warning("No published SHA-256 to verify against; recording the hash of the downloaded file")
+
+        os.replace(self.part_path, self.path)
+        if os.path.exists(self.state_path):
+            os.remove(self.state_path)
+        manifest = {
+            "url": self.url,
+            "size": size,
+            "sha256": actual,
+            "verified": bool(expected),
+            "etag": remote["etag"],
+            "downloaded_at": time.strftime('%Y-%m-%d %H:%M:%S')
+        }
+        write_json_atomic(manifest_path(self.path), manifest)
+
+        seconds = time.perf_counter() - started
+        logger.info(f"Model saved to {self.path} in {seconds:.1f}s ({self.received / max(seconds, 1e-9) / 1e6:.1f} MB/s)")
+        return manifest
@@ -1,133 +1,123 @@
 import os
 import json
-from openai import OpenAI
-from llama_cpp import Llama
-import evaluate
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 from config.path_config import *
-from transformers import AutoTokenizer
+from src.utils.cmn_func import read_yaml
+from src.chat_template import SYSTEM_PROMPT
+from src.evaluation import EvaluationEngine, PredictionCache, GGUFPredictor, ChatAPIPredictor, iter_eval_items, dataset_fingerprint
+
+
 class QAEvaluator:
     """
     A class to evaluate QA performance of a quantized GGUF model via llama.cpp against a base HuggingFace model.
-    """
-    def __init__(self):
-        # Load dataset
-        self.dataset = [
-                            {
-                                "instruction": " what is the average annual rate at which an EV battery's capacity declines?",
-                                "reference": "The text states that there is an average decline across all electric vehicles of around 2.3 percent per year."
-                            },
-                            {
-                                "instruction": "What is the typical battery warranty offered by most EV manufacturers, in terms of years or distance?",
-                                "reference": "Most EV manufacturers will give between 8-10 years warranty on their battery, or up to 100,000 km (62,000 miles)."
-                            },
-                            {
-                                "instruction": "How does the projected lifespan of an EV battery compare to the average life expectancy of the car itself?",
-                                "reference": "EV batteries have a projected lifespan of 15 to 20 years, which is longer than the average 12-year life expectancy of a car, meaning the battery will, in most cases, outlive the vehicle."
-                            },
-                            {
-                                "instruction": "What is the key difference between a Mode 2 and a Mode 3 charging cable as described in the document?",
-                                "reference": "A Mode 2 charging cable connects an EV to a standard household outlet, while a Mode 3 charging cable connects the vehicle to a dedicated EV charging station and is the most common for AC charging."
-                            },
-                            {
-                                "instruction": "What is the specific use for Mode 4 charging cables and what special feature is mentioned to handle the heat?",
-                                "reference": "Mode 4 charging cables are used for DC (level 3) fast charging and are often liquid-cooled to deal with the heat generated by the high power transfer."
-                            },
-                            {
-                                "instruction": "Why does the text say DC fast charging is the most expensive option?",
-                                "reference": "DC charging is the most expensive because the stations have high installation and operating costs needed to deliver large amounts of power (50 to 350 kW), and service providers pass these costs on to the customer."
-                            },
-                            {
-                                "instruction": "How does the document suggest an EV owner can calculate the cost of charging their car at home?",
-                                "reference": "To calculate home charging costs, you should take the price per kWh from your energy bill and multiply it by the size of your vehicle's battery."
-                            },
-                            {
-                                "instruction": "What are the four common tariff structures that public charging providers use to calculate costs?",
-                                "reference": "The four most common ways to calculate charging tariffs are: a connection fee, an energy fee (per kWh), a time fee (per minute/hour), and a service fee."
-                            },
-                            {
-                                "instruction": "what two developments are making range anxiety an increasingly unwarranted concern?",
-                                "reference": "The increase in the average range of EVs and the rapid development of charging infrastructure, especially DC fast charging, are making range anxiety less of a concern."
-                            },
-                            {
-                                "instruction": "Why does the text argue that most EV drivers do not need to charge their car every night?",
-                                "reference": "Because the average daily commute, such as roughly 62 km (39 miles) a day in the US, is significantly less than the maximum range of most modern EVs."
-                            }
-                        ]
-                                          
 
+    Predictions are generated in parallel (`evaluation.workers` llama.cpp instances, `base_workers`
+    concurrent API calls) and cached by model file hash, prompt and generation parameters, so
+    re-scoring never regenerates. ROUGE and BLEU are computed locally, without downloads.
+
+    The evaluation set is streamed from `evaluation.dataset` (JSONL file or shard directory)
+    and split into `num_shards` shards evaluated by separate processes. Every shard writes its
+    scored examples and metric accumulators under `outputs/evaluation/runs/<run>/` as it goes;
+    the accumulators are merged into exact corpus-level scores.
+
+    `dataset_path`, `holdout_percent` and `num_shards` override the `evaluation` config.
+    """
+    def __init__(self , dataset_path=None , holdout_percent=None , num_shards=None):
+        config = read_yaml(CONFIG_PATH)
+        self.eval_config = config.get("evaluation", {})
+        self.template_kind = config["api"].get("model", {}).get("chat_template", "native")
+        self.date_string = config["training"].get("dataset", {}).get("date_string")
+        self.tokenizer_name = "meta-llama/Llama-3.2-3B-Instruct"
+
+        self.dataset_path = dataset_path or self.eval_config.get("dataset", EVALUATION_DATASET)
+        self.holdout_percent = holdout_percent if holdout_percent is not None else self.eval_config.get("holdout_percent")
+        self.num_shards = num_shards or self.eval_config.get("num_shards", 1)
         self.guff_model_path = MODEL_GUFF_PATH 
         self.base_model_id = 'meta-llama/Llama-3.2-3B-Instruct:novita'
-        self.max_tokens = 128
-        self.results_path = 'outputs/evaluation/evaluation_results.json'
-        self.hf_client = OpenAI(
-            base_url="https://router.huggingface.co/v1",
-            api_key=os.environ.get('HF_TOKEN', '')
-        )
-        self.tokenizer = AutoTokenizer.from_pretrained("meta-llama/Llama-3.2-3B-Instruct")
-
-
-    def build_prompt(self,instruction):
-        
-        messages = [
-        {"role": "system", "content": "You are a helpful assistant."},
-        {"role": "user", "content": {instruction}}
-        ]
-
-        prompt = self.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-        return prompt
-
-    def evaluate_guff(self):
-        llama = Llama(model_path=self.guff_model_path)
-        rouge = evaluate.load('rouge')
-        bleu = evaluate.load('bleu')
-        preds, refs = [], []
-
-        for item in self.dataset:
-            prompt = self.build_prompt(item['instruction'])
-            resp = llama(
-                prompt=prompt,
-                max_tokens=self.max_tokens,
-                stop=["###"],
-                echo=False
+        self.max_tokens = self.eval_config.get("max_tokens", 128)
+        self.guff_params = {"max_tokens": self.max_tokens, "stop": ["###"]}
+        self.results_path = self.eval_config.get("results_path", EVALUATION_RESULTS_PATH)
+        self.hf_client = None
+
+
+    def predictor(self , kind , model_path=None):
+        if kind == "guff":
+            workers = self.eval_config.get("workers", 2)
+            return GGUFPredictor(
+                model_path or self.guff_model_path,
+                system_prompt=SYSTEM_PROMPT,
+                params=self.guff_params,
+                workers=workers,
+                n_threads=self.eval_config.get("n_threads") or max(1, (os.cpu_count() or 1) // (workers * self.num_shards)),
+                template_kind=self.template_kind,
+                date_string=self.date_string,
+                tokenizer_name=self.tokenizer_name,
+                hash_memo_path=EVALUATION_MODEL_HASHES
             )
-            gen = resp['choices'][0]['text'].strip()
-
-            preds.append(gen)
-            refs.append(item['reference'])
-
-        rouge_res = rouge.compute(predictions=preds, references=refs)
-        bleu_res = bleu.compute(predictions=preds, references=refs)
-        return {
-            'rouge_1_f': rouge_res['rouge1'],
-            'rouge_2_f': rouge_res['rouge2'],
-            'rouge_l_f': rouge_res['rougeL'],
-            'bleu_score': bleu_res['bleu']
-        }
 
+        if self.hf_client is None:
+            from openai import OpenAI
 
-    def evaluate_base(self):
-        rouge = evaluate.load('rouge')
-        bleu = evaluate.load('bleu')
-        preds, refs = [], []
-
-        for item in self.dataset:
-            resp = self.hf_client.chat.completions.create(
-                model=self.base_model_id,
-                messages=[{"role": "user", "content": item['instruction']}],
+            self.hf_client = OpenAI(
+                base_url="https://router.huggingface.co/v1",
+                api_key=os.environ.get('HF_TOKEN', '')
             )
-            msg = resp.choices[0].message
-            gen = msg.content.strip() if hasattr(msg, 'content') else str(msg).strip()
-            preds.append(gen)
-            refs.append(item['reference'])
-
-        rouge_res = rouge.compute(predictions=preds, references=refs)
-        bleu_res = bleu.compute(predictions=preds, references=refs)
-        return {
-            'rouge_1_f': rouge_res['rouge1'],
-            'rouge_2_f': rouge_res['rouge2'],
-            'rouge_l_f': rouge_res['rougeL'],
-            'bleu_score': bleu_res['bleu']
-        }
+        return ChatAPIPredictor(self.hf_client, self.base_model_id, workers=self.eval_config.get("base_workers", 8))
+
+    def run_dir(self , kind , model_path=None):
+        # A run is one model on one version of the dataset, so a changed file starts a new run.
+        # Computed from the model file's hash, so no predictor (and no model) is loaded for it.
+        if kind == "guff":
+            model_id, params = GGUFPredictor.identify(model_path or self.guff_model_path, EVALUATION_MODEL_HASHES), self.guff_params
+        else:
+            model_id, params = ChatAPIPredictor.identify(self.base_model_id), {}
+        material = json.dumps([
+            model_id,
+            params,
+            dataset_fingerprint(self.dataset_path, self.holdout_percent),
+            self.num_shards
+        ], sort_keys=True)
+        return os.path.join(EVALUATION_RUNS_DIR, hashlib.sha1(material.encode("utf-8")).hexdigest()[:16])
+
+    def shard_paths(self , run_dir):
+        return [os.path.join(run_dir, f"shard-{i:05d}-of-{self.num_shards:05d}.jsonl") for i in range(self.num_shards)]
+
+    def evaluate_shard(self , kind , model_path , shard_index):
+        predictor = self.predictor(kind, model_path)
+        engine = EvaluationEngine(
+            PredictionCache(EVALUATION_PREDICTION_CACHE, writer=f"predictions-{shard_index:05d}") if self.eval_config.get("cache", True) else None,
+            window=self.eval_config.get("window", 64)
+        )
+        items = iter_eval_items(self.dataset_path, self.holdout_percent, shard_index, self.num_shards)
+        return engine.evaluate_shard(predictor, items, self.shard_paths(self.run_dir(kind, model_path))[shard_index]).state()
+
+    def evaluate_model(self , kind , model_path=None , shards=None):
+        """
+        Evaluates the shards `shards` (default: all) of the model and merges the saved
+        accumulators of every shard. Returns the metrics with the number of examples scored
+        and whether all shards are complete.
+        """
+        run_dir = self.run_dir(kind, model_path)
+        shards = range(self.num_shards) if shards is None else shards
+
+        if len(shards) == 1:
+            self.evaluate_shard(kind, model_path, shards[0])
+        elif shards:
+            settings = {"dataset_path": self.dataset_path, "holdout_percent": self.holdout_percent, "num_shards": self.num_shards}
+            with ProcessPoolExecutor(max_workers=len(shards)) as executor:
+                list(executor.map(evaluate_shard_job, [settings] * len(shards), [kind] * len(shards), [model_path] * len(shards), shards))
+
+        metrics, complete = EvaluationEngine.merge_shards(self.shard_paths(run_dir))
+        return {"metrics": metrics.result(), "examples": metrics.count, "complete": complete, "run_dir": run_dir}
+
+    def evaluate_guff(self , model_path=None):
+        return self.evaluate_model("guff", model_path)["metrics"]
+
+
+    def evaluate_base(self):
+        return self.evaluate_model("base")["metrics"]
 
 
     def compute_improvements(self,base: dict, comp: dict):
@@ -140,22 +130,63 @@ class QAEvaluator:
                 improvements[key + '_improvement'] = None
         return improvements
 
-    def evalute(self):
-        guff_metrics = self.evaluate_guff()
-        base_metrics = self.evaluate_base()
-        improvements = self.compute_improvements(base_metrics, guff_metrics)
+    def evalute(self , model_paths=None , include_base=True , shards=None):
+        """
+        Evaluates every GGUF in `model_paths` (default: the serving model) and, unless
+        `include_base` is off, the hosted base model. The top-level fields describe the first
+        model; `candidates` lists all of them. With `shards`, only those shards are run (e.g.
+        one per CI machine); the results then cover what all shards have scored so far.
+        """
+        model_paths = model_paths or [self.guff_model_path]
+        base_run = self.evaluate_model("base", shards=shards) if include_base else None
+        base_metrics = base_run["metrics"] if base_run else None
+
+        candidates = []
+        for model_path in model_paths:
+            run = self.evaluate_model("guff", model_path, shards=shards)
+            candidates.append({
+                'guff_model': model_path,
+                'metrics': run['metrics'],
+                'examples': run['examples'],
+                'complete': run['complete'],
+                'run_dir': run['run_dir'],
+                'improvements_percent': self.compute_improvements(base_metrics, run['metrics']) if base_metrics else None
+            })
 
         results = {
-            'guff_model': self.guff_model_path,
-            'base_model': self.base_model_id,
+            'dataset': self.dataset_path,
+            'holdout_percent': self.holdout_percent,
+            'guff_model': candidates[0]['guff_model'],
+            'base_model': self.base_model_id if include_base else None,
             'metrics': {
-                'guff': guff_metrics,
+                'guff': candidates[0]['metrics'],
                 'base': base_metrics
             },
-            'improvements_percent': improvements
+            'improvements_percent': candidates[0]['improvements_percent'],
+            'candidates': candidates
         }
+        os.makedirs(os.path.dirname(self.results_path), exist_ok=True)
         with open(self.results_path, 'w') as f:
             json.dump(results, f, indent=2)
         print(f"Evaluation complete. Results saved to {self.results_path}")
         return results
 
+
+def evaluate_shard_job(settings , kind , model_path , shard_index):
+    # Runs in a worker process, which builds its own evaluator and model instances.
+    evaluator = QAEvaluator(**settings)
+    return evaluator.evaluate_shard(kind, model_path, shard_index)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate candidate GGUF models on the QA set.")
+    parser.add_argument("--model", action="append", dest="models", help="GGUF file to evaluate (repeatable)")
+    parser.add_argument("--skip-base", action="store_true", help="do not call the hosted base model")
+    parser.add_argument("--dataset", help="JSONL evaluation set (file or directory of shards)")
+    parser.add_argument("--holdout-percent", type=float, help="evaluate only this hash-selected share of the dataset")
+    parser.add_argument("--num-shards", type=int, help="split the dataset into this many shards")
+    parser.add_argument("--shard", type=int, action="append", dest="shards", help="run only this shard (repeatable)")
+    args = parser.parse_args()
+
+    evaluator = QAEvaluator(args.dataset, args.holdout_percent, args.num_shards)
+    evaluator.evalute(args.models, include_base=not args.skip_base, shards=args.shards)
@@ -0,0 +1,314 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+from src.answer_cache import model_fingerprint
+from src.gguf_check import kv_bytes_per_token
+from src.inference import SchedulerUnavailableError
+from src.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class ModelNotFoundError(Exception):
+    """Raised when a request names a model that is not in the registry."""
+
+
+class ModelUnavailableError(SchedulerUnavailableError):
+    """Raised when a model cannot be loaded (missing or corrupt file, or it does not fit the memory budget)."""
+
+
+class ModelVariant:
+    """
+    One servable model: a GGUF file (or the stub backend) plus the `api.model` settings it is
+    loaded with (`pool_size`, `chat_template`, `use_mmap`, `n_ctx`, ...), which a variant may
+    override.
+    """
+
+    def __init__(self , name , path , backend="llama" , settings=None):
+        self.name = name
+        self.path = path
+        self.backend = backend
+        self.settings = settings or {}
+
+    @classmethod
+    def from_config(cls , name , settings , default_path=None , backend_override=None):
+        return cls(
+            name,
+            settings.get("path") or default_path,
+            backend_override or settings.get("backend", "llama"),
+            settings
+        )
+
+    def with_path(self , path):
+        return ModelVariant(self.name, path or self.path, self.backend, {**self.settings, "path": path or self.path})
+
+    @property
+    def template_kind(self):
+        template_kind = self.settings.get("chat_template", "native")
+        return "native" if self.backend == "stub" and template_kind == "gguf" else template_kind
+
+    @property
+    def version(self):
+        """Identifies what is served under this name; answers cached for one version are never served for another."""
+        if self.backend == "stub":
+            return f"stub:{sorted(self.settings.get('stub', {}).items())}"
+        return model_fingerprint(self.path)
+
+    def memory_bytes(self):
+        """
+        Estimated resident memory once loaded: `memory_mb` when configured, otherwise the
+        weights (mapped once and shared by all instances with `use_mmap`, else one copy per
+        instance) plus `context_mb` of KV cache and buffers per instance. With `batching`
+        enabled, each instance also holds a batch context of `max_batch * n_ctx_per_seq`
+        tokens, sized from the KV width in the model header.
+        """
+        if self.settings.get("memory_mb") is not None:
+            return int(self.settings["memory_mb"] * (1 << 20))
+        if self.backend != "llama":
+            return 0
+        instances = self.settings.get("pool_size", 1)
+        weights = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        if not self.settings.get("use_mmap", True):
+            weights *= instances
+        context = int(self.settings.get("context_mb", 256) * (1 << 20))
+        batching = self.settings.get("batching") or {}
+        if batching.get("enabled", False):
+            context += batching.get("max_batch", 8) * batching.get("n_ctx_per_seq", 1024) * kv_bytes_per_token(self.path)
+        return weights + instances * context
+
+
+class LoadedModel:
+    """One loaded version of a variant: its instance pool and what requests need to use it."""
+
+    def __init__(self , variant , scheduler , chat_template , batcher=None):
+        self.variant = variant
+        self.name = variant.name
+        self.version = variant.version
+        self.memory_bytes = variant.memory_bytes()
+        self.scheduler = scheduler
+        self.chat_template = chat_template
+        self.batcher = batcher
+        self.active = 0
+        self.retired = False
+        self.loaded_at = time.time()
+
+    @property
+    def cache_id(self):
+        return f"{self.name}:{self.version}:{self.variant.template_kind}"
+
+    def close(self):
+        self.scheduler.close()
+        self.batcher = None
+
+    def stats(self):
+        return {
+            **self.scheduler.stats(),
+            "version": self.version,
+            "path": self.variant.path,
+            "backend": self.variant.backend,
+            "memory_mb": round(self.memory_bytes / (1 << 20), 1),
+            "active": self.active,
+            "loaded_at": time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.loaded_at))
+        }
+
+
+class ModelRegistry:
+    """
+    Serves several model variants by name from one process.
+
+    Variants are loaded on first use by `loader(variant) -> LoadedModel`, off the event loop,
+    and kept in least-recently-used order. Before a load, the least recently used other
+    variants are unloaded until the estimated memory of everything loaded fits
+    `memory_budget_mb`. Requests hold a lease on the version they started with: `swap`
+    loads the new version next to the old one (which keeps serving), then replaces it in one
+    step, and a replaced or evicted version is closed once its last in-flight request
+    finishes. Concurrent requests for a variant that is loading wait for the same load.
+    """
+
+    def __init__(self , variants , loader , default=None , memory_budget_mb=None):
+        self.variants = {variant.name: variant for variant in variants}
+        if not self.variants:
+            raise ValueError("At least one model variant is required")
+        self.default = default or next(iter(self.variants))
+        if self.default not in self.variants:
+            raise ValueError(f"Default model '{self.default}' is not a configured variant")
+        self.loader = loader
+        self.memory_budget = int(memory_budget_mb * (1 << 20)) if memory_budget_mb else None
+        self.loaded = OrderedDict()
+        self.loading = {}
+        self.draining = set()
+        self.reserved = 0
+        self.swaps = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_config(cls , api_config , loader , default_path=None , backend_override=None):
+        """
+        Variants come from `api.models.variants`, each overriding the `api.model` settings;
+        without that section, the single model at `default_path` is served as 'default'.
+        """
+        models_config = api_config.get("models", {})
+        base = {
+            **api_config.get("model", {}),
+            "pool_size": api_config.get("inference", {}).get("pool_size", 1),
+            "batching": api_config.get("batching", {})
+        }
+        variants_config = models_config.get("variants") or {"default": {}}
+        variants = [
+            ModelVariant.from_config(name, {**base, **(settings or {})}, default_path, backend_override)
+            for name, settings in variants_config.items()
+        ]
+        return cls(variants, loader, models_config.get("default"), models_config.get("memory_budget_mb"))
+
+    def resolve(self , name=None):
+        name = name or self.default
+        if name not in self.variants:
+            raise ModelNotFoundError(f"Unknown model '{name}'; available: {', '.join(self.variants)}")
+        return name
+
+    def version(self , name=None):
+        """Version a request for `name` would be served by now, without loading anything."""
+        name = self.resolve(name)
+        model = self.loaded.get(name)
+        return model.cache_id if model is not None else f"{name}:{self.variants[name].version}:{self.variants[name].template_kind}"
+
+    @property
+    def used_bytes(self):
+        return sum(model.memory_bytes for model in self.loaded.values()) + sum(model.memory_bytes for model in self.draining) + self.reserved
+
+    async def get(self , name=None):
+        name = self.resolve(name)
+        # A loop, since another load can evict the variant again before this caller resumes.
+        while name not in self.loaded:
+            if name not in self.loading:
+                self.loading[name] = self.start_load(self.variants[name])
+            # Shielded, so a caller that gives up does not abort a load others are waiting for.
+            await asyncio.shield(self.loading[name])
+        self.loaded.move_to_end(name)
+        return self.loaded[name]
+
+    async def acquire(self , name=None):
+        model = await self.get(name)
+        model.active += 1
+        return model
+
+    def release(self , model):
+        model.active -= 1
+        if model.retired and model.active == 0:
+            self.close_model(model)
+
+    @asynccontextmanager
+    async def lease(self , name=None):
+        model = await self.acquire(name)
+        try:
+            yield model
+        finally:
+            self.release(model)
+
+    async def swap(self , name , path=None):
+        """
+        Loads a new version of `name` (from `path`, or its current file again) and switches
+        new requests to it once it is ready; requests already running finish on the old one.
+        """
+        name = self.resolve(name)
+        while name in self.loading:
+            try:
+                await asyncio.shield(self.loading[name])
+            except Exception:
+                pass
+        self.loading[name] = self.start_load(self.variants[name].with_path(path))
+        await asyncio.shield(self.loading[name])
+        self.swaps += 1
+        return self.loaded[name]
+
+    def unload(self , name):
+        model = self.loaded.pop(self.resolve(name), None)
+        if model is not None:
+            self.retire(model)
+        return model is not None
+
+    def start_load(self , variant):
+        task = asyncio.ensure_future(self.load(variant))
+        # Marks the exception as retrieved when every waiter was cancelled before the load failed.
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return task
+
+    async def load(self , variant):
+        needed = variant.memory_bytes()
+        try:
+            self.make_room(needed, variant.name)
+            self.reserved += needed
+            started = time.perf_counter()
+            try:
+                model = await asyncio.to_thread(self.loader, variant)
+            except ModelUnavailableError:
+                raise
+            except Exception as e:
+                raise ModelUnavailableError(f"Could not load model '{variant.name}': {e}") from e
+            finally:
+                self.reserved -= needed
+            logger.info(f"Loaded model '{variant.name}' ({variant.path}) in {time.perf_counter() - started:.1f}s")
+
+            self.variants[variant.name] = variant
+            old = self.loaded.pop(variant.name, None)
+            self.loaded[variant.name] = model
+            if old is not None:
+                logger.info(f"Swapped model '{variant.name}' to {model.version}; the old version drains {old.active} in-flight requests")
+                self.retire(old)
+            return model
+        finally:
+            self.loading.pop(variant.name, None)
+
+    def make_room(self , needed , name):
+        """Unloads least recently used variants other than `name` until `needed` more bytes fit the budget."""
+        if self.memory_budget is None:
+            return
+        if needed > self.memory_budget:
+            raise ModelUnavailableError(f"Model '{name}' needs about {needed >> 20} MB, more than the {self.memory_budget >> 20} MB budget")
+        for other in [other for other in self.loaded if other != name]:
+            if self.used_bytes + needed <= self.memory_budget:
+                break
+            logger.info(f"Unloading least recently used model '{other}' to stay within the memory budget")
+            self.retire(self.loaded.pop(other))
+            self.evictions += 1
+        if self.used_bytes + needed > self.memory_budget:
+            logger.warning(f"Loading '{name}' exceeds the memory budget until in-flight requests on unloaded models finish")
+
+    def retire(self , model):
+        model.retired = True
+        self.draining.add(model)
+        if model.active == 0:
+            self.close_model(model)
+
+    def close_model(self , model):
+        self.draining.discard(model)
+        # Closing waits for the model's worker threads, so it runs off the event loop.
+        asyncio.get_running_loop().run_in_executor(None, model.close)
+
+    async def close(self):
+        models = list(self.loaded.values()) + list(self.draining)
+        self.loaded.clear()
+        self.draining.clear()
+        # Like `close_model`, the worker threads are joined off the event loop.
+        await asyncio.gather(*(asyncio.to_thread(model.close) for model in models))
+
+    def stats(self):
+        loaded = {name: model.stats() for name, model in self.loaded.items()}
+        return {
+            "default": self.default,
+            "variants": list(self.variants),
+            "loaded": loaded,
+            "loading": list(self.loading),
+            "draining": len(self.draining),
+            "memory_used_mb": round(self.used_bytes / (1 << 20), 1),
+            "memory_budget_mb": round(self.memory_budget / (1 << 20), 1) if self.memory_budget else None,
+            "swaps": self.swaps,
+            "evictions": self.evictions,
+            # Totals over loaded models, as reported for the single model before.
+            "pool_size": sum(model["pool_size"] for model in loaded.values()),
+            "idle": sum(model["idle"] for model in loaded.values()),
+            "waiting": sum(model["waiting"] for model in loaded.values())
+        }
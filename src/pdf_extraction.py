@@ -0,0 +1,116 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pymupdf
+
+from src.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Part of the collection cache key, with the PyMuPDF version: bump when page text is joined or cleaned differently.
+PDF_EXTRACTION_VERSION = 1
+PDF_EXTRACTOR = f"pymupdf-{pymupdf.__version__}:{PDF_EXTRACTION_VERSION}"
+
+
+def iter_pdf_pages(pdf_path , start=0 , stop=None):
+    """
+    Yields the text of pages `start` .. `stop` of a PDF one page at a time, so the full
+    document text is never held in memory at once.
+    """
+    with pymupdf.open(pdf_path) as doc:
+        stop = doc.page_count if stop is None else min(stop, doc.page_count)
+        for page_number in range(start, stop):
+            yield doc.load_page(page_number).get_text()
+
+
+def extract_page_range(pdf_path , start , stop):
+    # Runs inside a worker process, so it has to stay a picklable module-level function.
+    return list(iter_pdf_pages(pdf_path, start, stop))
+
+
+def count_pages(pdf_path):
+    with pymupdf.open(pdf_path) as doc:
+        return doc.page_count
+
+
+class ParallelPDFExtractor:
+    """
+    Extracts PDFs on a process pool.
+
+    Every document is split into page ranges of at most `pages_per_task` pages, so large
+    documents are spread across several workers while small ones stay a single task.
+    Results are streamed back page by page in document order, and at most
+    `max_pending` ranges are in flight at once to keep memory bounded.
+    """
+
+    def __init__(self , pdf_config):
+        self.max_workers = pdf_config.get("max_workers") or os.cpu_count() or 1
+        self.pages_per_task = max(1, pdf_config.get("pages_per_task", 32))
+        self.max_pending = pdf_config.get("max_pending") or self.max_workers * 2
+
+    def plan(self , pdf_paths):
+        for pdf_path in pdf_paths:
+            try:
+                page_count = count_pages(pdf_path)
+            except Exception as e:
+                logger.error(f"Failed to open PDF: {pdf_path}: {e}")
+                continue
+
+            for start in range(0, page_count, self.pages_per_task):
+                yield pdf_path, start, min(start + self.pages_per_task, page_count), page_count
+
+    def stream_pages(self , pdf_paths):
+        """
+        Yields `(pdf_path, page_number, page_count, text)` for every page of every PDF,
+        in document and page order. A failed page range is logged and yields a single entry
+        with `text` None in place of its pages.
+        """
+        tasks = self.plan(pdf_paths)
+        pending = deque()
+
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            for task in tasks:
+                pending.append((task, executor.submit(extract_page_range, *task[:3])))
+                if len(pending) >= self.max_pending:
+                    yield from self._drain(pending.popleft())
+
+            while pending:
+                yield from self._drain(pending.popleft())
+
+    @staticmethod
+    def _drain(entry):
+        (pdf_path, start, stop, page_count), future = entry
+        try:
+            pages = future.result()
+        except Exception as e:
+            logger.error(f"Failed to extract pages {start}-{stop} of {pdf_path}: {e}")
+            yield pdf_path, start, page_count, None
+            return
+
+        for offset, text in enumerate(pages):
+            yield pdf_path, start + offset, page_count, text
+
+    def extract(self , pdf_paths):
+        """
+        Yields `(pdf_path, text)` for each document as soon as all of its pages are extracted.
+        A document with a failed page range is skipped as a whole, like a PDF that fails in
+        sync mode, rather than yielded with pages missing.
+        """
+        current, pages, failed = None, [], False
+
+        for pdf_path, page_number, page_count, text in self.stream_pages(pdf_paths):
+            if pdf_path != current:
+                if pages and not failed:
+                    yield current, "\n".join(pages)
+                current, pages, failed = pdf_path, [], False
+
+            if text is None:
+                if not failed:
+                    logger.error(f"Skipping {pdf_path}: not all of its pages could be extracted")
+                pages, failed = [], True
+            elif not failed:
+                pages.append(text)
+
+        if pages and not failed:
+            yield current, "\n".join(pages)
@@ -0,0 +1,287 @@
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import resource
+import threading
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+from src.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+def rss_high_water_mb(who=resource.RUSAGE_SELF):
+    # ru_maxrss is the maximum over the whole process lifetime (for children, of the largest
+    # child), in kilobytes on Linux.
+    return resource.getrusage(who).ru_maxrss / 1024.0
+
+
+def current_rss_mb():
+    """Resident set size right now, or None where /proc is not available."""
+    try:
+        with open("/proc/self/statm", encoding="ascii") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1 << 20)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class RssSampler:
+    """Background thread recording the largest resident set size seen while it runs."""
+
+    def __init__(self , interval=0.05):
+        self.interval = interval
+        self.peak = current_rss_mb()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def sample(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, current_rss_mb())
+
+    def start(self):
+        if self.peak is not None:
+            self.thread = threading.Thread(target=self.sample, name="rss-sampler", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.peak = max(self.peak, current_rss_mb())
+        return self.peak
+
+
+def children_cpu():
+    times = os.times()
+    return times.children_user + times.children_system
+
+
+class StackSampler:
+    """
+    Sampling profiler: a background thread records the Python stack of every other thread
+    each `interval` seconds. Stacks are written in the collapsed format read by flame graph
+    tools (`frame;frame;frame count`).
+    """
+
+    def __init__(self , interval=0.01):
+        self.interval = interval
+        self.stacks = Counter()
+        self.running = threading.Event()
+        self.thread = None
+
+    def sample(self):
+        own = threading.get_ident()
+        while self.running.is_set():
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+            time.sleep(self.interval)
+
+    def start(self):
+        self.running.set()
+        self.thread = threading.Thread(target=self.sample, name="stack-sampler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running.clear()
+        self.thread.join()
+
+    def dump(self , path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def top(self , n=10):
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return [{"frame": frame, "share": count / total} for frame, count in leaves.most_common(n)]
+
+
+class PipelineProfiler:
+    """
+    Records wall time, CPU time, peak RSS and items/sec for pipeline stages and their steps.
+    A stage's `peak_rss_mb` is sampled while it runs; `rss_high_water_mb` is the process
+    maximum so far, which an earlier stage may have set.
+
+    `stage` wraps a top-level stage (collection, QA generation). `section`, `iter` and `wrap`
+    time the steps inside it. Step times are exclusive: while a nested step runs, e.g. the
+    tokenizer pulled through the generation loop, the enclosing step's clock is paused. So the
+    steps of a streaming pipeline add up instead of each one counting its upstream stages.
+    Steps running on worker threads, such as HTML parsing, are timed on their own threads and
+    can overlap the main thread.
+
+    With `mode` 'cprofile' or 'sampling', each stage is also profiled and the profile is
+    written to `output_dir`.
+    """
+
+    def __init__(self , mode="timing" , output_dir=None , sample_interval=0.01):
+        self.mode = mode
+        self.output_dir = output_dir
+        self.sample_interval = sample_interval
+        self.stages = {}
+        self.current = None
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.started_at = time.strftime('%Y-%m-%d %H:%M:%S')
+        self.started = time.perf_counter()
+        self.started_cpu = time.process_time()
+
+    @contextmanager
+    def stage(self , name):
+        """Yields a dict; set its `items` to report the stage's throughput."""
+        info = {"items": None, "steps": {}}
+        self.stages[name] = info
+        self.current = name
+
+        profiler = None
+        if self.mode == "cprofile":
+            profiler = cProfile.Profile()
+            profiler.enable()
+        elif self.mode == "sampling":
+            profiler = StackSampler(self.sample_interval)
+            profiler.start()
+
+        rss = RssSampler()
+        rss.start()
+        wall, cpu, child_cpu = time.perf_counter(), time.process_time(), children_cpu()
+        try:
+            yield info
+        finally:
+            info["wall_s"] = time.perf_counter() - wall
+            info["cpu_s"] = time.process_time() - cpu
+            info["children_cpu_s"] = children_cpu() - child_cpu
+            info["peak_rss_mb"] = rss.stop()
+            info["rss_high_water_mb"] = rss_high_water_mb()
+            info["children_rss_high_water_mb"] = rss_high_water_mb(resource.RUSAGE_CHILDREN)
+            if info["items"] is not None and info["wall_s"] > 0:
+                info["items_per_s"] = info["items"] / info["wall_s"]
+            if profiler is not None:
+                self.save_profile(name, info, profiler)
+            self.current = None
+
+    def save_profile(self , name , info , profiler):
+        os.makedirs(self.output_dir, exist_ok=True)
+        if self.mode == "cprofile":
+            profiler.disable()
+            path = os.path.join(self.output_dir, f"{name}.prof")
+            profiler.dump_stats(path)
+            stats = pstats.Stats(profiler)
+            top = sorted(stats.stats.items(), key=lambda entry: entry[1][2], reverse=True)[:10]
+            info["top_functions"] = [
+                {"function": f"{func} ({os.path.basename(file)}:{line})", "self_s": entry[2], "cumulative_s": entry[3]}
+                for (file, line, func), entry in top
+            ]
+        else:
+            profiler.stop()
+            path = os.path.join(self.output_dir, f"{name}.folded")
+            profiler.dump(path)
+            info["top_frames"] = profiler.top()
+        info["profile"] = path
+
+    @contextmanager
+    def section(self , name , items=1):
+        """Times one step; the yielded dict's `items` can be changed before the block ends."""
+        stack = self.local.__dict__.setdefault("stack", [])
+        now = (time.perf_counter(), time.thread_time())
+        if stack:
+            parent = stack[-1]
+            parent["wall"] += now[0] - parent["start"][0]
+            parent["cpu"] += now[1] - parent["start"][1]
+
+        frame = {"start": now, "wall": 0.0, "cpu": 0.0, "items": items}
+        stack.append(frame)
+        try:
+            yield frame
+        finally:
+            now = (time.perf_counter(), time.thread_time())
+            stack.pop()
+            frame["wall"] += now[0] - frame["start"][0]
+            frame["cpu"] += now[1] - frame["start"][1]
+            if stack:
+                stack[-1]["start"] = now
+            self.record(name, frame)
+
+    def record(self , name , frame):
+        with self.lock:
+            steps = self.stages.setdefault(self.current or "unstaged", {"items": None, "steps": {}})["steps"]
+            step = steps.setdefault(name, {"calls": 0, "items": 0, "wall_s": 0.0, "cpu_s": 0.0})
+            step["calls"] += 1
+            step["items"] += frame["items"]
+            step["wall_s"] += frame["wall"]
+            step["cpu_s"] += frame["cpu"]
+
+    def iter(self , name , iterable):
+        """Times the production of every item of `iterable` as step `name`."""
+        iterator = iter(iterable)
+        while True:
+            with self.section(name) as frame:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    frame["items"] = 0
+                    return
+            yield item
+
+    def wrap(self , name , fn):
+        def timed(*args , **kwargs):
+            with self.section(name):
+                return fn(*args, **kwargs)
+        return timed
+
+    def report(self):
+        for info in self.stages.values():
+            for step in info["steps"].values():
+                step["items_per_s"] = step["items"] / step["wall_s"] if step["wall_s"] > 0 else None
+        return {
+            "started_at": self.started_at,
+            "mode": self.mode,
+            "wall_s": time.perf_counter() - self.started,
+            "cpu_s": time.process_time() - self.started_cpu,
+            "rss_high_water_mb": rss_high_water_mb(),
+            "stages": self.stages
+        }
+
+    def save(self , path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2)
+        logger.info(f"Saved pipeline profile to {path}")
+
+
+class NullProfiler:
+    """Stand-in used when profiling is off; every hook is a no-op."""
+
+    def stage(self , name):
+        return nullcontext({})
+
+    def section(self , name , items=1):
+        return nullcontext({})
+
+    def iter(self , name , iterable):
+        return iterable
+
+    def wrap(self , name , fn):
+        return fn
+
+
+_profiler = NullProfiler()
+
+
+def get_profiler():
+    return _profiler
+
+
+def set_profiler(profiler):
+    global _profiler
+    _profiler = profiler if profiler is not None else NullProfiler()
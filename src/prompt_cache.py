@@ -0,0 +1,127 @@
+import os
+import pickle
+
+from src.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+USER_SENTINEL = "\x00question\x00"
+
+
+def prompt_tokens(llm , prompt):
+    """
+    Tokenizes a rendered chat prompt the way it is evaluated: special tokens parsed and exactly
+    one leading BOS. Chat templates already start with `<|begin_of_text|>`, and llama.cpp puts
+    its own BOS in front of string prompts, so prompts go to the model as these token lists;
+    the saved prefix state is tokenized by the same function and so matches them token for token.
+    """
+    tokens = llm.tokenize(prompt.encode("utf-8"), add_bos=False, special=True)
+    if not tokens or tokens[0] != llm.token_bos():
+        tokens = [llm.token_bos()] + tokens
+    return tokens
+
+
+def shared_token_count(a , b):
+    count = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        count += 1
+    return count
+
+
+def shared_prefix(render):
+    """
+    Returns the part of every prompt that precedes the user's question, given `render`, a
+    function that builds the full prompt for a question.
+    """
+    prompt = render(USER_SENTINEL)
+    return prompt[:prompt.index(USER_SENTINEL)]
+
+
+def shared_suffix(render):
+    """Returns the part of every prompt that follows the user's question (the generation prompt)."""
+    prompt = render(USER_SENTINEL)
+    return prompt[prompt.index(USER_SENTINEL) + len(USER_SENTINEL):]
+
+
+class PrefixKVCache:
+    """
+    Keeps the llama.cpp state after evaluating the prompt prefix shared by all requests
+    (chat-template header and system message).
+
+    `prepare` evaluates the prefix once per model instance, or loads the saved state from
+    `state_path` if it was produced for the same model file and prefix. `restore` puts that
+    state back before a request whenever the instance's context no longer starts with the
+    prefix; llama.cpp's prefix matching then evaluates only the request-specific suffix.
+
+    `sample_prompt`, a complete rendered prompt, checks that requests really start with the
+    prefix tokens; if they do not (e.g. a template whose tokens merge across the boundary), the
+    cache is disabled, since restoring a state that never matches only costs time.
+    """
+
+    def __init__(self , prefix , model_id , state_path=None , sample_prompt=None):
+        self.prefix = prefix
+        self.model_id = model_id
+        self.state_path = state_path
+        self.sample_prompt = sample_prompt
+        self.tokens = None
+        self.state = None
+        self.enabled = True
+
+    def tokenize(self , llm):
+        return prompt_tokens(llm, self.prefix)
+
+    def load(self , tokens):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return None
+        try:
+            with open(self.state_path, "rb") as f:
+                saved = pickle.load(f)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable prefix state {self.state_path}: {e}")
+            return None
+
+        if saved.get("model_id") != self.model_id or saved.get("tokens") != tokens:
+            logger.info("Saved prefix state is for another model or prompt, recomputing")
+            return None
+        return saved["state"]
+
+    def save(self):
+        if not self.state_path:
+            return
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"model_id": self.model_id, "tokens": self.tokens, "state": self.state}, f)
+        os.replace(tmp_path, self.state_path)
+
+    def prepare(self , llm):
+        tokens = self.tokenize(llm)
+        if self.sample_prompt is not None:
+            shared = shared_token_count(prompt_tokens(llm, self.sample_prompt), tokens)
+            if shared != len(tokens):
+                logger.warning(f"Requests share only {shared} of the {len(tokens)} prefix tokens; prefix KV cache disabled")
+                self.enabled = False
+                return llm
+
+        if self.state is None:
+            self.tokens = tokens
+            self.state = self.load(tokens)
+            if self.state is not None:
+                logger.info(f"Loaded prefix KV state ({len(tokens)} tokens) from {self.state_path}")
+            else:
+                llm.reset()
+                llm.eval(tokens)
+                self.state = llm.save_state()
+                logger.info(f"Computed prefix KV state ({len(tokens)} tokens)")
+                self.save()
+
+        llm.load_state(self.state)
+        return llm
+
+    def restore(self , llm):
+        if not self.enabled:
+            return
+        n_prefix = len(self.tokens)
+        if llm.n_tokens < n_prefix or list(llm.input_ids[:n_prefix]) != self.tokens:
+            llm.load_state(self.state)
@@ -0,0 +1,255 @@
+import os
+import re
+import json
+import random
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from src.async_collection import HostRateLimiter
+from src.utils.jsonl_store import iter_jsonl
+from src.profiling import get_profiler
+from src.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+CODE_FENCE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.I)
+
+
+class VertexGenerationClient:
+    """
+    Generation backend that calls a Gemini model on Vertex AI.
+    """
+
+    def __init__(self , model_name , project , location , generation_config):
+        import vertexai
+        from vertexai.generative_models import GenerativeModel
+
+        vertexai.init(project=project, location=location)
+        self.model = GenerativeModel(model_name)
+        self.generation_config = generation_config
+        logger.info(f"Successfully initialzed {model_name} ")
+
+    async def generate(self , prompt):
+        resp = await self.model.generate_content_async(prompt, generation_config=self.generation_config)
+        return resp.text
+
+
+class FakeGenerationClient:
+    """
+    Offline backend that answers instantly with QA pairs taken from the chunk itself. Used to
+    exercise the generation engine locally without API calls.
+    """
+
+    def __init__(self , pairs_per_chunk=3 , delay=0.0):
+        self.pairs_per_chunk = pairs_per_chunk
+        self.delay = delay
+
+    async def generate(self , prompt):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+
+        chunk = prompt.rsplit("[Text Chunk]:", 1)[-1].rsplit("JSON Output:", 1)[0]
+        sentences = [s.strip() for s in re.split(r"(?<=[.!?])\s+", chunk) if s.strip()]
+        pairs = [
+            {"question": f"What does the text say in sentence {i + 1}?", "answer": sentence}
+            for i, sentence in enumerate(sentences[:self.pairs_per_chunk])
+        ]
+        return "```json\n" + json.dumps(pairs) + "\n```"
+
+
+def build_generation_client(processing_config , project , location):
+    generation_config = processing_config.get("generation", {})
+    backend = generation_config.get("backend", "vertex")
+
+    if backend == "fake":
+        return FakeGenerationClient()
+    if backend == "vertex":
+        return VertexGenerationClient(
+            processing_config["model_name"],
+            project,
+            location,
+            {
+                "max_output_tokens": generation_config.get("max_output_tokens", 8192),
+                "temperature": generation_config.get("temperature", 0.3),
+                "top_p": generation_config.get("top_p", 0.9)
+            }
+        )
+    raise ValueError(f"Unknown generation backend: {backend}")
+
+
+def parse_qa_pairs(resp_text):
+    qa_pairs = json.loads(CODE_FENCE.sub("", resp_text))
+    if not isinstance(qa_pairs, list):
+        raise ValueError("expected a JSON array of QA pairs")
+    return [qa for qa in qa_pairs if isinstance(qa, dict) and qa.get("question") and qa.get("answer")]
+
+
+# Checkpoint key of the examples of an output file written before checkpoints existed.
+LEGACY_OUTPUT_KEY = "legacy-output"
+
+
+def chunk_key(chunk):
+    return hashlib.sha1(chunk["text"].encode("utf-8")).hexdigest()
+
+
+def training_example(qa):
+    return {
+        "alpaca_format": {
+            "instruction": qa["question"],
+            "input": "",
+            "output": qa["answer"]
+        },
+        "text_format": f"### Question: {qa['question']}\n### Answer: {qa['answer']}"
+    }
+
+
+class QAGenerationEngine:
+    """
+    Generates QA pairs for a stream of chunks with bounded concurrency.
+
+    Requests are rate limited and retried with exponential backoff, both on API errors and on
+    responses that fail to parse. As soon as a chunk finishes, its examples are appended to
+    `output_path` and the chunk is recorded in `checkpoint_path`; a later run skips every
+    recorded chunk, so an interrupted run resumes where it stopped and newly added chunks are
+    the only ones sent for generation. An output file without a checkpoint (written before
+    checkpoints existed) is kept, but no chunk is known to be done, so every chunk is
+    generated once next to it.
+
+    Chunks are pulled from the (synchronous) chunk stream on a reader thread, so chunking,
+    tokenization and dedup never block the event loop while requests are in flight.
+    """
+
+    def __init__(self , client , prompt_builder , generation_config , output_path , checkpoint_path):
+        self.client = client
+        self.prompt_builder = prompt_builder
+        self.max_concurrency = generation_config.get("max_concurrency", 8)
+        self.requests_per_second = generation_config.get("requests_per_second", 2.0)
+        self.max_retries = generation_config.get("max_retries", 3)
+        self.backoff_base = generation_config.get("backoff_base", 2.0)
+        self.backoff_max = generation_config.get("backoff_max", 60.0)
+        self.output_path = output_path
+        self.checkpoint_path = checkpoint_path
+
+    def load_checkpoint(self):
+        """
+        Returns the keys of completed chunks and trims the output file to the examples those
+        chunks account for, dropping lines from a chunk that was being written when the
+        previous run stopped.
+        """
+        if os.path.exists(self.output_path) and not os.path.exists(self.checkpoint_path):
+            self.adopt_output()
+
+        done, n_examples = set(), 0
+        for entry in iter_jsonl(self.checkpoint_path):
+            done.add(entry["chunk_key"])
+            n_examples += entry["examples"]
+
+        if os.path.exists(self.output_path):
+            with open(self.output_path, "r+", encoding="utf-8") as f:
+                for _ in range(n_examples):
+                    if not f.readline():
+                        break
+                f.truncate(f.tell())
+
+        return done, n_examples
+
+    def adopt_output(self):
+        """Records the examples of an output file without a checkpoint, so resuming keeps them."""
+        with open(self.output_path, "r", encoding="utf-8") as f:
+            n_examples = sum(1 for line in f if line.strip())
+        logger.info(f"Keeping {n_examples} examples of {self.output_path}, which has no checkpoint; all chunks will be generated")
+        with open(self.checkpoint_path, "w", encoding="utf-8") as checkpoint:
+            checkpoint.write(json.dumps({"chunk_key": LEGACY_OUTPUT_KEY, "examples": n_examples}) + '\n')
+
+    def backoff_delay(self , attempt):
+        return min(self.backoff_base * (2 ** attempt), self.backoff_max) * random.uniform(0.5, 1.0)
+
+    async def generate_chunk(self , chunk):
+        prompt = self.prompt_builder(chunk["text"])
+
+        for attempt in range(self.max_retries + 1):
+            await self.rate_limiter.wait("generation")
+            try:
+                async with self.semaphore:
+                    resp_text = await self.client.generate(prompt)
+                return parse_qa_pairs(resp_text)
+
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff_delay(attempt)
+                logger.warning(f"Retrying chunk {chunk['source']}#{chunk['chunk_id']} in {delay:.1f}s after {type(e).__name__}: {e}")
+                await asyncio.sleep(delay)
+
+    def record(self , out , checkpoint , key , qa_pairs):
+        with get_profiler().section("write", items=len(qa_pairs)):
+            self.write_examples(out, checkpoint, key, qa_pairs)
+
+    def write_examples(self , out , checkpoint , key , qa_pairs):
+        for qa in qa_pairs:
+            out.write(json.dumps(training_example(qa), ensure_ascii=False) + '\n')
+        out.flush()
+        checkpoint.write(json.dumps({"chunk_key": key, "examples": len(qa_pairs)}) + '\n')
+        checkpoint.flush()
+
+    async def arun(self , chunks):
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.rate_limiter = HostRateLimiter(self.requests_per_second)
+
+        done, n_examples = self.load_checkpoint()
+        if done:
+            logger.info(f"Resuming QA generation: {len(done)} chunks / {n_examples} examples already generated")
+
+        stats = {"generated": 0, "skipped": 0, "failed": 0, "examples": 0}
+        pending, queued = {}, set()
+        loop = asyncio.get_running_loop()
+        chunks, end = iter(chunks), object()
+
+        # One reader thread, so the stream is only ever advanced by one thread at a time.
+        with open(self.output_path, "a", encoding="utf-8") as out, open(self.checkpoint_path, "a", encoding="utf-8") as checkpoint, \
+                ThreadPoolExecutor(max_workers=1, thread_name_prefix="chunk-reader") as reader:
+
+            async def drain(return_when):
+                finished, _ = await asyncio.wait(pending, return_when=return_when)
+                for task in finished:
+                    key, chunk = pending.pop(task)
+                    queued.discard(key)
+                    try:
+                        qa_pairs = task.result()
+                    except Exception as e:
+                        stats["failed"] += 1
+                        logger.error(f"QA generation failed for {chunk['source']}#{chunk['chunk_id']}: {e}")
+                        continue
+
+                    self.record(out, checkpoint, key, qa_pairs)
+                    done.add(key)
+                    stats["generated"] += 1
+                    stats["examples"] += len(qa_pairs)
+
+            while True:
+                chunk = await loop.run_in_executor(reader, next, chunks, end)
+                if chunk is end:
+                    break
+                key = chunk_key(chunk)
+                if key in done or key in queued:
+                    stats["skipped"] += 1
+                    continue
+
+                pending[asyncio.create_task(self.generate_chunk(chunk))] = (key, chunk)
+                queued.add(key)
+                if len(pending) >= self.max_concurrency * 2:
+                    await drain(asyncio.FIRST_COMPLETED)
+
+            if pending:
+                await drain(asyncio.ALL_COMPLETED)
+
+        return stats
+
+    def run(self , chunks):
+        stats = asyncio.run(self.arun(chunks))
+        logger.info(
+            f" Created {stats['examples']} simple QA from {stats['generated']} chunks "
+            f"({stats['skipped']} already done, {stats['failed']} failed)"
+        )
+        return stats
@@ -0,0 +1,314 @@
+import os
+import re
+import json
+import mmap
+import time
+import shutil
+import hashlib
+import argparse
+from array import array
+from collections import Counter
+
+import numpy as np
+
+from config.path_config import *
+from src.utils.logging import get_logger
+from src.utils.cmn_func import read_yaml
+from src.utils.jsonl_store import iter_jsonl
+from src.answer_cache import HashingEmbedder
+
+logger = get_logger(__name__)
+
+TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from has have how i if in is it its of on or "
+    "that the their there these this to was what when where which who why will with you your".split()
+)
+RRF_K = 60
+
+
+def tokenize(text):
+    return [token for token in TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def top_k(scores , k , ids=None):
+    """Indexes (or `ids`) of the `k` largest scores, best first, without sorting the rest."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=scores.dtype)
+    best = np.argpartition(scores, -k)[-k:] if k < len(scores) else np.arange(len(scores))
+    best = best[np.argsort(scores[best])[::-1]]
+    return (best if ids is None else ids[best]), scores[best]
+
+
+class ChunkStore:
+    """
+    Chunk records in one JSONL file, read by position through a memory map and the byte
+    offset of every line, so only the records that are returned get decoded.
+    """
+
+    def __init__(self , directory):
+        self.offsets = np.load(os.path.join(directory, "chunk_offsets.npy"), mmap_mode="r")
+        self.file = open(os.path.join(directory, "chunks.jsonl"), "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if len(self.offsets) > 1 else b""
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self , i):
+        return json.loads(self.data[self.offsets[i]:self.offsets[i + 1]])
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+
+class BM25Index:
+    """
+    Okapi BM25 over an inverted index in CSR form: the postings of term `t` are
+    `docs[offsets[t]:offsets[t + 1]]`. Every posting stores its precomputed BM25 impact
+    (idf x saturated, length-normalized tf), so a query is a handful of vectorized slice
+    additions followed by a partial sort, with no per-document Python work. The arrays are
+    memory-mapped, so loading is instant and the pages are shared between processes.
+    """
+
+    def __init__(self , directory):
+        with open(os.path.join(directory, "vocabulary.json"), encoding="utf-8") as f:
+            self.vocabulary = {term: i for i, term in enumerate(json.load(f))}
+        self.offsets = np.load(os.path.join(directory, "postings_offsets.npy"), mmap_mode="r")
+        self.docs = np.load(os.path.join(directory, "postings_docs.npy"), mmap_mode="r")
+        self.weights = np.load(os.path.join(directory, "postings_weights.npy"), mmap_mode="r")
+        self.count = int(np.load(os.path.join(directory, "doc_lengths.npy"), mmap_mode="r").shape[0])
+
+    @staticmethod
+    def write(directory , term_ids , doc_ids , tfs , doc_lengths , vocabulary , k1=1.2 , b=0.75):
+        term_ids = np.frombuffer(term_ids, dtype=np.uint32)
+        doc_ids = np.frombuffer(doc_ids, dtype=np.uint32)
+        tfs = np.frombuffer(tfs, dtype=np.uint32).astype(np.float32)
+        doc_lengths = np.asarray(doc_lengths, dtype=np.float32)
+
+        # Documents were added in order, so a stable sort by term keeps every posting list sorted by document.
+        order = np.argsort(term_ids, kind="stable")
+        df = np.bincount(term_ids, minlength=len(vocabulary))
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(df, out=offsets[1:])
+
+        n = len(doc_lengths)
+        idf = np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        average = doc_lengths.mean() if n else 1.0
+        norm = k1 * (1 - b + b * doc_lengths[doc_ids] / average)
+        weights = idf[term_ids] * tfs * (k1 + 1) / (tfs + norm)
+
+        np.save(os.path.join(directory, "postings_offsets.npy"), offsets)
+        np.save(os.path.join(directory, "postings_docs.npy"), doc_ids[order].astype(np.int32))
+        np.save(os.path.join(directory, "postings_weights.npy"), weights[order].astype(np.float32))
+        np.save(os.path.join(directory, "doc_lengths.npy"), doc_lengths)
+        with open(os.path.join(directory, "vocabulary.json"), "w", encoding="utf-8") as f:
+            json.dump(vocabulary, f, ensure_ascii=False)
+
+    def search(self , query , k=4):
+        spans = [
+            (self.offsets[t], self.offsets[t + 1])
+            for t in {self.vocabulary[term] for term in tokenize(query) if term in self.vocabulary}
+        ]
+        postings = sum(end - start for start, end in spans)
+        if not postings:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        if postings * 4 < self.count:
+            # Rare terms: score only the documents that contain them.
+            docs = np.concatenate([self.docs[start:end] for start, end in spans])
+            weights = np.concatenate([self.weights[start:end] for start, end in spans])
+            candidates, slots = np.unique(docs, return_inverse=True)
+            return top_k(np.bincount(slots, weights, minlength=len(candidates)), k, candidates)
+
+        scores = np.zeros(self.count, dtype=np.float32)
+        for start, end in spans:
+            # Document ids are unique within a posting list, so fancy-index addition is exact.
+            scores[self.docs[start:end]] += self.weights[start:end]
+        return top_k(scores, k)
+
+
+class DenseIndex:
+    """
+    Hashed n-gram embeddings (`HashingEmbedder`) of every chunk as a row of a memory-mapped
+    float32 matrix. Rows are L2-normalized, so one matrix-vector product gives the cosine
+    similarity of the query to every chunk.
+    """
+
+    def __init__(self , directory , count , dims):
+        self.embedder = HashingEmbedder(dims)
+        self.matrix = np.memmap(os.path.join(directory, "dense.f32"), dtype=np.float32, mode="r", shape=(count, dims)) if count else np.zeros((0, dims), dtype=np.float32)
+
+    def search(self , query , k=4):
+        query_vector = self.embedder(query.lower())
+        if not query_vector.any():
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        return top_k(self.matrix @ query_vector, k)
+
+
+def reciprocal_rank_fusion(rankings , k):
+    scores = {}
+    for ids in rankings:
+        for rank, i in enumerate(ids.tolist()):
+            scores[i] = scores.get(i, 0.0) + 1.0 / (RRF_K + rank + 1)
+    ids = np.fromiter(scores.keys(), dtype=np.int64, count=len(scores))
+    return top_k(np.fromiter(scores.values(), dtype=np.float64, count=len(scores)), k, ids)
+
+
+class RetrievalIndex:
+    """
+    Chunk retrieval for grounded answers: a BM25 index, an optional dense index and the
+    chunk records themselves, all in one directory. `mode` is 'bm25', 'dense' or 'hybrid'
+    (reciprocal rank fusion of both rankings).
+    """
+
+    def __init__(self , directory):
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.directory = directory
+        self.chunks = ChunkStore(directory)
+        self.bm25 = BM25Index(directory)
+        dims = self.meta.get("dense_dims")
+        self.dense = DenseIndex(directory, self.meta["count"], dims) if dims else None
+
+    @property
+    def version(self):
+        return self.meta["version"]
+
+    def __len__(self):
+        return self.meta["count"]
+
+    def search(self , query , k=4 , mode="bm25"):
+        if mode == "bm25" or (mode == "hybrid" and self.dense is None):
+            return self.bm25.search(query, k)
+        if self.dense is None:
+            raise ValueError("Index was built without dense vectors")
+        if mode == "dense":
+            return self.dense.search(query, k)
+        if mode == "hybrid":
+            depth = max(k * 4, 20)
+            return reciprocal_rank_fusion([self.bm25.search(query, depth)[0], self.dense.search(query, depth)[0]], k)
+        raise ValueError(f"Unknown retrieval mode: {mode}")
+
+    def retrieve(self , query , k=4 , mode="bm25"):
+        """Returns the `k` best chunk records, each with its `score`."""
+        ids, scores = self.search(query, k, mode)
+        return [{**self.chunks[i], "score": float(score)} for i, score in zip(ids.tolist(), scores.tolist())]
+
+    def close(self):
+        self.chunks.close()
+
+    @classmethod
+    def build(cls , chunks , directory=RETRIEVAL_INDEX_DIR , k1=1.2 , b=0.75 , dense_dims=None):
+        """
+        Indexes an iterable of chunk records (`source`, `chunk_id`, `text`, ...) in one pass,
+        writing into a temporary directory that replaces `directory` when complete, so a
+        server that has the old index mapped keeps reading consistent files. The old index is
+        renamed aside before the swap and deleted only after it, so there is always a
+        complete index on disk.
+        """
+        started = time.perf_counter()
+        staging = f"{directory}.tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+
+        vocabulary, terms = [], {}
+        term_ids, doc_ids, tfs = array("I"), array("I"), array("I")
+        doc_lengths, offsets = [], [0]
+        embedder = HashingEmbedder(dense_dims) if dense_dims else None
+        digest = hashlib.sha256()
+
+        with open(os.path.join(staging, "chunks.jsonl"), "wb") as chunk_file, \
+                open(os.path.join(staging, "dense.f32"), "wb") as dense_file:
+            for doc_id, chunk in enumerate(chunks):
+                line = (json.dumps(chunk, ensure_ascii=False) + "\n").encode("utf-8")
+                chunk_file.write(line)
+                offsets.append(offsets[-1] + len(line))
+                digest.update(line)
+
+                tokens = tokenize(chunk["text"])
+                doc_lengths.append(len(tokens))
+                for term, tf in Counter(tokens).items():
+                    term_id = terms.get(term)
+                    if term_id is None:
+                        term_id = terms[term] = len(vocabulary)
+                        vocabulary.append(term)
+                    term_ids.append(term_id)
+                    doc_ids.append(doc_id)
+                    tfs.append(tf)
+
+                if embedder is not None:
+                    dense_file.write(embedder(chunk["text"].lower()).tobytes())
+
+        np.save(os.path.join(staging, "chunk_offsets.npy"), np.asarray(offsets, dtype=np.int64))
+        BM25Index.write(staging, term_ids, doc_ids, tfs, doc_lengths, vocabulary, k1, b)
+        if embedder is None:
+            os.remove(os.path.join(staging, "dense.f32"))
+
+        meta = {
+            "count": len(doc_lengths),
+            "terms": len(vocabulary),
+            "postings": len(term_ids),
+            "k1": k1,
+            "b": b,
+            "dense_dims": dense_dims,
+            "version": digest.hexdigest()[:16],
+            "built_at": time.strftime('%Y-%m-%d %H:%M:%S')
+        }
+        with open(os.path.join(staging, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+
+        retired = f"{directory}.old"
+        shutil.rmtree(retired, ignore_errors=True)
+        if os.path.exists(directory):
+            os.replace(directory, retired)
+        os.replace(staging, directory)
+        shutil.rmtree(retired, ignore_errors=True)
+        logger.info(
+            f"Indexed {meta['count']} chunks ({meta['terms']} terms, {meta['postings']} postings"
+            f"{', dense' if dense_dims else ''}) in {time.perf_counter() - started:.1f}s"
+        )
+        return cls(directory)
+
+    @classmethod
+    def from_config(cls , retrieval_config , chunks_path=PROCESSED_DIR_CHUNK_SHARDS):
+        """Builds the index configured in the `retrieval` section from the chunk shards."""
+        dense = retrieval_config.get("dense", {})
+        return cls.build(
+            iter_jsonl(chunks_path),
+            retrieval_config.get("index_dir", RETRIEVAL_INDEX_DIR),
+            k1=retrieval_config.get("k1", 1.2),
+            b=retrieval_config.get("b", 0.75),
+            dense_dims=dense.get("dims", 256) if dense.get("enabled", False) else None
+        )
+
+
+def load_index(directory=RETRIEVAL_INDEX_DIR):
+    """The index in `directory`, or None if it has not been built."""
+    retired = f"{directory}.old"
+    if not os.path.exists(directory) and os.path.exists(os.path.join(retired, "meta.json")):
+        # A build stopped between its two renames; the previous index is still complete.
+        os.replace(retired, directory)
+    if not os.path.exists(os.path.join(directory, "meta.json")):
+        return None
+    return RetrievalIndex(directory)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the chunk retrieval index, or query it.")
+    parser.add_argument("--query", help="search the existing index instead of building it")
+    parser.add_argument("--mode", choices=["bm25", "dense", "hybrid"], default="bm25")
+    parser.add_argument("-k", type=int, default=4)
+    args = parser.parse_args()
+
+    retrieval_config = read_yaml(CONFIG_PATH).get("retrieval", {})
+    if args.query:
+        index = load_index(retrieval_config.get("index_dir", RETRIEVAL_INDEX_DIR))
+        if index is None:
+            raise SystemExit("No retrieval index; build it with `python -m src.retrieval`")
+        for chunk in index.retrieve(args.query, args.k, args.mode):
+            print(f"{chunk['score']:.3f}  {chunk['source']}#{chunk['chunk_id']}  {chunk['text'][:120]!r}")
+    else:
+        RetrievalIndex.from_config(retrieval_config)
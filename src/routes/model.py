@@ -1,73 +1,639 @@
-from fastapi import APIRouter, Request
-from pydantic import BaseModel
-from llama_cpp import Llama
-from transformers import AutoTokenizer
-import logging
+from fastapi import APIRouter, Request, HTTPException
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from pydantic import BaseModel, Field
+from llama_cpp import StoppingCriteriaList
+from typing import List, Optional
 import os
-from pydantic import BaseModel
+import json
+import time
+import asyncio
+import threading
 from config.path_config import *
 from src.utils.logging import get_logger
 from src.utils.cmn_func import read_yaml
 from src.utils.exception import CustomException
+from src.inference import QueueFullError, SchedulerUnavailableError, InferenceTimeoutError, cancel_criteria
+from src.model_registry import ModelNotFoundError
+from src.answer_cache import AnswerCache, normalize_question
+from src.telemetry import llama_counters
+from src.chat_template import SYSTEM_PROMPT
+from src.prompt_cache import prompt_tokens
 
 model_router = APIRouter(prefix="/model", tags=["Model"])
 logger = get_logger(__name__)
 
+SSE_HEARTBEAT = 5.0
+GENERATION_PARAMS = {"max_tokens": 428, "stop": ["###"]}
+BATCH_CONFIG = read_yaml(CONFIG_PATH)["api"].get("batch_endpoint", {})
+RETRIEVAL_CONFIG = read_yaml(CONFIG_PATH)["api"].get("retrieval", {})
+RAG_INSTRUCTION = (
+    "Answer the question using the context below. If the context does not contain the answer, "
+    "answer from your own knowledge and say so."
+)
+
 
 class QuestionInput(BaseModel):
     question: str
+    model: Optional[str] = None
+    rag: Optional[bool] = None
+    top_k: Optional[int] = Field(default=None, gt=0, le=20)
+    include_sources: bool = False
+
+
+class BatchItem(BaseModel):
+    question: str
+    id: Optional[str] = None
+    max_tokens: Optional[int] = Field(default=None, gt=0)
+    temperature: Optional[float] = Field(default=None, ge=0)
+    top_p: Optional[float] = Field(default=None, gt=0, le=1)
+    top_k: Optional[int] = Field(default=None, ge=0)
+    stop: Optional[List[str]] = None
+
+    def generation_params(self):
+        overrides = self.model_dump(exclude={"question", "id"}, exclude_none=True)
+        return {**GENERATION_PARAMS, **overrides}
+
+
+class BatchInput(BaseModel):
+    items: List[BatchItem] = Field(min_length=1)
+    stream: bool = False
+    model: Optional[str] = None
+
+
+class SwapInput(BaseModel):
+    path: Optional[str] = None
 
 
 @model_router.get("/health-check")
-async def health_check():
+async def health_check(request : Request):
     """
     A simple endpoint to check if the server is responsive.
     """
     logger.info("Health check endpoint was called.")
-    return {"status": "ok", "message": "Server is responsive."}
+    models = getattr(request.app.state, "models", None)
+    answer_cache = get_answer_cache(request)
+    return {
+        "status": "ok",
+        "message": "Server is responsive.",
+        "inference": models.stats() if models is not None else None,
+        "answer_cache": answer_cache.stats() if answer_cache is not None else None
+    }
+
+
+
+
+
+
+@model_router.get("/metrics")
+async def metrics(request : Request):
+    """
+    Prometheus text-format metrics: queue wait, prompt templating, prompt evaluation, decoding
+    and latency histograms, request/cache/error counters and scheduler and cache gauges.
+    """
+    return PlainTextResponse(get_telemetry(request).render(), media_type="text/plain; version=0.0.4")
+
+
+@model_router.get("/models")
+async def list_models(request : Request):
+    """
+    Configured model variants, the loaded ones (version, memory estimate, instance pool and
+    in-flight requests) and the memory budget.
+    """
+    try:
+        return get_models(request).stats()
+    except SchedulerUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@model_router.post("/models/{name}/swap")
+async def swap_model(name : str , swap_input : SwapInput , request : Request):
+    """
+    Loads a new version of model `name` (from `path`, a GGUF file under the models directory,
+    or its current file again, e.g. after `download_model.py` replaced it) and switches new
+    requests to it once loaded. Requests already running finish on the old version, which is
+    then unloaded; if the new version fails to load, the old one keeps serving.
+    """
+    path = swap_input.path
+    if path is not None and os.path.commonpath([os.path.abspath(path), os.path.abspath(MODEL_DIR)]) != os.path.abspath(MODEL_DIR):
+        raise HTTPException(status_code=400, detail=f"Model files must be under {MODEL_DIR}")
+    try:
+        models = get_models(request)
+        started = time.perf_counter()
+        loaded = await models.swap(name, path)
+    except ModelNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except SchedulerUnavailableError as e:
+        logger.error(f"Model swap failed: {e}")
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"model": name, "version": loaded.version, "path": loaded.variant.path, "seconds": round(time.perf_counter() - started, 3)}
+
+
+@model_router.post("/models/{name}/unload")
+async def unload_model(name : str , request : Request):
+    """Unloads model `name` once its in-flight requests finish; the next request for it loads it again."""
+    try:
+        return {"model": name, "unloaded": get_models(request).unload(name)}
+    except ModelNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except SchedulerUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
 
+def get_telemetry(request):
+    return request.app.state.telemetry
 
 
+def get_answer_cache(request):
+    return getattr(request.app.state, "answer_cache", None)
+
+
+def get_models(request):
+    models = getattr(request.app.state, "models", None)
+    if models is None:
+        raise SchedulerUnavailableError("Model is not loaded")
+    return models
+
+
+def format_context(chunks , max_chars):
+    parts, used = [], 0
+    for number, chunk in enumerate(chunks, 1):
+        text = chunk["text"].strip()[:max(max_chars - used, 0)]
+        if not text:
+            break
+        parts.append(f"[{number}] ({chunk['source']})\n{text}")
+        used += len(text)
+    return "\n\n".join(parts)
+
+
+def render_prompt(chat_template , question , context=None):
+    # The context goes into the user message, so the system prefix (and its cached KV state) is shared.
+    content = question if not context else f"{RAG_INSTRUCTION}\n\nContext:\n{context}\n\nQuestion: {question}"
+    messages = [
+    {"role": "system", "content": SYSTEM_PROMPT},
+    {"role": "user", "content": content}
+    ]
+
+    return chat_template(messages, add_generation_prompt=True)
+
+
+def build_prompt(request , chat_template , question , chunks=None):
+    telemetry = get_telemetry(request)
+    context = format_context(chunks, RETRIEVAL_CONFIG.get("max_context_chars", 4000)) if chunks else None
+    with telemetry.timed(telemetry.template):
+        return render_prompt(chat_template, question, context)
+
+
+def retrieval_settings(request , question_input):
+    """
+    Returns `(index, mode, top_k)` when the question is answered from retrieved chunks, else
+    None. Raises 503 if retrieval was asked for explicitly but no index is loaded.
+    """
+    use_rag = question_input.rag if question_input.rag is not None else RETRIEVAL_CONFIG.get("default", False)
+    if not use_rag:
+        return None
+    index = getattr(request.app.state, "retrieval_index", None)
+    if index is None:
+        if question_input.rag:
+            raise HTTPException(status_code=503, detail="Retrieval index is not loaded; build it with `python -m src.retrieval`")
+        return None
+    return index, RETRIEVAL_CONFIG.get("mode", "bm25"), question_input.top_k or RETRIEVAL_CONFIG.get("top_k", 4)
+
+
+def answer_params(rag , model_id):
+    # Answers of another model version, or grounded in another index (or another mode or
+    # depth), must not share cache entries.
+    if rag is None:
+        return {**GENERATION_PARAMS, "model": model_id}
+    index, mode, top_k = rag
+    return {**GENERATION_PARAMS, "model": model_id, "retrieval": f"{index.version}:{mode}:{top_k}"}
+
+
+def retrieve(request , question , rag):
+    if rag is None:
+        return None
+    index, mode, top_k = rag
+    telemetry = get_telemetry(request)
+    with telemetry.timed(telemetry.retrieval, mode=mode):
+        return index.retrieve(question, top_k, mode)
+
+
+def source_list(chunks):
+    return [{"source": chunk["source"], "chunk_id": chunk["chunk_id"], "score": round(chunk["score"], 4)} for chunk in chunks or []]
+
+
+def restore_prefix(llm_model):
+    prefix_cache = getattr(llm_model, "_prefix_cache", None)
+    if prefix_cache is not None:
+        prefix_cache.restore(llm_model)
+
+
+def generate_answer(llm_model , prompt , cancel , params=GENERATION_PARAMS , telemetry=None):
+    restore_prefix(llm_model)
+    counters = llama_counters(llm_model) if telemetry is not None else None
+    resp = llm_model(
+            prompt=prompt_tokens(llm_model, prompt),
+            **params,
+            echo=False,
+            stopping_criteria=StoppingCriteriaList([cancel_criteria(cancel)])
+        )
+    if telemetry is not None:
+        telemetry.observe_counters(counters, llama_counters(llm_model))
+    return resp['choices'][0]['text'].strip()
 
 
 @model_router.post("/answer")
 async def review(question_input : QuestionInput , request : Request):
-    
+    """
+    Answers a question with `model` (default `api.models.default`). With `rag` (default
+    `api.retrieval.default`), the `top_k` best chunks of the retrieval index are put into the
+    prompt; `include_sources` returns `{"answer", "sources"}` instead of the bare answer.
+    """
 
-    logger.info("Start QAs... ")
+    logger.debug("Start QAs... ")
+    telemetry = get_telemetry(request)
+    started = time.perf_counter()
+    cache_result = None
 
     try:
+        rag = retrieval_settings(request, question_input)
+    except HTTPException as e:
+        telemetry.record_request("answer", e.status_code, started, error=e)
+        raise
 
-        
+    def respond(answer , chunks):
+        if not question_input.include_sources:
+            return answer
+        return {"answer": answer, "sources": source_list(chunks)}
 
-        if hasattr(request.app.state, "llm_model") and request.app.state.llm_model:
-            llm_model = request.app.state.llm_model
-            tokenizer= request.app.state.tokenizer
+    try:
+        models = get_models(request)
+        params = answer_params(rag, models.version(question_input.model))
+        answer_cache = get_answer_cache(request)
+        if answer_cache is not None:
+            answer, layer = answer_cache.get(question_input.question, params)
+            if answer is not None:
+                telemetry.record_request("answer", 200, started, cache=layer, rag=rag is not None, question=question_input.question, answer=answer)
+                return respond(answer, retrieve(request, question_input.question, rag) if question_input.include_sources else None)
+            cache_result = "miss"
 
-        logger.info("building prompt")
-        
-        messages = [
-        {"role": "system", "content": "You are a helpful assistant."},
-        {"role": "user", "content": {question_input.question}}
-        ]
-
-        prompt = tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-
-        logger.info(f"sending to llama ..")
-        resp = llm_model(
-                prompt=prompt,
-                max_tokens=428,
-                stop=["###"],
-                echo=False
-            )
-            
-        answer = resp['choices'][0]['text'].strip()
-        logger.info(f"Answer: {answer}")
-        return answer
+        chunks = retrieve(request, question_input.question, rag)
+        # The lease keeps this version loaded until the answer is done, even if it is swapped out meanwhile.
+        async with models.lease(question_input.model) as loaded:
+            prompt = build_prompt(request, loaded.chat_template, question_input.question, chunks)
+            if loaded.batcher is not None:
+                answer = await loaded.batcher.submit(prompt)
+            else:
+                answer = await loaded.scheduler.run(lambda llm_model, cancel: generate_answer(llm_model, prompt, cancel, telemetry=telemetry))
+        if answer_cache is not None:
+            answer_cache.put(question_input.question, answer, answer_params(rag, loaded.cache_id))
+        telemetry.record_request(
+            "answer", 200, started, cache=cache_result, rag=rag is not None,
+            question=question_input.question, answer=answer, answer_chars=len(answer)
+        )
+        return respond(answer, chunks)
         
         
+    except ModelNotFoundError as e:
+        telemetry.record_request("answer", 404, started, error=e)
+        raise HTTPException(status_code=404, detail=str(e))
+    except QueueFullError as e:
+        logger.warning(f"Rejected question: {e}")
+        telemetry.record_request("answer", 429, started, cache=cache_result, error=e)
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    except SchedulerUnavailableError as e:
+        telemetry.record_request("answer", 503, started, cache=cache_result, error=e)
+        raise HTTPException(status_code=503, detail=str(e))
+    except InferenceTimeoutError as e:
+        logger.warning(f"Question timed out: {e}")
+        telemetry.record_request("answer", 504, started, cache=cache_result, error=e)
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        logger.error(f"Question Answering Faild: {e}")
+        telemetry.record_request("answer", 500, started, cache=cache_result, error=e)
+        raise CustomException("Question Answering Faild", e)
+
+
+def stream_tokens(llm_model , prompt , cancel , loop , tokens , telemetry=None):
+    # Runs in a worker thread; every token is handed to the event loop as soon as it is decoded.
+    restore_prefix(llm_model)
+    counters = llama_counters(llm_model) if telemetry is not None else None
+    for part in llm_model(
+            prompt=prompt_tokens(llm_model, prompt),
+            max_tokens=GENERATION_PARAMS["max_tokens"],
+            stop=GENERATION_PARAMS["stop"],
+            echo=False,
+            stream=True,
+            stopping_criteria=StoppingCriteriaList([cancel_criteria(cancel)])
+        ):
+        if cancel.is_set():
+            break
+        loop.call_soon_threadsafe(tokens.put_nowait, part['choices'][0]['text'])
+    if telemetry is not None:
+        telemetry.observe_counters(counters, llama_counters(llm_model))
+
+
+def sse_event(data , event=None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@model_router.post("/answer/stream")
+async def review_stream(question_input : QuestionInput , request : Request):
+    """
+    Streams the answer token by token as Server-Sent Events: one `data: {"token": ...}` event
+    per token, then an `event: done` (or `event: error`) event. Generation stops as soon as
+    the client disconnects. With retrieval, the `done` event lists the chunks used as `sources`.
+    """
+    logger.debug("Start streaming QAs... ")
+    telemetry = get_telemetry(request)
+    started = time.perf_counter()
+    cache_result = None
+
+    try:
+        rag = retrieval_settings(request, question_input)
+    except HTTPException as e:
+        telemetry.record_request("answer_stream", e.status_code, started, error=e)
+        raise
+
+    try:
+        models = get_models(request)
+        params = answer_params(rag, models.version(question_input.model))
+    except ModelNotFoundError as e:
+        telemetry.record_request("answer_stream", 404, started, error=e)
+        raise HTTPException(status_code=404, detail=str(e))
+    except SchedulerUnavailableError as e:
+        telemetry.record_request("answer_stream", 503, started, error=e)
+        raise HTTPException(status_code=503, detail=str(e))
+
+    def done_event(chunks , **data):
+        if rag is not None:
+            data["sources"] = source_list(chunks)
+        return sse_event(data, event="done")
+
+    answer_cache = get_answer_cache(request)
+    if answer_cache is not None:
+        answer, layer = answer_cache.get(question_input.question, params)
+        if answer is not None:
+            telemetry.record_request("answer_stream", 200, started, cache=layer, rag=rag is not None, question=question_input.question, answer=answer)
 
+            async def cached_events():
+                yield sse_event({"token": answer})
+                yield done_event(retrieve(request, question_input.question, rag), cached=layer)
+
+            return StreamingResponse(cached_events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+        cache_result = "miss"
+
+    loaded = None
+    try:
+        # Released by the event stream once it ends, so a swap waits for this answer to finish.
+        loaded = await models.acquire(question_input.model)
+        loaded.scheduler.check_capacity()
+        chunks = retrieve(request, question_input.question, rag)
+        prompt = build_prompt(request, loaded.chat_template, question_input.question, chunks)
+
+        loop = asyncio.get_running_loop()
+        tokens = asyncio.Queue()
+        cancel = threading.Event()
+        done = object()
+        # The queue place is taken before the response starts, so a full queue is still a 429.
+        loaded.scheduler.reserve()
+        generation = asyncio.create_task(loaded.scheduler.run(
+            lambda llm_model, cancel: stream_tokens(llm_model, prompt, cancel, loop, tokens, telemetry),
+            cancel=cancel,
+            reserved=True
+        ))
+        # Tokens are queued with call_soon_threadsafe, so the marker queued here lands after the last one.
+        generation.add_done_callback(lambda _: loop.call_soon(tokens.put_nowait, done))
+
+    except QueueFullError as e:
+        models.release(loaded)
+        logger.warning(f"Rejected question: {e}")
+        telemetry.record_request("answer_stream", 429, started, cache=cache_result, error=e)
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    except SchedulerUnavailableError as e:
+        if loaded is not None:
+            models.release(loaded)
+        telemetry.record_request("answer_stream", 503, started, cache=cache_result, error=e)
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
-        logger.error(f"Question Answering Faild ")
+        if loaded is not None:
+            models.release(loaded)
+        logger.error(f"Question Answering Faild: {e}")
+        telemetry.record_request("answer_stream", 500, started, cache=cache_result, error=e)
         raise CustomException("Question Answering Faild", e)
+
+    async def events():
+        parts = []
+        # 499 (client closed request) unless the stream reaches its end.
+        status, error = 499, None
+
+        try:
+            while True:
+                try:
+                    token = await asyncio.wait_for(tokens.get(), SSE_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        logger.info("Client disconnected, stopping generation")
+                        return
+                    yield ": keep-alive\n\n"
+                    continue
+
+                if token is done:
+                    break
+                parts.append(token)
+                yield sse_event({"token": token})
+
+            error = generation.exception()
+            if error is None:
+                status = 200
+                # Only complete answers are cached; cancelled ones never get here.
+                if answer_cache is not None:
+                    answer_cache.put(question_input.question, "".join(parts).strip(), answer_params(rag, loaded.cache_id))
+                yield done_event(chunks)
+            else:
+                status = 504 if isinstance(error, InferenceTimeoutError) else 500
+                logger.error(f"Streaming Question Answering Faild: {error}")
+                yield sse_event({"detail": str(error) or type(error).__name__}, event="error")
+
+        finally:
+            # Covers disconnects detected by the server as well, which cancel this generator.
+            cancel.set()
+            if not generation.done():
+                generation.cancel()
+            models.release(loaded)
+            telemetry.record_request(
+                "answer_stream", status, started, cache=cache_result, error=error, rag=rag is not None,
+                question=question_input.question, answer="".join(parts), tokens=len(parts)
+            )
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+def batch_concurrency(scheduler , batcher):
+    # Enough items in flight to keep every instance (and batch slot) busy, without filling the
+    # queue that interactive requests share.
+    slots = scheduler.pool_size * (batcher.max_batch if batcher is not None else 1)
+    limit = BATCH_CONFIG.get("concurrency") or slots
+    return max(1, min(limit, scheduler.pool_size + scheduler.max_queue))
+
+
+async def run_batch_item(scheduler , batcher , prompt , params , telemetry):
+    deadline = time.monotonic() + scheduler.timeout
+    while True:
+        try:
+            if batcher is not None and params == GENERATION_PARAMS:
+                return await batcher.submit(prompt)
+            return await scheduler.run(lambda llm_model, cancel: generate_answer(llm_model, prompt, cancel, params, telemetry))
+        except QueueFullError:
+            # Other traffic filled the queue; batch items wait for room, up to the request timeout.
+            if not await scheduler.wait_for_capacity(deadline):
+                raise
+
+
+def batch_error_status(error):
+    if isinstance(error, QueueFullError):
+        return 429
+    if isinstance(error, SchedulerUnavailableError):
+        return 503
+    if isinstance(error, InferenceTimeoutError):
+        return 504
+    return 500
+
+
+async def answer_batch(request , loaded , items):
+    """
+    Yields one result per item, in completion order, answered by the `loaded` model. Items with
+    the same normalized question and generation parameters are generated once; cache hits are
+    yielded first, and the rest are run shortest prompt first so short answers are not held up
+    behind long ones.
+    """
+    answer_cache = get_answer_cache(request)
+    telemetry = get_telemetry(request)
+    scheduler, batcher = loaded.scheduler, loaded.batcher
+
+    groups = {}
+    for index, item in enumerate(items):
+        params = item.generation_params()
+        key = (normalize_question(item.question), AnswerCache.params_key(params))
+        group = groups.setdefault(key, {"question": item.question, "params": params, "cache_params": {**params, "model": loaded.cache_id}, "indexes": []})
+        group["indexes"].append(index)
+
+    def results(group , answer=None , cached=None , error=None):
+        for index in group["indexes"]:
+            result = {"index": index, "id": items[index].id}
+            if error is None:
+                result.update(answer=answer, cached=cached)
+            else:
+                result.update(error=str(error) or type(error).__name__, status=batch_error_status(error))
+            yield result
+
+    pending = []
+    for group in groups.values():
+        if answer_cache is not None:
+            answer, layer = answer_cache.get(group["question"], group["cache_params"])
+            telemetry.cache_lookups.inc(result=layer or "miss")
+            if answer is not None:
+                for result in results(group, answer, layer):
+                    yield result
+                continue
+        group["prompt"] = build_prompt(request, loaded.chat_template, group["question"])
+        pending.append(group)
+
+    logger.debug(f"Batch of {len(items)} questions: {len(groups)} unique, {len(pending)} to generate")
+    pending.sort(key=lambda group: len(group["prompt"]))
+    todo = iter(pending)
+    completed = asyncio.Queue()
+
+    rejected = []
+
+    async def worker():
+        for group in todo:
+            # Once an item waited out the timeout for queue space, the rest would too; fail them now.
+            if rejected:
+                completed.put_nowait((group, None, rejected[0]))
+                continue
+            try:
+                answer = await run_batch_item(scheduler, batcher, group["prompt"], group["params"], telemetry)
+            except Exception as e:
+                logger.warning(f"Batch item failed: {e}")
+                if isinstance(e, QueueFullError):
+                    rejected.append(e)
+                completed.put_nowait((group, None, e))
+                continue
+            if answer_cache is not None:
+                answer_cache.put(group["question"], answer, group["cache_params"])
+            completed.put_nowait((group, answer, None))
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(batch_concurrency(scheduler, batcher), len(pending)))]
+    try:
+        for _ in range(len(pending)):
+            group, answer, error = await completed.get()
+            for result in results(group, answer, error=error):
+                yield result
+    finally:
+        # Also runs when a streaming client disconnects, which cancels the remaining generations.
+        for task in workers:
+            task.cancel()
+
+
+@model_router.post("/answer/batch")
+async def review_batch(batch_input : BatchInput , request : Request):
+    """
+    Answers a list of questions in one request, each with optional generation parameters
+    (`max_tokens`, `temperature`, `top_p`, `top_k`, `stop`), all with the same `model`. With `stream` set, results are
+    sent as NDJSON lines as they complete, followed by a `{"summary": ...}` line; otherwise
+    all results are returned at once in item order. A failed item gets an `error` and a
+    `status` (429 when the queue stayed full) instead of an `answer` and does not fail the batch.
+    """
+    max_items = BATCH_CONFIG.get("max_items", 1000)
+    if len(batch_input.items) > max_items:
+        raise HTTPException(status_code=413, detail=f"At most {max_items} items per batch, got {len(batch_input.items)}")
+
+    telemetry = get_telemetry(request)
+    started = time.perf_counter()
+    try:
+        models = get_models(request)
+        loaded = await models.acquire(batch_input.model)
+    except ModelNotFoundError as e:
+        telemetry.record_request("answer_batch", 404, started, error=e)
+        raise HTTPException(status_code=404, detail=str(e))
+    except SchedulerUnavailableError as e:
+        telemetry.record_request("answer_batch", 503, started, error=e)
+        raise HTTPException(status_code=503, detail=str(e))
+
+    logger.debug(f"Start batch QAs ({len(batch_input.items)} questions)... ")
+
+    def summary(results):
+        return {
+            "items": len(batch_input.items),
+            "errors": sum(1 for result in results if "error" in result),
+            "cached": sum(1 for result in results if result.get("cached")),
+            "seconds": round(time.perf_counter() - started, 3)
+        }
+
+    if batch_input.stream:
+        async def lines():
+            results = []
+            try:
+                async for result in answer_batch(request, loaded, batch_input.items):
+                    results.append({key: result[key] for key in ("error", "cached") if key in result})
+                    yield json.dumps(result, ensure_ascii=False) + "\n"
+                yield json.dumps({"summary": summary(results)}) + "\n"
+            finally:
+                models.release(loaded)
+                telemetry.record_request("answer_batch", 200 if len(results) == len(batch_input.items) else 499, started, **summary(results))
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    try:
+        results = [result async for result in answer_batch(request, loaded, batch_input.items)]
+    except Exception as e:
+        logger.error(f"Batch Question Answering Faild: {e}")
+        telemetry.record_request("answer_batch", 500, started, error=e)
+        raise CustomException("Batch Question Answering Faild", e)
+    finally:
+        models.release(loaded)
+
+    results.sort(key=lambda result: result["index"])
+    telemetry.record_request("answer_batch", 200, started, **summary(results))
+    return {"results": results, "summary": summary(results)}
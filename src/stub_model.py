@@ -0,0 +1,65 @@
+import time
+import zlib
+
+import numpy as np
+
+from src.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+VOCABULARY = (
+    "charging station level connector vehicle battery power kilowatt cable socket network "
+    "tariff range home public fast slow energy grid plug adapter session minutes hours"
+).split()
+
+
+class StubLlama:
+    """
+    Deterministic stand-in for `llama_cpp.Llama` for benchmarks and CI machines without a model
+    download. The answer depends only on the prompt, and time is spent like a real CPU model:
+    `prompt_ms_per_token` for every prompt token, then `ms_per_token` for every generated one
+    (sleeping, which releases the GIL as llama.cpp does). Supports the call signature used by
+    the API: `max_tokens`, `stop`, `stream` and `stopping_criteria`.
+    """
+
+    def __init__(self , answer_tokens=64 , ms_per_token=20.0 , prompt_ms_per_token=0.5 , **_):
+        self.answer_tokens = answer_tokens
+        self.ms_per_token = ms_per_token
+        self.prompt_ms_per_token = prompt_ms_per_token
+        self.counters = {"prompt_tokens": 0, "prompt_seconds": 0.0, "decode_tokens": 0, "decode_seconds": 0.0}
+
+    def perf_counters(self):
+        return dict(self.counters)
+
+    def tokenize(self , text , add_bos=True , special=False):
+        return [zlib.crc32(word) for word in text.split()]
+
+    def token_bos(self):
+        return 0
+
+    def completion_tokens(self , prompt , max_tokens):
+        rng = np.random.default_rng(zlib.crc32(np.asarray(prompt, dtype=np.uint32).tobytes()))
+        count = min(self.answer_tokens, max_tokens or self.answer_tokens)
+        return [VOCABULARY[i] for i in rng.integers(len(VOCABULARY), size=count)]
+
+    def stream(self , prompt , max_tokens , stopping_criteria):
+        # The API passes prompts as token lists (see src/prompt_cache.prompt_tokens).
+        prompt = self.tokenize(prompt.encode("utf-8")) if isinstance(prompt, str) else prompt
+        prompt_tokens = len(prompt)
+        time.sleep(prompt_tokens * self.prompt_ms_per_token / 1000.0)
+        self.counters["prompt_tokens"] += prompt_tokens
+        self.counters["prompt_seconds"] += prompt_tokens * self.prompt_ms_per_token / 1000.0
+
+        for i, word in enumerate(self.completion_tokens(prompt, max_tokens)):
+            if stopping_criteria and any(criterion(None, None) for criterion in stopping_criteria):
+                return
+            time.sleep(self.ms_per_token / 1000.0)
+            self.counters["decode_tokens"] += 1
+            self.counters["decode_seconds"] += self.ms_per_token / 1000.0
+            yield word if i == 0 else f" {word}"
+
+    def __call__(self , prompt , max_tokens=16 , stop=None , echo=False , stream=False , stopping_criteria=None , **_):
+        parts = self.stream(prompt, max_tokens, stopping_criteria)
+        if stream:
+            return ({"choices": [{"text": part}]} for part in parts)
+        return {"choices": [{"text": "".join(parts)}]}
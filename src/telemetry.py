@@ -0,0 +1,178 @@
+import time
+import bisect
+import random
+import threading
+from contextlib import contextmanager
+
+from src.utils.logging import get_request_logger
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (1, 4, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+
+
+def label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class Counter:
+    def __init__(self , name , help):
+        self.name = name
+        self.help = help
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def inc(self , amount=1 , **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            lines += [f"{self.name}{label_text(key)} {value}" for key, value in sorted(self.series.items())]
+        return lines
+
+
+class Histogram:
+    def __init__(self , name , help , buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self , value , **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            series["counts"][bisect.bisect_left(self.buckets, value)] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, series in sorted(self.series.items()):
+                cumulative = 0
+                for bound, count in zip(list(self.buckets) + ["+Inf"], series["counts"]):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{label_text(key + (('le', bound),))} {cumulative}")
+                lines.append(f"{self.name}_sum{label_text(key)} {series['sum']}")
+                lines.append(f"{self.name}_count{label_text(key)} {series['count']}")
+        return lines
+
+
+def llama_counters(llm):
+    """Cumulative prompt-eval/decode token counts and seconds of a model instance."""
+    if hasattr(llm, "perf_counters"):
+        return llm.perf_counters()
+
+    import llama_cpp
+
+    data = llama_cpp.llama_perf_context(llm.ctx)
+    return {
+        "prompt_tokens": data.n_p_eval,
+        "prompt_seconds": data.t_p_eval_ms / 1000.0,
+        "decode_tokens": data.n_eval,
+        "decode_seconds": data.t_eval_ms / 1000.0
+    }
+
+
+class Telemetry:
+    """
+    In-process metrics for the serving hot path, rendered in the Prometheus text format.
+
+    Histograms cover queue wait, prompt templating, chunk retrieval, prompt evaluation and decoding (tokens
+    and seconds) and end-to-end latency per endpoint; counters cover requests, answer cache
+    lookups ('exact', 'semantic' or 'miss') and errors. An observation is a lock and a few
+    additions, cheap enough for every request. `gauges` are callables evaluated at scrape time
+    that return `{name: value}`.
+
+    Request logs are structured and sampled: one JSON line for `log_sample_rate` of the
+    requests (always for errors), written by a background thread; answer bodies are left out
+    unless `log_bodies` is set.
+    """
+
+    def __init__(self , log_sample_rate=0.1 , log_bodies=False):
+        self.log_sample_rate = log_sample_rate
+        self.log_bodies = log_bodies
+        self.request_logger = get_request_logger()
+        self.gauges = []
+
+        self.requests = Counter("qa_requests_total", "Requests by endpoint and status.")
+        self.cache_lookups = Counter("qa_answer_cache_lookups_total", "Answer cache lookups by result (exact, semantic or miss).")
+        self.errors = Counter("qa_errors_total", "Failed requests by endpoint and error type.")
+        self.queue_wait = Histogram("qa_queue_wait_seconds", "Time waiting for a free model instance.")
+        self.template = Histogram("qa_prompt_template_seconds", "Time spent rendering the chat template.")
+        self.retrieval = Histogram("qa_retrieval_seconds", "Chunk retrieval time by mode.")
+        self.prompt_tokens = Histogram("qa_prompt_eval_tokens", "Prompt tokens evaluated per generation.", TOKEN_BUCKETS)
+        self.prompt_seconds = Histogram("qa_prompt_eval_seconds", "Prompt evaluation time per generation.")
+        self.decode_tokens = Histogram("qa_decode_tokens", "Tokens decoded per generation.", TOKEN_BUCKETS)
+        self.decode_seconds = Histogram("qa_decode_seconds", "Decoding time per generation.")
+        self.latency = Histogram("qa_request_latency_seconds", "End-to-end request latency by endpoint.")
+        self.metrics = [
+            self.requests, self.cache_lookups, self.errors, self.queue_wait, self.template, self.retrieval,
+            self.prompt_tokens, self.prompt_seconds, self.decode_tokens, self.decode_seconds, self.latency
+        ]
+
+    @classmethod
+    def from_config(cls , telemetry_config):
+        return cls(
+            log_sample_rate=telemetry_config.get("log_sample_rate", 0.1),
+            log_bodies=telemetry_config.get("log_bodies", False)
+        )
+
+    @contextmanager
+    def timed(self , histogram , **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            histogram.observe(time.perf_counter() - started, **labels)
+
+    def observe_generation(self , prompt_tokens , prompt_seconds , decode_tokens , decode_seconds , mode="single"):
+        self.prompt_tokens.observe(prompt_tokens, mode=mode)
+        self.prompt_seconds.observe(prompt_seconds, mode=mode)
+        self.decode_tokens.observe(decode_tokens, mode=mode)
+        self.decode_seconds.observe(decode_seconds, mode=mode)
+
+    def observe_counters(self , before , after):
+        """Records one generation from two `llama_counters` readings taken around it."""
+        self.observe_generation(*(
+            max(after[key] - before[key], 0)
+            for key in ("prompt_tokens", "prompt_seconds", "decode_tokens", "decode_seconds")
+        ))
+
+    def record_request(self , endpoint , status , started , cache=None , error=None , **fields):
+        latency = time.perf_counter() - started
+        self.requests.inc(endpoint=endpoint, status=status)
+        self.latency.observe(latency, endpoint=endpoint)
+        if cache is not None:
+            self.cache_lookups.inc(result=cache)
+        if error is not None:
+            self.errors.inc(endpoint=endpoint, error=type(error).__name__)
+
+        if error is not None or random.random() < self.log_sample_rate:
+            if not self.log_bodies:
+                fields = {key: value for key, value in fields.items() if key not in ("answer", "question")}
+            self.request_logger.info({
+                "endpoint": endpoint,
+                "status": status,
+                "latency_s": round(latency, 4),
+                "cache": cache,
+                "error": str(error) if error is not None else None,
+                **fields
+            })
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render()
+        for gauge in self.gauges:
+            for name, value in gauge().items():
+                lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,343 @@
+import os
+import json
+import time
+import shutil
+import argparse
+from itertools import islice
+
+import numpy as np
+
+from config.path_config import *
+from src.chat_template import SYSTEM_PROMPT, Llama3ChatTemplate
+from src.answer_cache import model_fingerprint
+from src.evaluation import in_holdout
+from src.utils.cmn_func import read_yaml
+from src.utils.jsonl_store import iter_jsonl
+from src.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+IGNORE_INDEX = -100
+
+
+class TrainingTokenizer:
+    """
+    Token ids of rendered chat text, from the Hugging Face tokenizer of `name` ('hf') or from
+    the vocabulary of a GGUF file ('gguf', loaded with `vocab_only`, so no weights are read).
+    The rendered text already holds every special token, so none are added.
+    """
+
+    def __init__(self , kind="hf" , name=None , model_path=MODEL_GUFF_PATH):
+        self.kind = kind
+        self.name = name if kind == "hf" else model_path
+        if kind == "hf":
+            from transformers import AutoTokenizer
+
+            logger.info(f"Loading tokenizer {name}")
+            self.tokenizer = AutoTokenizer.from_pretrained(name, use_fast=True)
+            self.eos_id = self.tokenizer.eos_token_id
+        elif kind == "gguf":
+            from llama_cpp import Llama
+
+            self.tokenizer = Llama(model_path=model_path, vocab_only=True, verbose=False)
+            self.eos_id = self.tokenizer.token_eos()
+        else:
+            raise ValueError(f"Unknown tokenizer: {kind}")
+
+    def __call__(self , texts):
+        if self.kind == "hf":
+            return self.tokenizer(texts, add_special_tokens=False)["input_ids"]
+        return [self.tokenizer.tokenize(text.encode("utf-8"), add_bos=False, special=True) for text in texts]
+
+
+class PackedDatasetBuilder:
+    """
+    Turns the QA examples of `training_chunks.jsonl` into fixed-length training sequences.
+
+    Every example is rendered with the Llama 3.2 chat template and tokenized once, in batches,
+    as two parts: the prompt (system and user turns plus the assistant header) and the answer.
+    Examples are then packed into rows of `max_length` tokens by best fit over `open_bins`
+    partly filled rows, without ever splitting an example, so a row is almost all real tokens
+    instead of one short example followed by padding.
+
+    Each row stores its token ids, position ids that restart at 0 for every example (packed
+    attention in flash-attention/varlen kernels keeps examples apart by them), and a loss mask
+    that is 0 on padding, on the first token of each example (so nothing is learned across an
+    example boundary) and, with `completion_only`, on prompt tokens. The three matrices are
+    raw binary files memory-mapped by `PackedDataset`; `examples.npy` indexes the row, offset
+    and length of every example.
+
+    With `holdout_percent`, the questions `evaluation.holdout_percent` selects for a held-out
+    evaluation of the training file are left out, so the model is never trained on them.
+    """
+
+    def __init__(self , tokenizer , max_length=1024 , completion_only=True , open_bins=64 , batch_size=256 , chat_template=None , holdout_percent=None):
+        self.tokenizer = tokenizer
+        self.max_length = max_length
+        self.completion_only = completion_only
+        self.open_bins = open_bins
+        self.batch_size = batch_size
+        self.chat_template = chat_template or Llama3ChatTemplate()
+        self.holdout_percent = holdout_percent
+        self.pad_id = tokenizer.eos_id
+
+    @classmethod
+    def from_config(cls , training_config , holdout_percent=None):
+        dataset_config = training_config.get("dataset", {})
+        tokenizer = TrainingTokenizer(dataset_config.get("tokenizer", "hf"), training_config["model_name"])
+        return cls(
+            tokenizer,
+            max_length=dataset_config.get("max_length", 1024),
+            completion_only=dataset_config.get("completion_only", True),
+            open_bins=dataset_config.get("open_bins", 64),
+            batch_size=dataset_config.get("tokenizer_batch_size", 256),
+            chat_template=Llama3ChatTemplate(dataset_config.get("date_string")),
+            holdout_percent=holdout_percent
+        )
+
+    def settings(self):
+        return {
+            "tokenizer": f"{self.tokenizer.kind}:{self.tokenizer.name}",
+            "max_length": self.max_length,
+            "completion_only": self.completion_only,
+            "open_bins": self.open_bins,
+            "system_prompt": SYSTEM_PROMPT,
+            "date_string": self.chat_template.date_string,
+            "holdout_percent": self.holdout_percent
+        }
+
+    def render(self , record):
+        example = record["alpaca_format"]
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": example["instruction"]}
+        ]
+        prompt = self.chat_template(messages, add_generation_prompt=True)
+        # The template ends an assistant turn with the content and <|eot_id|>.
+        return prompt, example["output"].strip() + "<|eot_id|>"
+
+    def is_training_example(self , record):
+        example = record.get("alpaca_format")
+        if not example:
+            return False
+        return self.holdout_percent is None or not in_holdout(example["instruction"], self.holdout_percent)
+
+    def tokenized(self , records):
+        """Yields `(prompt_ids, answer_ids)` per example, tokenizing `batch_size` examples per call."""
+        records = (record for record in records if self.is_training_example(record))
+        while True:
+            batch = list(islice(records, self.batch_size))
+            if not batch:
+                return
+            prompts, answers = zip(*(self.render(record) for record in batch))
+            yield from zip(self.tokenizer(list(prompts)), self.tokenizer(list(answers)))
+
+    def pack(self , examples , stats):
+        """Yields rows as lists of `(prompt_ids, answer_ids)` whose total length fits `max_length`."""
+        bins = []  # [used, examples]
+        for prompt_ids, answer_ids in examples:
+            length = len(prompt_ids) + len(answer_ids)
+            if length > self.max_length:
+                # Keep the question whole and cut the answer; a prompt alone over the limit is dropped.
+                if len(prompt_ids) >= self.max_length:
+                    stats["dropped"] += 1
+                    continue
+                answer_ids = answer_ids[:self.max_length - len(prompt_ids)]
+                length = self.max_length
+                stats["truncated"] += 1
+
+            best = None
+            for candidate in bins:
+                room = self.max_length - candidate[0]
+                if room >= length and (best is None or room < self.max_length - best[0]):
+                    best = candidate
+            if best is None:
+                if len(bins) >= self.open_bins:
+                    fullest = max(bins, key=lambda candidate: candidate[0])
+                    bins.remove(fullest)
+                    yield fullest[1]
+                best = [0, []]
+                bins.append(best)
+            best[0] += length
+            best[1].append((prompt_ids, answer_ids))
+
+        for _, row in sorted(bins, key=lambda candidate: -candidate[0]):
+            yield row
+
+    def build(self , records , directory=TRAINING_DATASET_DIR , source=None):
+        started = time.perf_counter()
+        staging = f"{directory}.tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+
+        stats = {"examples": 0, "tokens": 0, "truncated": 0, "dropped": 0}
+        examples = []
+        input_ids = np.empty(self.max_length, dtype=np.int32)
+        position_ids = np.empty(self.max_length, dtype=np.int32)
+        loss_mask = np.empty(self.max_length, dtype=np.uint8)
+        rows = 0
+
+        with open(os.path.join(staging, "input_ids.bin"), "wb") as ids_file, \
+                open(os.path.join(staging, "position_ids.bin"), "wb") as positions_file, \
+                open(os.path.join(staging, "loss_mask.bin"), "wb") as mask_file:
+            for row in self.pack(self.tokenized(records), stats):
+                input_ids.fill(self.pad_id)
+                loss_mask.fill(0)
+                offset = 0
+                for prompt_ids, answer_ids in row:
+                    length = len(prompt_ids) + len(answer_ids)
+                    end = offset + length
+                    input_ids[offset:offset + len(prompt_ids)] = prompt_ids
+                    input_ids[offset + len(prompt_ids):end] = answer_ids
+                    position_ids[offset:end] = np.arange(length)
+                    loss_mask[offset + (len(prompt_ids) if self.completion_only else 1):end] = 1
+                    examples.append((rows, offset, length))
+                    offset = end
+                    stats["examples"] += 1
+                # Padding gets positions of its own, like one more (fully masked) example.
+                position_ids[offset:] = np.arange(self.max_length - offset)
+                stats["tokens"] += offset
+
+                ids_file.write(input_ids.tobytes())
+                positions_file.write(position_ids.tobytes())
+                mask_file.write(loss_mask.tobytes())
+                rows += 1
+
+        np.save(os.path.join(staging, "examples.npy"), np.asarray(examples, dtype=np.int64).reshape(-1, 3))
+        capacity = rows * self.max_length
+        meta = {
+            **self.settings(),
+            "rows": rows,
+            "pad_id": self.pad_id,
+            "fill": stats["tokens"] / capacity if capacity else 0.0,
+            # Rows a pad-to-max_length dataset would need for the same examples.
+            "unpacked_rows": stats["examples"],
+            **stats,
+            "source": source,
+            "built_at": time.strftime('%Y-%m-%d %H:%M:%S')
+        }
+        with open(os.path.join(staging, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.replace(staging, directory)
+        logger.info(
+            f"Packed {stats['examples']} examples into {rows} rows of {self.max_length} tokens "
+            f"({meta['fill']:.1%} filled, {stats['truncated']} truncated, {stats['dropped']} dropped) "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+        return PackedDataset(directory)
+
+    def build_if_changed(self , source=PROCESSED_DIR_TRAINING , directory=TRAINING_DATASET_DIR , force=False):
+        """Rebuilds only when the source file (size and mtime) or the build settings changed."""
+        fingerprint = model_fingerprint(source)
+        meta_path = os.path.join(directory, "meta.json")
+        if not force and os.path.exists(meta_path):
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("source") == fingerprint and all(meta.get(key) == value for key, value in self.settings().items()):
+                logger.info(f"Training dataset in {directory} is up to date")
+                return PackedDataset(directory)
+        return self.build(iter_jsonl(source), directory, fingerprint)
+
+
+def segment_ids(position_ids):
+    """Numbers the examples of packed rows: a new segment starts wherever the position resets to 0."""
+    return np.cumsum(position_ids == 0, axis=-1)
+
+
+def block_causal_mask(position_ids):
+    """
+    Boolean `(..., L, L)` attention mask for kernels without packed-sequence support: causal,
+    and only within the same example.
+    """
+    segments = segment_ids(position_ids)
+    length = position_ids.shape[-1]
+    causal = np.tril(np.ones((length, length), dtype=bool))
+    return causal & (segments[..., :, None] == segments[..., None, :])
+
+
+class PackedDataset:
+    """
+    Reads a dataset written by `PackedDatasetBuilder`. The matrices are memory-mapped
+    copy-on-write, so rows and contiguous batches are views of the page cache: nothing is
+    read until used, nothing is copied, and `torch.from_numpy` can wrap them directly.
+    """
+
+    def __init__(self , directory=TRAINING_DATASET_DIR):
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.directory = directory
+        self.max_length = self.meta["max_length"]
+        shape = (self.meta["rows"], self.max_length)
+        self.input_ids = self.matrix("input_ids.bin", np.int32, shape)
+        self.position_ids = self.matrix("position_ids.bin", np.int32, shape)
+        self.loss_mask = self.matrix("loss_mask.bin", np.uint8, shape)
+        self.examples = np.load(os.path.join(directory, "examples.npy"), mmap_mode="r")
+
+    def matrix(self , name , dtype , shape):
+        if not shape[0]:
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(os.path.join(self.directory, name), dtype=dtype, mode="c", shape=shape)
+
+    def __len__(self):
+        return self.meta["rows"]
+
+    def __getitem__(self , index):
+        return {
+            "input_ids": self.input_ids[index],
+            "position_ids": self.position_ids[index],
+            "loss_mask": self.loss_mask[index]
+        }
+
+    def example(self , index):
+        """Token ids of one example, e.g. to inspect it or decode it."""
+        row, offset, length = self.examples[index]
+        return self.input_ids[row, offset:offset + length]
+
+    def batches(self , batch_size , shuffle=False , seed=0 , drop_last=False):
+        """
+        Yields batches of `batch_size` consecutive rows as slice views. With `shuffle`, the
+        order of the batches changes every epoch (`seed`) while each batch stays contiguous,
+        which keeps reads sequential and copy-free.
+        """
+        starts = np.arange(0, len(self), batch_size)
+        if drop_last and len(self) % batch_size:
+            starts = starts[:-1]
+        if shuffle:
+            starts = np.random.default_rng(seed).permutation(starts)
+        for start in starts.tolist():
+            yield self[start:start + batch_size]
+
+    def torch_batches(self , batch_size , shuffle=False , seed=0 , drop_last=False , attention_mask=False):
+        """
+        `batches` as torch tensors for a causal LM: `input_ids` and `position_ids` share memory
+        with the mapped files, and `labels` are the input ids with `IGNORE_INDEX` where the loss
+        mask is 0. With `attention_mask`, a block-causal 4D mask is added for attention
+        implementations that ignore `position_ids` resets (SDPA, eager).
+        """
+        import torch
+
+        for batch in self.batches(batch_size, shuffle, seed, drop_last):
+            input_ids = torch.from_numpy(batch["input_ids"])
+            tensors = {
+                "input_ids": input_ids,
+                "position_ids": torch.from_numpy(batch["position_ids"]),
+                "labels": input_ids.long().masked_fill(torch.from_numpy(batch["loss_mask"]) == 0, IGNORE_INDEX)
+            }
+            if attention_mask:
+                tensors["attention_mask"] = torch.from_numpy(block_causal_mask(batch["position_ids"]))[:, None]
+            yield tensors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the packed, pre-tokenized training dataset.")
+    parser.add_argument("--source", default=PROCESSED_DIR_TRAINING)
+    parser.add_argument("--output", default=TRAINING_DATASET_DIR)
+    parser.add_argument("--force", action="store_true", help="rebuild even if the source and settings are unchanged")
+    args = parser.parse_args()
+
+    config = read_yaml(CONFIG_PATH)
+    builder = PackedDatasetBuilder.from_config(config["training"], config.get("evaluation", {}).get("holdout_percent"))
+    builder.build_if_changed(args.source, args.output, args.force)
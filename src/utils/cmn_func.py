@@ -1,9 +1,7 @@
 import os
-import pandas as pd
 from .logging import get_logger
 from .exception import CustomException
 import yaml
-from llama_cpp import Llama
 
 logger = get_logger(__name__)
 
@@ -22,10 +20,22 @@ def read_yaml(file_path):
         raise CustomException("Failed to read YAML file" , e)
 
 
-def load_model(model_path):
+def load_model(model_path , use_mmap=True , use_mlock=False , n_threads=None , n_ctx=None):
+    """
+    Loads a GGUF model with llama-cpp. With `use_mmap` the weights are mapped instead of read,
+    so loading is near-instant and instances in the same process share one copy of them;
+    `use_mlock` pins the mapped weights in RAM so they are never paged out.
+    """
     try:
+        from llama_cpp import Llama
+
         logger.info("Loading the model with llama-cpp")
-        return Llama(model_path=model_path)
+        options = {"use_mmap": use_mmap, "use_mlock": use_mlock, "verbose": False}
+        if n_threads:
+            options["n_threads"] = n_threads
+        if n_ctx:
+            options["n_ctx"] = n_ctx
+        return Llama(model_path=model_path, **options)
         
     except Exception as e :
         logger.error("Error while loading the model")
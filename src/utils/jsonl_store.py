@@ -0,0 +1,88 @@
+import os
+import json
+from pathlib import Path
+
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class JsonlShardWriter:
+    """
+    Appends records to numbered JSONL shards (`<prefix>-00000.jsonl`, ...) in `directory`,
+    starting a new shard every `shard_size` records. Every record is flushed as it is written,
+    so a reader can consume the shards while the writer is still running.
+    """
+
+    def __init__(self , directory , prefix , shard_size=1000 , reset=True):
+        self.directory = Path(directory)
+        self.prefix = prefix
+        self.shard_size = shard_size
+        self.count = 0
+        self._file = None
+        self._shard_index = 0
+        self._shard_count = 0
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if reset:
+            for old_shard in self.directory.glob(f"{prefix}-*.jsonl"):
+                old_shard.unlink()
+        else:
+            self._shard_index = len(list(self.directory.glob(f"{prefix}-*.jsonl")))
+
+    def shard_path(self , index):
+        return self.directory / f"{self.prefix}-{index:05d}.jsonl"
+
+    def write(self , record):
+        if self._file is None or self._shard_count >= self.shard_size:
+            self._rotate()
+
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self._shard_count += 1
+        self.count += 1
+
+    def _rotate(self):
+        if self._file is not None:
+            self._file.close()
+            self._shard_index += 1
+        self._file = open(self.shard_path(self._shard_index), "a", encoding="utf-8")
+        self._shard_count = 0
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self , exc_type , exc , tb):
+        self.close()
+
+
+def jsonl_files(path):
+    path = Path(path)
+    if path.is_dir():
+        return sorted(path.glob("*.jsonl"))
+    return [path] if path.exists() else []
+
+
+def iter_jsonl(path):
+    """
+    Streams records from a JSONL file or a directory of JSONL shards, one line at a time.
+    A truncated last line, left behind by an interrupted writer, is skipped.
+    """
+    for file_path in jsonl_files(path):
+        with open(file_path, "r", encoding="utf-8") as f:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping unreadable line {line_number} in {file_path}")
+
+
+def has_jsonl(path):
+    return any(os.path.getsize(file_path) for file_path in jsonl_files(path))
@@ -1,5 +1,9 @@
 import logging
+import logging.handlers
 import os
+import json
+import queue
+import atexit
 from datetime import datetime
 
 
@@ -18,4 +22,38 @@ logging.basicConfig(
 def get_logger(name):
     logger = logging.getLogger(name)
     logger.setLevel(logging.INFO)
-    return logger
\ No newline at end of file
+    return logger
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self , record):
+        data = record.msg if isinstance(record.msg, dict) else {"message": record.getMessage()}
+        return json.dumps({"time": self.formatTime(record), **data}, ensure_ascii=False, default=str)
+
+
+_request_listener = None
+
+
+def get_request_logger():
+    """
+    Logger for structured per-request records (one JSON object per line in `requests_<date>.jsonl`).
+    Records are handed to a queue and written by a background thread, so logging never blocks
+    a request on file I/O.
+    """
+    global _request_listener
+    logger = logging.getLogger("requests")
+    if _request_listener is None:
+        handler = logging.FileHandler(os.path.join(LOGS_DIR, f"requests_{datetime.now().strftime('%Y-%m-%d')}.jsonl"))
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        records = queue.SimpleQueue()
+        _request_listener = logging.handlers.QueueListener(records, handler)
+        _request_listener.start()
+        atexit.register(_request_listener.stop)
+
+        # Records are serialized when queued; the listener thread only writes the lines.
+        queue_handler = logging.handlers.QueueHandler(records)
+        queue_handler.setFormatter(JsonFormatter())
+        logger.addHandler(queue_handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
@@ -0,0 +1,13 @@
+import pytest
+
+from gguf_fixtures import write_tiny_llama
+
+
+@pytest.fixture(scope="session")
+def tiny_vocab(tmp_path_factory):
+    return write_tiny_llama(tmp_path_factory.mktemp("gguf") / "vocab.gguf", vocab_only=True)
+
+
+@pytest.fixture(scope="session")
+def tiny_model(tmp_path_factory):
+    return write_tiny_llama(tmp_path_factory.mktemp("gguf") / "tiny.gguf")
@@ -0,0 +1,92 @@
+"""
+Writes tiny Llama 3 style GGUF files for tests: a byte-level BPE vocabulary with the Llama 3
+special tokens and, unless `vocab_only`, one transformer block of small random F32 weights.
+The model answers nonsense, but llama.cpp tokenizes, evaluates and saves state with it like
+with the real one.
+"""
+import struct
+
+import numpy as np
+
+SPECIAL_TOKENS = ["<|begin_of_text|>", "<|end_of_text|>", "<|start_header_id|>", "<|end_header_id|>", "<|eot_id|>"]
+EMBEDDING = 64
+FEED_FORWARD = 128
+
+# GGUF metadata value types.
+UINT32, INT32, FLOAT32, BOOL, STRING, ARRAY = 4, 5, 6, 7, 8, 9
+
+
+def gguf_string(value):
+    data = value.encode("utf-8")
+    return struct.pack("<Q", len(data)) + data
+
+
+def byte_tokens():
+    """The 256 byte-level tokens of the GPT-2 BPE alphabet, in byte order."""
+    printable = list(range(ord("!"), ord("~") + 1)) + list(range(ord("¡"), ord("¬") + 1)) + list(range(ord("®"), ord("ÿ") + 1))
+    codes, extra = printable[:], 0
+    for byte in range(256):
+        if byte not in printable:
+            printable.append(byte)
+            codes.append(256 + extra)
+            extra += 1
+    return [chr(code) for _, code in sorted(zip(printable, codes))]
+
+
+def write_tiny_llama(path , vocab_only=False , seed=0):
+    tokens = byte_tokens() + ["Ġt"] + SPECIAL_TOKENS
+    token_types = [1] * (len(tokens) - len(SPECIAL_TOKENS)) + [3] * len(SPECIAL_TOKENS)
+
+    metadata = []
+
+    def add(key , value_type , payload):
+        metadata.append(gguf_string(key) + struct.pack("<I", value_type) + payload)
+
+    def add_array(key , item_type , items):
+        add(key, ARRAY, struct.pack("<IQ", item_type, len(items)) + b"".join(items))
+
+    add("general.architecture", STRING, gguf_string("llama"))
+    for key, value in [("context_length", 2048), ("embedding_length", EMBEDDING), ("block_count", 1),
+                       ("feed_forward_length", FEED_FORWARD), ("attention.head_count", 4),
+                       ("attention.head_count_kv", 4), ("rope.dimension_count", 16), ("vocab_size", len(tokens))]:
+        add(f"llama.{key}", UINT32, struct.pack("<I", value))
+    add("llama.attention.layer_norm_rms_epsilon", FLOAT32, struct.pack("<f", 1e-5))
+    add("tokenizer.ggml.model", STRING, gguf_string("gpt2"))
+    add("tokenizer.ggml.pre", STRING, gguf_string("llama-bpe"))
+    add_array("tokenizer.ggml.tokens", STRING, [gguf_string(token) for token in tokens])
+    add_array("tokenizer.ggml.token_type", INT32, [struct.pack("<i", t) for t in token_types])
+    add_array("tokenizer.ggml.merges", STRING, [gguf_string("Ġ t")])
+    add("tokenizer.ggml.bos_token_id", UINT32, struct.pack("<I", tokens.index("<|begin_of_text|>")))
+    add("tokenizer.ggml.eos_token_id", UINT32, struct.pack("<I", tokens.index("<|eot_id|>")))
+    add("tokenizer.ggml.add_bos_token", BOOL, b"\1")
+
+    shapes = {} if vocab_only else {
+        "token_embd.weight": (EMBEDDING, len(tokens)),
+        "output_norm.weight": (EMBEDDING,),
+        "output.weight": (EMBEDDING, len(tokens)),
+        "blk.0.attn_norm.weight": (EMBEDDING,),
+        "blk.0.attn_q.weight": (EMBEDDING, EMBEDDING),
+        "blk.0.attn_k.weight": (EMBEDDING, EMBEDDING),
+        "blk.0.attn_v.weight": (EMBEDDING, EMBEDDING),
+        "blk.0.attn_output.weight": (EMBEDDING, EMBEDDING),
+        "blk.0.ffn_norm.weight": (EMBEDDING,),
+        "blk.0.ffn_gate.weight": (EMBEDDING, FEED_FORWARD),
+        "blk.0.ffn_up.weight": (EMBEDDING, FEED_FORWARD),
+        "blk.0.ffn_down.weight": (FEED_FORWARD, EMBEDDING)
+    }
+    rng = np.random.default_rng(seed)
+    infos, blobs, offset = b"", b"", 0
+    for name, shape in shapes.items():
+        count = int(np.prod(shape))
+        values = (rng.standard_normal(count) * 0.05).astype("<f4") if len(shape) > 1 else np.ones(count, "<f4")
+        infos += gguf_string(name) + struct.pack("<I", len(shape)) + b"".join(struct.pack("<Q", d) for d in shape) + struct.pack("<IQ", 0, offset)
+        blob = values.tobytes()
+        blob += b"\0" * (-len(blob) % 32)
+        blobs += blob
+        offset += len(blob)
+
+    data = b"GGUF" + struct.pack("<IQQ", 3, len(shapes), len(metadata)) + b"".join(metadata) + infos
+    data += b"\0" * (-len(data) % 32)
+    with open(path, "wb") as f:
+        f.write(data + blobs)
+    return str(path)
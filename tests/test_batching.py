@@ -0,0 +1,48 @@
+import pytest
+
+llama_cpp = pytest.importorskip("llama_cpp")
+
+from src.batching import BatchedLlama
+from src.chat_template import Llama3ChatTemplate
+from src.prompt_cache import prompt_tokens, shared_prefix, shared_suffix
+from src.routes.model import render_prompt
+
+
+@pytest.fixture(scope="module")
+def llm(tiny_model):
+    return llama_cpp.Llama(model_path=tiny_model, n_ctx=512, verbose=False)
+
+
+@pytest.fixture
+def render():
+    template = Llama3ChatTemplate("01 Jan 2025")
+    return lambda question: render_prompt(template, question)
+
+
+def test_long_prompts_keep_the_template(llm , render):
+    prefix = prompt_tokens(llm, shared_prefix(render))
+    suffix = llm.tokenize(shared_suffix(render).encode("utf-8"), add_bos=False, special=True)
+    budget = len(prefix) + len(suffix) + 20
+    batched = BatchedLlama(llm, 2, n_ctx_per_seq=budget + 8, temperature=0, render=render)
+    fitted = batched.fit(batched.tokenize(render("word " * 400)), budget)
+
+    assert len(fitted) == budget
+    assert fitted[:len(prefix)] == prefix
+    assert fitted[-len(suffix):] == suffix
+
+    with pytest.raises(ValueError):
+        batched.generate([render("hi")], budget - 20)
+
+
+def test_incremental_text_matches_the_tokens(llm , render):
+    batched = BatchedLlama(llm, 2, n_ctx_per_seq=256, temperature=0, render=render)
+    prompts = [render("How long does DC fast charging take?"), render("tesla")]
+    answers = batched.generate(prompts, 24)
+
+    assert len(answers) == 2
+    # Greedy decoding is deterministic, so a stop string cuts the same text where it starts.
+    for prompt, answer in zip(prompts, answers):
+        if len(answer) > 3:
+            stop = answer[2:4]
+            cut = batched.generate([prompt], 24, stop=[stop])[0]
+            assert cut == answer[:answer.index(stop)]
@@ -0,0 +1,30 @@
+from src.dedup import NearDuplicateIndex
+
+OLD = "the charging port is behind the left rear light and opens when the car is unlocked by the owner"
+NEW = "a completely different paragraph about tyre pressure that is checked monthly with a calibrated gauge"
+
+
+def test_replacing_a_key_drops_its_old_buckets():
+    index = NearDuplicateIndex()
+    index.add("a#0", index.hasher.signature(OLD))
+    index.add("a#0", index.hasher.signature(NEW))
+
+    assert len(index) == 1
+    assert index.query(index.hasher.signature(OLD)) is None
+    assert index.query(index.hasher.signature(NEW)) == "a#0"
+
+
+def test_removed_source_chunks_do_not_match(tmp_path):
+    index = NearDuplicateIndex()
+    index.add("a#0", index.hasher.signature(NEW))
+    index.add("a#1", index.hasher.signature(OLD))
+    # Boundaries shifted: the old chunk a#1 is now a#0 and would be dropped as its own duplicate.
+    assert index.check_and_add("a#0", OLD) == "a#1"
+
+    assert index.remove(["a#0", "a#1", "missing"]) == 2
+    assert index.check_and_add("a#0", OLD) is None
+
+    index.save(tmp_path / "chunks")
+    loaded = NearDuplicateIndex.load(tmp_path / "chunks")
+    assert loaded.keys == ["a#0"]
+    assert loaded.query(loaded.hasher.signature(OLD)) == "a#0"
@@ -0,0 +1,23 @@
+from src import model_evalute
+from src.model_evalute import QAEvaluator, evaluate_shard_job
+
+
+def test_run_dir_needs_no_predictor(monkeypatch , tiny_model , tmp_path):
+    def no_predictor(*args):
+        raise AssertionError("a predictor was built")
+
+    monkeypatch.setattr(model_evalute, "EVALUATION_MODEL_HASHES", str(tmp_path / "hashes.json"))
+    monkeypatch.setattr(model_evalute, "GGUFPredictor", type("GGUFPredictor", (model_evalute.GGUFPredictor,), {"__init__": no_predictor}))
+    monkeypatch.setattr(QAEvaluator, "predictor", no_predictor)
+    evaluator = QAEvaluator(str(tmp_path / "eval.jsonl"), 10.0, 2)
+
+    assert (evaluator.dataset_path, evaluator.holdout_percent, evaluator.num_shards) == (str(tmp_path / "eval.jsonl"), 10.0, 2)
+    assert evaluator.run_dir("guff", tiny_model) != evaluator.run_dir("base")
+
+
+def test_shard_jobs_get_the_settings(monkeypatch):
+    seen = {}
+    monkeypatch.setattr(QAEvaluator, "evaluate_shard", lambda self, kind, model_path, shard: seen.update(vars(self)))
+
+    evaluate_shard_job({"dataset_path": "eval.jsonl", "holdout_percent": 5.0, "num_shards": 3}, "guff", None, 1)
+    assert (seen["dataset_path"], seen["holdout_percent"], seen["num_shards"]) == ("eval.jsonl", 5.0, 3)
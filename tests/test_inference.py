@@ -0,0 +1,72 @@
+import asyncio
+import threading
+
+import pytest
+
+from src.batching import MicroBatcher
+from src.inference import InferenceScheduler, QueueFullError
+
+
+def blocking_scheduler(max_queue):
+    release = threading.Event()
+    scheduler = InferenceScheduler(lambda: "model", pool_size=1, max_queue=max_queue, timeout=5)
+    scheduler.start()
+    return scheduler, release
+
+
+def test_reserved_place_is_not_taken_by_later_requests():
+    async def scenario():
+        scheduler, release = blocking_scheduler(max_queue=1)
+        busy = asyncio.ensure_future(scheduler.run(lambda model, cancel: release.wait()))
+        await asyncio.sleep(0.05)
+
+        scheduler.reserve()
+        # A request arriving between the reservation and its run finds the queue full.
+        with pytest.raises(QueueFullError):
+            await scheduler.run(lambda model, cancel: "late")
+
+        reserved = asyncio.ensure_future(scheduler.run(lambda model, cancel: "reserved", reserved=True))
+        release.set()
+        assert await reserved == "reserved"
+        await busy
+        assert scheduler.waiting == 0
+
+        scheduler.reserve()
+        scheduler.cancel_reservation()
+        assert scheduler.waiting == 0
+        scheduler.close()
+
+    asyncio.run(scenario())
+
+
+class FakeBatched:
+    last_timings = {}
+
+    def generate(self , prompts , max_tokens , stop , cancels , abort=None):
+        return [prompt.upper() for prompt in prompts]
+
+
+def test_batches_reserve_their_queue_place_on_submit():
+    async def scenario():
+        scheduler, release = blocking_scheduler(max_queue=1)
+        busy = asyncio.ensure_future(scheduler.run(lambda model, cancel: release.wait()))
+        await asyncio.sleep(0.05)
+
+        batcher = MicroBatcher(scheduler, {"max_batch": 2, "window_ms": 1000, "n_ctx_per_seq": 64}, 16, [])
+        batcher.batched_model = lambda llm: FakeBatched()
+        first = asyncio.ensure_future(batcher.submit("a"))
+        second = asyncio.ensure_future(batcher.submit("b"))
+        await asyncio.sleep(0.05)
+        assert scheduler.waiting == 1
+
+        # The formed batch holds the only queue place, so a third request is rejected up front.
+        with pytest.raises(QueueFullError):
+            await batcher.submit("c")
+
+        release.set()
+        assert [await first, await second] == ["A", "B"]
+        await busy
+        assert scheduler.waiting == 0
+        scheduler.close()
+
+    asyncio.run(scenario())
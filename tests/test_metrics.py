@@ -0,0 +1,37 @@
+import math
+
+import pytest
+
+from src.metrics import QAMetrics
+
+PREDICTIONS = ["the cat sat on the mat", "Charging takes 30 minutes.", "Use a Type 2 cable at public stations."]
+REFERENCES = ["the cat is on the mat", "DC fast charging takes about 30 minutes.", "Use a Type 2 cable at public stations."]
+
+# Worked out by hand with the definitions of `rouge_score` (mean F1 per example, no stemming)
+# and the Hugging Face `bleu` metric (13a tokens, corpus counts, no smoothing).
+ROUGE_1 = (5 / 6 + 8 / 11 + 1) / 3
+ROUGE_2 = (3 / 5 + 4 / 9 + 1) / 3
+BLEU = math.exp((math.log(18 / 20) + math.log(13 / 17) + math.log(9 / 14) + math.log(6 / 11)) / 4) * math.exp(1 - 23 / 20)
+
+
+def test_scores_match_the_reference_definitions():
+    metrics = QAMetrics()
+    metrics.update(PREDICTIONS, REFERENCES)
+
+    assert metrics.result() == pytest.approx({
+        "rouge_1_f": ROUGE_1,
+        "rouge_2_f": ROUGE_2,
+        "rouge_l_f": ROUGE_1,
+        "bleu_score": BLEU
+    })
+
+
+def test_merged_shards_score_like_one_pass():
+    merged = QAMetrics()
+    for prediction, reference in zip(PREDICTIONS, REFERENCES):
+        shard = QAMetrics()
+        shard.update([prediction], [reference])
+        merged.merge(QAMetrics.from_state(shard.state()))
+
+    assert merged.count == 3
+    assert merged.result() == pytest.approx({"rouge_1_f": ROUGE_1, "rouge_2_f": ROUGE_2, "rouge_l_f": ROUGE_1, "bleu_score": BLEU})
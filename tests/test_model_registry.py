@@ -0,0 +1,49 @@
+import asyncio
+
+from src.gguf_check import kv_bytes_per_token
+from src.model_registry import LoadedModel, ModelRegistry, ModelVariant
+
+
+class FakeScheduler:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def make_registry(*names):
+    loads = []
+
+    def loader(variant):
+        loads.append(variant.name)
+        return LoadedModel(variant, FakeScheduler(), None)
+
+    return ModelRegistry([ModelVariant(name, None, "stub") for name in names], loader), loads
+
+
+def test_get_reloads_a_variant_evicted_before_it_resumes():
+    async def scenario():
+        registry, loads = make_registry("a")
+        registry.loading["a"] = registry.start_load(registry.variants["a"])
+        # Runs before the waiter in get() resumes, like an eviction by a concurrent load.
+        registry.loading["a"].add_done_callback(lambda _: registry.unload("a"))
+
+        model = await registry.get("a")
+        assert registry.loaded["a"] is model and not model.retired
+        assert loads == ["a", "a"]
+
+        await registry.close()
+        assert model.scheduler.closed and not registry.loaded
+
+    asyncio.run(scenario())
+
+
+def test_batching_context_counts_in_the_memory_estimate(tiny_model):
+    settings = {"pool_size": 2, "context_mb": 1, "batching": {"enabled": False, "max_batch": 4, "n_ctx_per_seq": 256}}
+    unbatched = ModelVariant("a", tiny_model, settings=settings).memory_bytes()
+    batched = ModelVariant("a", tiny_model, settings={**settings, "batching": {**settings["batching"], "enabled": True}}).memory_bytes()
+
+    # One layer, 64-wide K and V in f16.
+    assert kv_bytes_per_token(tiny_model) == 2 * 1 * 64 * 2
+    assert batched - unbatched == 2 * 4 * 256 * kv_bytes_per_token(tiny_model)
@@ -0,0 +1,61 @@
+import threading
+
+import pytest
+
+llama_cpp = pytest.importorskip("llama_cpp")
+
+from src.chat_template import Llama3ChatTemplate
+from src.prompt_cache import PrefixKVCache, prompt_tokens, shared_prefix, shared_token_count
+from src.routes.model import generate_answer, render_prompt
+
+QUESTIONS = ["How long does DC fast charging take?", " leading space", "\nnewline first", "tesla"]
+
+
+@pytest.fixture
+def template():
+    return Llama3ChatTemplate("01 Jan 2025")
+
+
+def test_prompt_tokens_have_one_bos(tiny_vocab , template):
+    llm = llama_cpp.Llama(model_path=tiny_vocab, vocab_only=True, verbose=False)
+    bos = llm.token_bos()
+
+    assert prompt_tokens(llm, "hello")[:2].count(bos) == 1
+    for question in QUESTIONS:
+        tokens = prompt_tokens(llm, render_prompt(template, question))
+        assert tokens[0] == bos
+        assert tokens[1] != bos
+
+
+def test_requests_share_the_whole_prefix(tiny_vocab , template):
+    llm = llama_cpp.Llama(model_path=tiny_vocab, vocab_only=True, verbose=False)
+    prefix = prompt_tokens(llm, shared_prefix(lambda question: render_prompt(template, question)))
+
+    for question in QUESTIONS:
+        assert shared_token_count(prompt_tokens(llm, render_prompt(template, question)), prefix) == len(prefix)
+
+
+def test_restore_reuses_the_prefix_state(tiny_model , template):
+    llm = llama_cpp.Llama(model_path=tiny_model, n_ctx=1024, verbose=False)
+    cache = PrefixKVCache(
+        shared_prefix(lambda question: render_prompt(template, question)),
+        "tiny",
+        sample_prompt=render_prompt(template, "hi")
+    )
+    cache.prepare(llm)
+    llm._prefix_cache = cache
+    assert cache.enabled
+
+    loads = []
+    load_state = llm.load_state
+    llm.load_state = lambda state: loads.append(state) or load_state(state)
+
+    for question in QUESTIONS[:3]:
+        generate_answer(llm, render_prompt(template, question), threading.Event(), {"max_tokens": 4})
+        assert llama_cpp.Llama.longest_token_prefix(llm.input_ids.tolist(), cache.tokens) == len(cache.tokens)
+    # Every request continued from the evaluated prefix; none needed the saved state back.
+    assert loads == []
+
+    llm.reset()
+    cache.restore(llm)
+    assert len(loads) == 1
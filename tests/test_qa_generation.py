@@ -0,0 +1,48 @@
+import json
+
+from src.qa_generation import FakeGenerationClient, QAGenerationEngine
+
+
+def make_engine(tmp_path):
+    return QAGenerationEngine(
+        FakeGenerationClient(pairs_per_chunk=2),
+        lambda text: f"[Text Chunk]: {text} JSON Output:",
+        {"requests_per_second": 1000.0},
+        str(tmp_path / "training_chunks.jsonl"),
+        str(tmp_path / "training_chunks.checkpoint.jsonl")
+    )
+
+
+def make_chunks(*texts):
+    return [{"source": "doc", "doc_type": "txt", "chunk_id": i, "text": text} for i, text in enumerate(texts)]
+
+
+def read_lines(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+def test_only_new_chunks_are_generated(tmp_path):
+    engine = make_engine(tmp_path)
+    first = engine.run(make_chunks("One. Two.", "Three. Four."))
+    second = engine.run(make_chunks("One. Two.", "Three. Four.", "Five. Six."))
+
+    assert (first["generated"], first["examples"]) == (2, 4)
+    assert (second["generated"], second["skipped"], second["examples"]) == (1, 2, 2)
+    assert len(read_lines(engine.output_path)) == 6
+
+
+def test_output_without_checkpoint_is_kept(tmp_path):
+    engine = make_engine(tmp_path)
+    legacy = [json.dumps({"text_format": f"legacy {i}"}) for i in range(3)]
+    with open(engine.output_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(legacy) + "\n")
+
+    stats = engine.run(make_chunks("One. Two.", "Three. Four."))
+    lines = read_lines(engine.output_path)
+
+    assert stats["generated"] == 2
+    assert lines[:3] == legacy and len(lines) == 7
+    # The adopted examples stay on resume; only the new chunks count as done.
+    assert engine.run(make_chunks("One. Two.", "Three. Four."))["generated"] == 0
+    assert read_lines(engine.output_path)[:3] == legacy
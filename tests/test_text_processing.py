@@ -0,0 +1,42 @@
+import time
+
+from src import text_processing
+from src.text_processing import TextEngine
+
+
+def test_keyword_scan_matches_per_keyword_counts():
+    engine = TextEngine(min_words=1)
+    text = "EV charging: every Electric Vehicle station has a battery; BATTERY packs, charging stations."
+    lower = text.lower()
+    counts = {keyword: lower.count(keyword) for keyword in engine.keywords}
+
+    stats = engine.analyze(text)
+    assert stats["keywords_found"] == sum(1 for count in counts.values() if count)
+    assert stats["keyword_density"] == sum(counts.values()) / len(text.split())
+    assert stats["quality"]
+
+
+def test_small_inputs_run_inline(monkeypatch):
+    def no_pool(*args , **kwargs):
+        raise AssertionError("a process pool was started")
+
+    monkeypatch.setattr(text_processing, "ProcessPoolExecutor", no_pool)
+    engine = TextEngine(workers=4, batch_size=8)
+    records = [(i, f"  page {i}  ") for i in range(3)]
+    assert [result for _, _, result in engine.imap("normalize", records, size_hint=3)] == [" page 0 ", " page 1 ", " page 2 "]
+
+
+def test_results_stream_before_the_window_fills():
+    consumed = []
+
+    def slow_records():
+        for i in range(8):
+            time.sleep(0.3)
+            consumed.append(i)
+            yield i, f"text {i}"
+
+    engine = TextEngine(workers=2, batch_size=1, max_pending=8)
+    results = engine.imap("normalize", slow_records())
+    assert next(results) == (0, "text 0", "text 0")
+    assert len(consumed) < 8
+    assert [key for key, _, _ in results] == list(range(1, 8))